@@ -0,0 +1,180 @@
+''' Throughput benchmark of the crawl engines against the synthetic web
+served locally
+
+Synthetic web is served from a separate process and each engine crawls
+it in its own fresh process, so CPU time and peak memory are measured
+for the engine alone. Fetch latency is the time from page dispatch
+till the page is finished.
+
+USAGE:
+    crawl_bench.py [options] [<engine>...]
+
+OPTIONS:
+    --pages <n>           Number of pages in the synthetic web [default: 2000]
+    --fan-out <n>         Number of links on the HTML page [default: 10]
+    --page-size <bytes>   Size of the page content [default: 20480]
+    --html-ratio <ratio>  Share of HTML pages, others are binary [default: 0.9]
+    --hosts <n>           Number of hosts serving pages [default: 4]
+    --latency <sec>       Mean latency of the host response [default: 0.01]
+    --error-rate <ratio>  Share of pages failing with server errors
+                          [default: 0.02]
+    --seed <n>            Seed of the synthetic web generation [default: 1]
+    --limit <n>           Number of pages to reach [default: 500]
+    --max-in-flight <n>   Max number of pages fetched at the same time
+                          by the concurrent engines [default: 50]
+
+Engines are the names of collector functions, by default collect,
+pcollect, acollect and tcollect.
+'''
+import time
+import resource
+import multiprocessing
+
+import docopt
+
+import webgen
+import webserver
+
+DEFAULT_ENGINES = ("collect", "pcollect", "acollect", "tcollect")
+# seconds to wait for the server of the synthetic web to start
+SERVER_START_TIMEOUT = 30
+# engines that fetch pages one by one
+SERIAL_ENGINES = ("collect",)
+
+
+class LatencyListener(object):
+    ''' Records fetch latency of each finished page, it is mixed with
+    CrawlListener in the process of the engine as only that process
+    imports collector '''
+
+    def __init__(self):
+        self._dispatched_by_url = {}
+        self.latencies = []
+
+    def page_dispatched(self, url):
+        self._dispatched_by_url[url] = time.time()
+
+    def page_reached(self, url, outgoing):
+        self._finished(url)
+
+    def page_failed(self, url):
+        self._finished(url)
+
+    def _finished(self, url):
+        dispatched = self._dispatched_by_url.pop(url, None)
+        if dispatched is not None:
+            self.latencies.append(time.time() - dispatched)
+
+
+def run_engine(name, url, limit, max_in_flight, results):
+    ''' Crawl in the process of the engine putting report to the results
+    @types: str, str, int, int, multiprocessing.Queue'''
+    # collector is imported in the process of the engine, so each engine
+    # loads only its own dependencies, pcollect patches it for gevent
+    import collector
+    collect = getattr(collector, name)
+    options = {}
+    if name not in SERIAL_ENGINES:
+        options["max_in_flight"] = max_in_flight
+    latency = type("CrawlLatencyListener",
+                   (LatencyListener, collector.CrawlListener), {})()
+    started = time.time()
+    graph = collect(url, limit, listeners=[latency], **options)
+    elapsed = time.time() - started
+    latencies = sorted(latency.latencies)
+    results.put({
+        "engine": name,
+        "pages": len(graph),
+        "failed": len(latencies) - len(graph),
+        "pages_per_sec": len(graph) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_sec": _cpu_time(),
+        "peak_rss_mb": _peak_rss_mb()})
+
+
+def percentile(sorted_values, fraction):
+    '@types: list[float], float -> float'
+    if not sorted_values:
+        return 0.0
+    return sorted_values[int(round(fraction * (len(sorted_values) - 1)))]
+
+
+def _cpu_time():
+    ''' CPU time of the process and its parse pool if any
+    @types: -> float'''
+    usages = (resource.getrusage(resource.RUSAGE_SELF),
+              resource.getrusage(resource.RUSAGE_CHILDREN))
+    return sum(u.ru_utime + u.ru_stime for u in usages)
+
+
+def _peak_rss_mb():
+    ''' Max resident set size of the process, reported in KB on Linux
+    @types: -> float'''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _serve(web, base_urls_queue, stop):
+    ''' Serve the web in the process of the server till stop is set
+    @types: webgen.SyntheticWeb, multiprocessing.Queue, multiprocessing.Event
+    '''
+    with webserver.serve(web) as base_urls:
+        base_urls_queue.put(base_urls)
+        stop.wait()
+
+
+def benchmark(web, engines, limit, max_in_flight):
+    '''
+    @types: webgen.SyntheticWeb, list[str], int, int -> list[dict]'''
+    base_urls_queue, stop = multiprocessing.Queue(), multiprocessing.Event()
+    server = multiprocessing.Process(target=_serve,
+                                     args=(web, base_urls_queue, stop))
+    server.start()
+    try:
+        url = webserver.start_url(
+            base_urls_queue.get(timeout=SERVER_START_TIMEOUT))
+        reports = []
+        for name in engines:
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=run_engine,
+                args=(name, url, limit, max_in_flight, results))
+            process.start()
+            # report is small enough to be flushed before the process exits
+            process.join()
+            if process.exitcode:
+                raise RuntimeError("Engine %s failed" % name)
+            reports.append(results.get())
+        return reports
+    finally:
+        stop.set()
+        server.join()
+
+
+def print_reports(reports):
+    '@types: list[dict]'
+    columns = ("engine", "pages", "failed", "pages_per_sec", "p50_ms",
+               "p99_ms", "cpu_sec", "peak_rss_mb")
+    print " ".join("%13s" % c for c in columns)
+    for report in reports:
+        print " ".join(isinstance(report[c], float) and "%13.2f" % report[c]
+                       or "%13s" % report[c] for c in columns)
+
+
+def main(args):
+    '@types: dict[str, O]'
+    web = webgen.generate(int(args["--pages"]),
+                          fan_out=int(args["--fan-out"]),
+                          page_size=int(args["--page-size"]),
+                          html_ratio=float(args["--html-ratio"]),
+                          n_hosts=int(args["--hosts"]),
+                          latency=float(args["--latency"]),
+                          error_rate=float(args["--error-rate"]),
+                          seed=int(args["--seed"]))
+    print_reports(benchmark(web, args["<engine>"] or DEFAULT_ENGINES,
+                            int(args["--limit"]),
+                            int(args["--max-in-flight"])))
+
+
+if __name__ == '__main__':
+    main(docopt.docopt(__doc__))
@@ -0,0 +1,84 @@
+''' Micro-benchmark of link extraction: streaming extractor against
+the regular expression previously applied to the whole document
+
+USAGE:
+    PYTHONPATH=crawler:test python bench/extractor_bench.py
+'''
+import re
+import time
+
+import extractor
+import test_collector
+
+# the expression used before the streaming extractor
+LEGACY_A_TAG_HREF_RE = re.compile("<a\s+.*?href=\"(.*?)\"")
+
+REPEAT = 3
+
+
+def legacy_links(content):
+    '@types: str -> set[str]'
+    return set(LEGACY_A_TAG_HREF_RE.findall(content))
+
+
+def streamed_links(content, chunk_size=16 * 1024):
+    '@types: str, int -> set[str]'
+    chunks = (content[i:i + chunk_size]
+              for i in xrange(0, len(content), chunk_size))
+    return set(extractor.iter_links(chunks))
+
+
+def multiline_document(n_links):
+    '@types: int -> str'
+    return "\n".join(
+        '<li><a class="nav" href="http://site.com/page/%s">Page</a></li>' % i
+        for i in xrange(n_links))
+
+
+def minified_document(n_links):
+    ''' Single line document ending with anchors without href,
+    each of them makes the legacy expression scan till the end of line
+
+    @types: int -> str'''
+    return "".join(
+        ['<a href="http://site.com/%s">x</a>' % i for i in xrange(n_links)]
+        + ['<a name="n%s"></a>' % i for i in xrange(n_links)])
+
+
+def check_correctness():
+    ''' Streaming extractor passes collector tests and agrees
+    with the legacy expression on the documents used below '''
+    test_collector.test_urls_parsed_from_html_content()
+    sample = test_collector.content_with_urls("http://a.com", "/b", "#c")
+    for document in (sample, multiline_document(100),
+                     minified_document(100)):
+        assert legacy_links(document) == streamed_links(document)
+        assert legacy_links(document) == streamed_links(document,
+                                                        chunk_size=7)
+
+
+def measure(fn, content):
+    '@types: (str -> set[str]), str -> float'
+    best = None
+    for _ in xrange(REPEAT):
+        started = time.time()
+        fn(content)
+        elapsed = time.time() - started
+        best = best is None and elapsed or min(best, elapsed)
+    return best
+
+
+def main():
+    check_correctness()
+    print "%-12s %10s %10s %10s" % ("document", "size, KB", "regex, s",
+                                    "stream, s")
+    for name, document in (("multiline", multiline_document(100000)),
+                           ("minified", minified_document(5000))):
+        print "%-12s %10d %10.3f %10.3f" % (
+            name, len(document) / 1024,
+            measure(legacy_links, document),
+            measure(streamed_links, document))
+
+
+if __name__ == '__main__':
+    main()
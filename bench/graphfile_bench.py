@@ -0,0 +1,109 @@
+''' Benchmark of the graph export: whole-document JSON against the binary
+graph file, size of the file, time to write it, to load it and to look up
+links of random pages
+
+USAGE:
+    graphfile_bench.py [options]
+
+OPTIONS:
+    --pages <n>       Number of reached pages [default: 100000]
+    --fan-out <n>     Number of links of each page [default: 20]
+    --lookups <n>     Number of pages which links are looked up
+                      [default: 1000]
+    --seed <n>        Seed of the graph generation [default: 1]
+'''
+import os
+import json
+import time
+import random
+import shutil
+import tempfile
+
+import docopt
+
+import graph
+import graphfile
+import hyperlinks
+
+
+def generate(pages, fan_out, seed):
+    ''' Graph of reached pages linking to random pages, every tenth link
+    refers page which is not reached
+    @types: int, int, int -> graph.Graph'''
+    rnd = random.Random(seed)
+    result = graph.Graph()
+    for i in xrange(pages):
+        result.add_page(_url(i), set(
+            _url(rnd.randrange(pages * 11 // 10)) for _ in xrange(fan_out)))
+    return result
+
+
+def _url(i):
+    '@types: int -> str'
+    return "http://host%s.com/page/%s" % (i % 100, i)
+
+
+def timed(fn, *args):
+    '@types: callable, *O -> tuple[float, O]'
+    started = time.time()
+    result = fn(*args)
+    return time.time() - started, result
+
+
+def write_json(graph_, path):
+    '@types: graph.Graph, str'
+    with open(path, "w") as f:
+        f.write(hyperlinks.to_json(graph_))
+
+
+def load_json(path):
+    '@types: str -> dict[str, dict[str, list[str]]]'
+    with open(path) as f:
+        return json.load(f)
+
+
+def lookup_json(loaded, urls):
+    '@types: dict[str, dict[str, list[str]]], list[str] -> int'
+    return sum(len(loaded[url]["outgoing"]) + len(loaded[url]["incomming"])
+               for url in urls)
+
+
+def lookup_graphfile(loaded, urls):
+    '@types: graphfile.GraphFile, list[str] -> int'
+    return sum(len(loaded.outgoing(url)) + len(loaded.incomming(url))
+               for url in urls)
+
+
+def main(args):
+    '@types: dict[str, O]'
+    pages = int(args["--pages"])
+    seed = int(args["--seed"])
+    graph_ = generate(pages, int(args["--fan-out"]), seed)
+    rnd = random.Random(seed)
+    urls = [_url(rnd.randrange(pages))
+            for _ in xrange(int(args["--lookups"]))]
+    directory = tempfile.mkdtemp(prefix="graphfile-bench-")
+    try:
+        json_path = os.path.join(directory, "graph.json")
+        binary_path = os.path.join(directory, "graph.bin")
+        print "%-8s %10s %10s %10s %12s" % ("format", "size_mb", "write_s",
+                                            "load_ms", "lookups_ms")
+        for name, path, write, load, lookup in (
+                ("json", json_path, write_json, load_json, lookup_json),
+                ("binary", binary_path, graphfile.write,
+                 graphfile.GraphFile.open, lookup_graphfile)):
+            write_seconds, _ = timed(write, graph_, path)
+            load_seconds, loaded = timed(load, path)
+            lookup_seconds, links = timed(lookup, loaded, urls)
+            print "%-8s %10.1f %10.2f %10.1f %12.1f" % (
+                name, os.path.getsize(path) / 1024.0 / 1024,
+                write_seconds, load_seconds * 1000, lookup_seconds * 1000)
+        assert (lookup_json(load_json(json_path), urls)
+                == lookup_graphfile(graphfile.GraphFile.open(binary_path),
+                                    urls))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(docopt.docopt(__doc__))
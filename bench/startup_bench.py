@@ -0,0 +1,90 @@
+''' Startup benchmark: time to import the crawler modules and to run the
+CLI in a fresh interpreter, and heavy dependencies loaded on the way
+
+Each measurement runs in its own process as imports are cached by the
+interpreter. Engines and storages are expected to load their
+dependencies only when they are used.
+
+USAGE:
+    startup_bench.py [options]
+
+OPTIONS:
+    --repeat <n>    Number of processes started per measurement [default: 20]
+'''
+import os
+import sys
+import time
+import subprocess
+
+import docopt
+
+CRAWLER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir, "crawler")
+# dependencies which are not needed by every crawl
+HEAVY_MODULES = ("gevent", "grequests", "requests", "tornado", "pymongo",
+                 "multiprocessing", "numpy", "scipy")
+IMPORTED_MODULES = ("hyperlinks", "collector", "storage")
+
+_IMPORT_SCRIPT = """
+import sys, time
+started = time.time()
+import %s
+print (time.time() - started) * 1000
+print " ".join(m for m in %r if m in sys.modules)
+"""
+
+
+def import_time(module):
+    ''' Time of the module import in the fresh interpreter
+    @types: str -> tuple[float, list[str]]
+    @return: milliseconds and heavy modules loaded by the import
+    '''
+    out = subprocess.check_output(
+        [sys.executable, "-c", _IMPORT_SCRIPT % (module, HEAVY_MODULES)],
+        env=_env())
+    millis, loaded = out.splitlines()
+    return float(millis), loaded.split()
+
+
+def cli_time():
+    ''' Wall time of the CLI printing its version, interpreter startup
+    included
+    @types: -> float'''
+    started = time.time()
+    subprocess.check_output(
+        [sys.executable, os.path.join(CRAWLER_DIR, "hyperlinks.py"),
+         "--version"], env=_env())
+    return (time.time() - started) * 1000
+
+
+def _env():
+    '@types: -> dict[str, str]'
+    env = dict(os.environ)
+    env["PYTHONPATH"] = CRAWLER_DIR
+    return env
+
+
+def median(values):
+    '@types: list[float] -> float'
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(args):
+    '@types: dict[str, O]'
+    repeat = int(args["--repeat"])
+    print "%-22s %10s %10s  %s" % ("measurement", "median_ms", "min_ms",
+                                   "heavy modules loaded")
+    for module in IMPORTED_MODULES:
+        results = [import_time(module) for _ in xrange(repeat)]
+        millis = [m for m, _ in results]
+        print "%-22s %10.1f %10.1f  %s" % (
+            "import " + module, median(millis), min(millis),
+            " ".join(results[-1][1]) or "-")
+    millis = [cli_time() for _ in xrange(repeat)]
+    print "%-22s %10.1f %10.1f" % ("hyperlinks --version", median(millis),
+                                   min(millis))
+
+
+if __name__ == '__main__':
+    main(docopt.docopt(__doc__))
@@ -0,0 +1,91 @@
+''' Generator of the synthetic web the crawler is benchmarked against
+
+Pages are spread over several hosts, each host answers with its own
+latency and fails some of its pages. Generation is deterministic
+for the given seed, so runs of different engines and revisions crawl
+the same graph.
+'''
+import random
+from collections import namedtuple
+
+HTML_MIME_TYPE = "text/html"
+OTHER_MIME_TYPES = ("application/pdf", "image/png", "application/zip")
+# server errors injected, 503 is what rate limiters answer with
+ERROR_STATUS_CODES = (500, 503)
+
+Host = namedtuple("Host", ("latency", "error_rate"))
+Page = namedtuple("Page", ("host", "status_code", "mime_type", "links"))
+
+
+class SyntheticWeb:
+    ''' Pages are numbered, page i is served by host i % number of hosts
+    at path /p<i> and links to the pages by their numbers '''
+
+    def __init__(self, hosts, pages, page_size):
+        '@types: list[Host], list[Page], int'
+        self.hosts = hosts
+        self.pages = pages
+        self.page_size = page_size
+
+    def page(self, path):
+        '@types: str -> tuple[int, Page]?'
+        if path.startswith("/p") and path[2:].isdigit():
+            i = int(path[2:])
+            if i < len(self.pages):
+                return i, self.pages[i]
+        return None
+
+    def render(self, i, base_urls):
+        ''' Content of the page, links to the pages of the same host
+        are relative and links to other hosts are absolute
+
+        @types: int, list[str] -> str
+        @param base_urls: base URL of each host
+        '''
+        page = self.pages[i]
+        if page.mime_type != HTML_MIME_TYPE:
+            return "\0" * self.page_size
+        lines = ["<html><body>"]
+        for link in page.links:
+            host = self.pages[link].host
+            prefix = host != page.host and base_urls[host] or ""
+            lines.append('<a href="%s/p%s">page %s</a>' % (prefix, link, link))
+        lines.append("</body></html>")
+        content = "\n".join(lines)
+        filler = max(0, self.page_size - len(content))
+        return content.replace("<body>",
+                               "<body><p>%s</p>" % ("x" * filler), 1)
+
+    def __len__(self):
+        return len(self.pages)
+
+
+def generate(n_pages, fan_out=10, page_size=20 * 1024, html_ratio=0.9,
+             n_hosts=4, latency=0.01, error_rate=0.02, seed=1):
+    '''
+    @types: int, int, int, float, int, float, float, int -> SyntheticWeb
+    @param html_ratio: share of HTML pages, other pages are binary
+    @param latency: mean latency of the host response in seconds,
+                    latency of each host is drawn around it
+    @param error_rate: share of pages which fail with server error
+    '''
+    rnd = random.Random(seed)
+    hosts = [Host(latency * rnd.uniform(0.5, 1.5), error_rate)
+             for _ in xrange(n_hosts)]
+    pages = []
+    for i in xrange(n_pages):
+        host = i % n_hosts
+        is_html = i == 0 or rnd.random() < html_ratio
+        status_code = 200
+        if i and rnd.random() < hosts[host].error_rate:
+            status_code = rnd.choice(ERROR_STATUS_CODES)
+        links = ()
+        if is_html:
+            # link to the next page keeps the whole web reachable
+            links = [(i + 1) % n_pages] + [rnd.randrange(n_pages)
+                                           for _ in xrange(fan_out - 1)]
+        pages.append(Page(host, status_code,
+                          is_html and HTML_MIME_TYPE
+                          or rnd.choice(OTHER_MIME_TYPES),
+                          links))
+    return SyntheticWeb(hosts, pages, page_size)
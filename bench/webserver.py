@@ -0,0 +1,94 @@
+''' Local HTTP server of the synthetic web, one server per host
+
+Each server listens on its own port of the loopback interface, so the
+crawler sees every port as a separate host. Connections are kept alive
+and every request is served in its own thread after the host latency.
+'''
+import time
+import threading
+import contextlib
+import BaseHTTPServer
+import SocketServer
+
+LOCALHOST = "127.0.0.1"
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # set for each host
+    web = None
+    host = None
+    base_urls = None
+
+    def do_HEAD(self):
+        self._respond(with_body=False)
+
+    def do_GET(self):
+        self._respond(with_body=True)
+
+    def _respond(self, with_body):
+        '@types: bool'
+        found = self.web.page(self.path)
+        if found is None or found[1].host != self.host:
+            return self._send(404, "text/plain", "", with_body)
+        i, page = found
+        time.sleep(self.web.hosts[self.host].latency)
+        if page.status_code != 200:
+            return self._send(page.status_code, "text/plain", "", with_body)
+        self._send(200, page.mime_type,
+                   self.web.render(i, self.base_urls), with_body)
+
+    def _send(self, status_code, mime_type, content, with_body):
+        '@types: int, str, str, bool'
+        self.send_response(status_code)
+        self.send_header("Content-Type", mime_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _host_handler(web, host, base_urls):
+    ''' Request handler of the host
+    @types: webgen.SyntheticWeb, int, list[str] -> classobj'''
+    class HostHandler(_Handler):
+        pass
+    HostHandler.web = web
+    HostHandler.host = host
+    HostHandler.base_urls = base_urls
+    return HostHandler
+
+
+@contextlib.contextmanager
+def serve(web):
+    ''' Serve the synthetic web while in context
+    @types: webgen.SyntheticWeb -> context[list[str]]
+    @return: base URL of each host
+    '''
+    servers = [_Server((LOCALHOST, 0), _Handler)
+               for _ in xrange(len(web.hosts))]
+    base_urls = ["http://%s:%s" % server.server_address for server in servers]
+    for host, server in enumerate(servers):
+        server.RequestHandlerClass = _host_handler(web, host, base_urls)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+    try:
+        yield base_urls
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+def start_url(base_urls):
+    '@types: list[str] -> str'
+    return base_urls[0] + "/p0"
@@ -0,0 +1,161 @@
+''' Analysis of the crawled graph with sparse matrices
+
+Graph is turned into the sparse adjacency matrix in one pass over its
+pages, then PageRank, in and out degree distributions and strongly
+connected components are computed with vectorized operations.
+Only this module requires NumPy and SciPy.
+'''
+from array import array
+
+import numpy
+from scipy import sparse
+from scipy.sparse import csgraph
+
+import graph as graph_
+
+DEFAULT_DAMPING = 0.85
+# PageRank iterations stop when the sum of rank changes is less than
+# tolerance per page
+DEFAULT_TOLERANCE = 1e-6
+DEFAULT_MAX_ITERATIONS = 100
+# default number of top ranked pages and largest components reported
+DEFAULT_TOP = 10
+
+
+def adjacency(graph):
+    ''' Adjacency matrix of the reached pages, row is the source page and
+    column is the target page, links to the pages which are not reached
+    are skipped
+
+    @types: dict[str, collector.UrlInfo] \
+            -> tuple[list[str], scipy.sparse.csr_matrix]
+    @return: URLs of the pages in order of the matrix rows and the matrix
+    '''
+    if isinstance(graph, graph_.Graph):
+        urls, sources, targets = _graph_edges(graph)
+    else:
+        urls, sources, targets = _edges(graph)
+    n = len(urls)
+    matrix = sparse.csr_matrix(
+        (numpy.ones(len(sources)), (sources, targets)), shape=(n, n))
+    # duplicate edges are summed up by the constructor
+    matrix.data[:] = 1
+    return urls, matrix
+
+
+def _edges(graph):
+    ''' Edges between the reached pages by the index of the page
+    @types: dict[str, collector.UrlInfo] \
+            -> tuple[list[str], numpy.ndarray, numpy.ndarray]'''
+    urls = list(graph)
+    index_by_url = dict((url, i) for i, url in enumerate(urls))
+    sources, targets = array('i'), array('i')
+    for source, url in enumerate(urls):
+        for target in graph[url].outgoing:
+            target = index_by_url.get(target)
+            if target is not None:
+                sources.append(source)
+                targets.append(target)
+    return (urls, numpy.frombuffer(sources, dtype=numpy.intc),
+            numpy.frombuffer(targets, dtype=numpy.intc))
+
+
+def _graph_edges(graph):
+    ''' Same as _edges but URL ids of the graph are mapped to the page
+    indexes without building the view of each page
+    @types: graph.Graph -> tuple[list[str], numpy.ndarray, numpy.ndarray]'''
+    ids, outgoing = [], []
+    for id_, outgoing_ids in graph.iteroutgoing_ids():
+        ids.append(id_)
+        outgoing.append(numpy.frombuffer(outgoing_ids, dtype=numpy.uintc)
+                        if outgoing_ids else numpy.zeros(0, numpy.uintc))
+    index_by_id = numpy.full(len(graph.urls), -1, dtype=numpy.intc)
+    index_by_id[ids] = numpy.arange(len(ids), dtype=numpy.intc)
+    sources = numpy.repeat(numpy.arange(len(ids), dtype=numpy.intc),
+                           map(len, outgoing))
+    targets = index_by_id[numpy.concatenate(outgoing or [[]]).astype(int)]
+    is_reached = targets >= 0
+    return ([graph.urls.url(id_) for id_ in ids],
+            sources[is_reached], targets[is_reached])
+
+
+def pagerank(matrix, damping=DEFAULT_DAMPING, tolerance=DEFAULT_TOLERANCE,
+             max_iterations=DEFAULT_MAX_ITERATIONS):
+    ''' PageRank of the pages by power iteration, rank of the pages
+    without outgoing links is spread over all pages
+
+    @types: scipy.sparse.csr_matrix, float, float, int -> numpy.ndarray
+    @return: rank of each page, ranks sum up to 1
+    '''
+    n = matrix.shape[0]
+    if not n:
+        return numpy.zeros(0)
+    out_degrees = numpy.asarray(matrix.sum(axis=1)).ravel()
+    is_dangling = out_degrees == 0
+    share = numpy.zeros(n)
+    share[~is_dangling] = 1.0 / out_degrees[~is_dangling]
+    transposed = matrix.T.tocsr()
+    ranks = numpy.ones(n) / n
+    for _ in xrange(max_iterations):
+        dangling_rank = ranks[is_dangling].sum()
+        next_ranks = (damping * transposed.dot(ranks * share)
+                      + (damping * dangling_rank + 1 - damping) / n)
+        change = numpy.abs(next_ranks - ranks).sum()
+        ranks = next_ranks
+        if change < n * tolerance:
+            break
+    return ranks
+
+
+def degrees(matrix):
+    ''' In and out degree of each page
+    @types: scipy.sparse.csr_matrix -> tuple[numpy.ndarray, numpy.ndarray]'''
+    return (numpy.asarray(matrix.sum(axis=0)).ravel().astype(int),
+            numpy.asarray(matrix.sum(axis=1)).ravel().astype(int))
+
+
+def components(matrix):
+    ''' Strongly connected components of the graph
+    @types: scipy.sparse.csr_matrix -> numpy.ndarray
+    @return: size of each component in descending order'''
+    if not matrix.shape[0]:
+        return numpy.zeros(0, dtype=int)
+    _, labels = csgraph.connected_components(matrix, directed=True,
+                                             connection="strong")
+    return numpy.sort(numpy.bincount(labels))[::-1]
+
+
+def analyze(graph, top=DEFAULT_TOP, **pagerank_options):
+    ''' Report of the graph analysis as plain dicts and lists
+
+    @types: dict[str, collector.UrlInfo], int, **O -> dict[str, O]
+    @param pagerank_options: see pagerank
+    '''
+    urls, matrix = adjacency(graph)
+    ranks = pagerank(matrix, **pagerank_options)
+    in_degrees, out_degrees = degrees(matrix)
+    sizes = components(matrix)
+    return {
+        "pages": len(urls),
+        "links": int(matrix.nnz),
+        "pagerank": [{"url": urls[i], "rank": float(ranks[i])}
+                     for i in numpy.argsort(-ranks, kind="mergesort")[:top]],
+        "in_degree": _distribution(in_degrees),
+        "out_degree": _distribution(out_degrees),
+        "components": {"count": len(sizes),
+                       "largest": map(int, sizes[:top])}}
+
+
+def _distribution(values):
+    ''' Summary of the degrees and number of pages with each degree
+    @types: numpy.ndarray -> dict[str, O]'''
+    if not len(values):
+        return {"distribution": {}}
+    return {"min": int(values.min()),
+            "max": int(values.max()),
+            "mean": float(values.mean()),
+            "median": float(numpy.median(values)),
+            "distribution": dict((str(degree), int(count))
+                                 for degree, count
+                                 in enumerate(numpy.bincount(values))
+                                 if count)}
@@ -0,0 +1,110 @@
+''' Checkpoints of the crawl stored in SQLite database
+
+Only results of finished pages are appended, one row per page, so the
+cost of the checkpoint does not depend on the size of the crawl.
+The frontier, seen URLs, truncated pages and the remaining limit are
+restored replaying these results, pages which were in flight are fetched
+again.
+'''
+import json
+import sqlite3
+
+import collector
+
+# default number of finished pages written in one transaction
+DEFAULT_COMMIT_EVERY = 100
+
+_SCHEMA = (
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)",
+    # row id keeps the order in which pages were finished
+    "CREATE TABLE finished (url TEXT, is_reached INTEGER, outgoing TEXT, "
+    "is_truncated INTEGER)")
+
+
+class CheckpointException(Exception):
+    pass
+
+
+class Checkpoint(collector.CrawlListener):
+
+    def __init__(self, connection, start_url, limit,
+                 commit_every=DEFAULT_COMMIT_EVERY):
+        '@types: sqlite3.Connection, str, int, int'
+        self._connection = connection
+        self.start_url = start_url
+        self.limit = limit
+        self._commit_every = commit_every
+        self._uncommitted = 0
+        # truncated pages are reported before they are reached
+        self._truncated = set()
+
+    @classmethod
+    def create(cls, path, start_url, limit, **kwargs):
+        ''' Create checkpoint for the new crawl
+        @types: str, str, int, **O -> Checkpoint
+        @raise CheckpointException: checkpoint cannot be created
+        '''
+        try:
+            connection = sqlite3.connect(path)
+            with connection:
+                for statement in _SCHEMA:
+                    connection.execute(statement)
+                connection.executemany(
+                    "INSERT INTO meta (key, value) VALUES (?, ?)",
+                    (("start_url", start_url), ("limit", str(limit))))
+        except sqlite3.Error, e:
+            raise CheckpointException("Cannot create checkpoint. %s" % e)
+        return cls(connection, start_url, limit, **kwargs)
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        ''' Open checkpoint of the interrupted crawl to resume it
+        @types: str, **O -> Checkpoint
+        @raise CheckpointException: checkpoint cannot be read
+        '''
+        try:
+            connection = sqlite3.connect(path)
+            meta = dict(connection.execute("SELECT key, value FROM meta"))
+            return cls(connection, meta["start_url"], int(meta["limit"]),
+                       **kwargs)
+        except (sqlite3.Error, KeyError, ValueError), e:
+            raise CheckpointException("Cannot read checkpoint. %s" % e)
+
+    def results(self):
+        ''' Results of the finished pages in order they were finished with
+        flag whether the page is truncated
+        @types: -> iterable[tuple[str, tuple[bool, list[str]?], bool]]'''
+        rows = self._connection.execute(
+            "SELECT url, is_reached, outgoing, is_truncated FROM finished "
+            "ORDER BY rowid")
+        for url, is_reached, outgoing, is_truncated in rows:
+            yield (url, (bool(is_reached), outgoing and json.loads(outgoing)),
+                   bool(is_truncated))
+
+    def page_truncated(self, url):
+        self._truncated.add(url)
+
+    def page_reached(self, url, outgoing):
+        is_truncated = url in self._truncated
+        self._truncated.discard(url)
+        self._append(url, True, json.dumps(list(outgoing)), is_truncated)
+
+    def page_failed(self, url):
+        self._append(url, False, None)
+
+    def _append(self, url, is_reached, outgoing, is_truncated=False):
+        '@types: str, bool, str?, bool'
+        self._connection.execute(
+            "INSERT INTO finished (url, is_reached, outgoing, is_truncated) "
+            "VALUES (?, ?, ?, ?)", (url, is_reached, outgoing, is_truncated))
+        self._uncommitted += 1
+        if self._uncommitted >= self._commit_every:
+            self.commit()
+
+    def commit(self):
+        self._connection.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self._connection.close()
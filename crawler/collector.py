@@ -1,91 +1,754 @@
-from fn.iters import partition, nth
+from fn.iters import nth
 from fn import F
 
 from functools import partial
-from collections import defaultdict, namedtuple
-from itertools import repeat, izip, ifilterfalse, imap, ifilter
+from collections import namedtuple, deque, defaultdict
+from itertools import izip, ifilterfalse, imap, ifilter
 
-import requests
-import grequests
-
-import re
-import urlparse
+import time
+import httplib
 import logging
-import logging.config
+import contextlib
 
+import executors
+import extractor
+import frontier as frontiers
+import graph
+import sessions
+import urlnorm
 
-logging.config.fileConfig("logging.ini")
 logger = logging.getLogger("collector")
 
 SUPPORTED_MIME_TYPES = ('text/html',)
 
+# size of the chunk in which page content is read
+CHUNK_SIZE = 16 * 1024
+
+# default number of pages fetched at the same time by concurrent crawler
+DEFAULT_MAX_IN_FLIGHT = 50
+
+# seconds between checks of pages parsed in the parse pool while
+# fetches are pending
+PARSE_POLL_SECONDS = 0.01
+
+# links are normalized in the crawling process and in each process
+# of the parse pool, so every process has its own memo
+_normalizer = urlnorm.Normalizer()
+
 UrlInfo = namedtuple("UrlInfo", ("incomming", "outgoing"))
 
 
-def collect(start_url, limit):
-    do_heads = partial(do_request, requests.head, list)
-    do_gets = partial(do_request, requests.get, list)
-    return _collect(start_url, limit, do_heads, do_gets)
+def collect(start_url, limit, head_first=True, workers=None, pool_size=1,
+            **crawl_options):
+    '''
+    @types: str, int, bool, int?, int, **O -> graph.Graph
+    @param workers: number of processes parsing fetched pages,
+                    by default pages are parsed in the crawling process
+    @param pool_size: number of connections kept alive per host
+    @param crawl_options: options of the crawl, see _Crawl
+    '''
+    with _session(pool_size) as session:
+        do_heads, do_gets = _requests_fns(
+            session.head, session.get, list, head_first)
+        with _parse_pool(workers) as parse_pool:
+            return _collect(start_url, limit, do_heads, do_gets,
+                            parse_pool=parse_pool, **crawl_options)
+
 
+def pcollect(start_url, limit, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+             head_first=True, workers=None, pool_size=None, **crawl_options):
+    '''
+    @types: str, int, int, bool, int?, int?, **O -> graph.Graph
+    @param workers: number of processes parsing fetched pages,
+                    by default pages are parsed in the crawling process
+    @param pool_size: number of connections kept alive per host,
+                      by default the same as max number of pages in flight
+    @param crawl_options: options of the crawl, see _Crawl
+    '''
+    # importing grequests patches the interpreter for gevent, so it is
+    # imported only when this engine is used
+    import grequests
+    executor = executors.GeventExecutor(max_in_flight)
+    try:
+        with _session(pool_size or max_in_flight) as session:
+            pdo_heads, pdo_gets = _requests_fns(
+                partial(grequests.head, session=session),
+                partial(grequests.get, session=session),
+                # map sends requests with its own stream flag overriding
+                # the one of the request
+                partial(grequests.map, stream=True), head_first)
+            with _parse_pool(workers) as parse_pool:
+                return _collect(start_url, limit, pdo_heads, pdo_gets,
+                                executor=executor,
+                                max_in_flight=max_in_flight,
+                                parse_pool=parse_pool, **crawl_options)
+    finally:
+        executor.close()
+
+
+def tcollect(start_url, limit, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+             head_first=True, workers=None, pool_size=None, **crawl_options):
+    ''' Collect fetching pages in the pool of threads sharing the session,
+    no monkey-patching involved
+
+    @types: str, int, int, bool, int?, int?, **O -> graph.Graph
+    @param max_in_flight: number of threads fetching pages
+    @param workers: number of processes parsing fetched pages,
+                    by default pages are parsed in the fetching threads
+    @param pool_size: number of connections kept alive per host,
+                      by default the same as max number of pages in flight
+    @param crawl_options: options of the crawl, see _Crawl
+    '''
+    executor = executors.ThreadExecutor(max_in_flight)
+    try:
+        with _session(pool_size or max_in_flight) as session:
+            do_heads, do_gets = _requests_fns(
+                session.head, session.get, list, head_first)
+            with _parse_pool(workers) as parse_pool:
+                return _collect(start_url, limit, do_heads, do_gets,
+                                executor=executor,
+                                max_in_flight=max_in_flight,
+                                parse_pool=parse_pool, **crawl_options)
+    finally:
+        executor.close()
+
+
+@contextlib.contextmanager
+def _session(pool_size):
+    ''' Session shared by all requests of the crawl, name resolutions
+    are cached while crawling
+
+    @types: int -> context[requests.Session]'''
+    with sessions.dns_cache():
+        session = sessions.new_session(pool_maxsize=pool_size)
+        try:
+            yield session
+        finally:
+            session.close()
+
+
+@contextlib.contextmanager
+def _parse_pool(workers):
+    ''' Pool of processes parsing fetched pages
+    @types: int? -> context[multiprocessing.Pool?]'''
+    if not workers:
+        yield None
+        return
+    import multiprocessing
+    pool = multiprocessing.Pool(workers)
+    try:
+        yield pool
+    finally:
+        pool.terminate()
+
+
+def _requests_fns(head_fn, get_fn, realize_fn, head_first):
+    ''' Make functions doing HEAD and GET requests for the batch of URLs,
+    GET responses are streamed so the content is read in chunks and,
+    without HEAD requests, the body of unsupported type is never downloaded
+
+    @types: callable, callable, callable, bool -> tuple[callable?, callable]
+    '''
+    do_gets = partial(do_request, partial(get_fn, stream=True), realize_fn)
+    return head_first and partial(do_request, head_fn, realize_fn), do_gets
 
-def pcollect(start_url, limit):
-    pdo_heads = partial(do_request, grequests.head, grequests.map)
-    pdo_gets = partial(do_request, grequests.get, grequests.map)
-    return _collect(start_url, limit, pdo_heads, pdo_gets)
 
+def acollect(start_url, limit, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+             head_first=True, workers=None, **crawl_options):
+    ''' Collect on the tornado event loop, no monkey-patching involved
 
-def _collect(start_url, limit, do_head_fn, do_get_fn):
+    @types: str, int, int, bool, int?, **O -> graph.Graph
+    @param workers: number of processes parsing fetched pages,
+                    by default pages are parsed in the crawling process
+    @param crawl_options: options of the crawl, see _Crawl
+    '''
+    import tornado_engine
+    with contextlib.nested(sessions.dns_cache(),
+                           _parse_pool(workers)) as (_, parse_pool):
+        return tornado_engine.collect(start_url, limit, max_in_flight,
+                                      head_first, parse_pool=parse_pool,
+                                      **crawl_options)
+
+
+def _collect(start_url, limit, do_head_fn, do_get_fn,
+             executor=None, max_in_flight=1, parse_pool=None, cache=None,
+             max_page_size=None, content_budget=None, **crawl_options):
     ''' Collect recursively incoming and outgoing information
     starting from specified URL
 
     @note: If one of the pages cannot be reached - limit doesn't decrease
-    @note: Algorithm applied below is very similar to BFS
+    @note: Algorithm applied below is very similar to BFS, but instead of
+           waiting for the whole batch of pages the next page is dispatched
+           as soon as any of pages in flight is done
 
-    @types: str, int, callable, callable -> dict[str, UrlInfo]
+    @types: str, int, callable, callable, executors.Executor?, int, \
+            multiprocessing.Pool?, linkcache.LinkCache?, int?, int?, **O \
+            -> graph.Graph
 
-    @type do_head_fn: (iterable[str] -> iterable[requests.Response])
+    @type do_head_fn: (iterable[str] -> iterable[requests.Response])?
     @param do_head_fn: function takes iterable of URLs and returns list
-                       of Response for HEAD requests
+                       of Response for HEAD requests, if not specified
+                       content type is checked on GET response
     @type do_get_fn: (iterable[str] -> iterable[requests.Response])
     @param do_get_fn: function takes iterable of URLs and returns list
                       of responses for GET requests
+    @param executor: executor used to fetch pages, serial by default
+    @param max_in_flight: max number of pages fetched or parsed
+                          at the same time
+    @param parse_pool: pool of processes where fetched pages are parsed,
+                       results are merged into the graph in this process
+    @param cache: cache of the links of pages from the previous crawl,
+                  it is updated as pages are finished
+    @param max_page_size: max number of characters of the page content
+                          read, links are parsed from the truncated prefix
+                          of the larger page
+    @param content_budget: max number of characters of the content held
+                           by pages in flight, see _window
+    @param crawl_options: options of the crawl, see _Crawl
     '''
     logger.info("staring url with limit %s: %s" % (limit, start_url))
-    info_by_url = defaultdict(new_url_info)
-    parent_to_url_queue = [(None, _normalize_url(start_url))]
-    while parent_to_url_queue and limit > 0:
-
-        urls_to_process = parent_to_url_queue[:limit]
-        del parent_to_url_queue[:limit]
-
-        urls = (url for _, url in urls_to_process)
-        results = _get_outgoings(urls, do_head_fn, do_get_fn)
-        results = izip(urls_to_process, results)
-
-        for result in results:
-            (parent_url, url), (is_page_reached, urls) = result
-            if is_page_reached:
-                limit = limit - 1
-                urls = ifilterfalse(_is_fragment_ref, urls)
-                urls = [_normalize_url(url, u) for u in urls]
-
-                info = info_by_url[url]
-                info.outgoing.update(urls)
-
-                parent_url and info.incomming.add(parent_url)
-
-                candidates, visited = partition(info_by_url.has_key, urls)
+    if executor is None:
+        executor = executors.SerialExecutor()
+    max_in_flight = _window(max_in_flight, max_page_size, content_budget)
+    parse_fn = parse_pool and _read_content or _parse_a_tag_urls
+    # pages being parsed in order they were fetched, they are merged
+    # as soon as parsed
+    parsing = deque()
+    crawl_options = _with_cache(cache, crawl_options)
+    # listeners and cache are called by the tasks as well
+    if "listeners" in crawl_options:
+        crawl_options["listeners"] = map(executor.guarded,
+                                         crawl_options["listeners"])
+    if cache is not None:
+        cache = executor.guarded(cache)
+    crawl = _Crawl(start_url, limit, **crawl_options)
+    while True:
+
+        while crawl.can_dispatch(len(executor) + len(parsing),
+                                 max_in_flight):
+            parent_url, url = crawl.next_page()
+            executor.submit((parent_url, url), _fetch,
+                            url, do_head_fn, do_get_fn, parse_fn, cache,
+                            crawl.listeners, max_page_size,
+                            crawl.mark_truncated)
+
+        parsed = _pop_parsed(parsing, block=not len(executor))
+        if parsed is not None:
+            parent_url, url, result = parsed
+            crawl.add_result(parent_url, url, result, is_normalized=True)
+            continue
+
+        in_flight = len(executor) + len(parsing)
+        crawl.report_progress(in_flight)
+        if not len(executor):
+            wait_time = crawl.wait_time(in_flight, max_in_flight)
+            if wait_time is None:
+                break
+            time.sleep(wait_time)
+            continue
+
+        wait_time = crawl.wait_time(in_flight, max_in_flight)
+        if parsing and (wait_time is None or wait_time > PARSE_POLL_SECONDS):
+            # parses finished while fetches are pending are merged
+            wait_time = PARSE_POLL_SECONDS
+        completed = executor.next_completed(wait_time)
+        if completed is None:
+            # frontier let one more page to be fetched or parse finished
+            continue
+        (parent_url, url), (result, is_normalized) = completed
+        is_page_reached, content = result
+        if parse_pool and is_page_reached and not is_normalized:
+            parsed = parse_pool.apply_async(_parse_outgoing, (url, content))
+            parsing.append((parent_url, url, parsed))
+        else:
+            crawl.add_result(parent_url, url, result, is_normalized)
+    _log_finished(crawl)
+    return crawl.graph
+
+
+def _pop_parsed(parsing, block=False):
+    ''' Take the page which parsing is finished, the page failed
+    to be parsed is not reached
+
+    @types: deque[tuple[str?, str, multiprocessing.pool.AsyncResult]], \
+            bool -> tuple[str?, str, tuple[bool, set[str]?]]?
+    @param block: wait for the earliest page if none is finished
+    @return: parent URL, URL and the result of the page
+    '''
+    for i, (parent_url, url, parsed) in enumerate(parsing):
+        if parsed.ready():
+            del parsing[i]
+            break
+    else:
+        if not (block and parsing):
+            return None
+        parent_url, url, parsed = parsing.popleft()
+    try:
+        return parent_url, url, (True, parsed.get())
+    except Exception:
+        logger.exception("Failed to parse %s" % url)
+        return parent_url, url, (False, None)
+
+
+def _window(max_in_flight, max_page_size=None, content_budget=None):
+    ''' Max number of pages in flight, each of them reserves max page size
+    of the content budget, so the content held by the crawl stays within
+    the budget whatever size pages are. The budget is not applied if max
+    page size is not specified.
+
+    @types: int, int?, int? -> int'''
+    if max_page_size and content_budget:
+        return max(1, min(max_in_flight, content_budget // max_page_size))
+    return max_in_flight
+
+
+def _log_finished(crawl):
+    '@types: _Crawl'
+    logger.info("crawl finished, %s, %s" % (crawl.stats, _normalizer))
+
+
+def _with_cache(cache, crawl_options):
+    ''' Options of the crawl with the cache listening to finished pages
+    @types: linkcache.LinkCache?, dict[str, O] -> dict[str, O]'''
+    if cache is None:
+        return crawl_options
+    listeners = crawl_options.get("listeners", ())
+    return dict(crawl_options, listeners=list(listeners) + [cache])
+
+
+class _Crawl:
+    ''' State of the crawl shared by the engines: frontier of pages
+    to visit, the remaining limit and the collected graph
+
+    Each URL is fetched at most once, only outgoing edges of the reached
+    pages are recorded. Every URL in the graph URL table is either queued,
+    in flight or finished, so the table is the seen-set.
+    '''
 
-                [info_by_url.get(u).incomming.add(url) for u in visited]
+    def __init__(self, start_url, limit, listeners=(), resume=(),
+                 frontier=None, max_edges_in_memory=None,
+                 max_urls_in_memory=None):
+        '''
+        @types: str, int, list[CrawlListener], \
+                iterable[tuple[str, tuple, bool]], frontier.Frontier?, int?
+        @param listeners: listeners notified as pages are finished
+        @param resume: results of the pages finished by interrupted crawl
+                       in order they were finished, see restore
+        @param frontier: frontier of the pages to visit, by default pages
+                         are visited in order they were found
+        @param max_edges_in_memory: edges of the graph over this number
+                                    are spilled to disk, see graph.Graph
+        @param max_urls_in_memory: URLs of the graph over this number are
+                                   moved to disk, see graph.UrlTable
+        '''
+        start_url = _normalize_url(start_url)
+        self.limit = limit
+        self.listeners = listeners
+        self.graph = graph.Graph(max_edges_in_memory=max_edges_in_memory,
+                                 max_urls_in_memory=max_urls_in_memory)
+        self.graph.urls.intern(start_url)
+        self.stats = CrawlStats()
+        self.frontier = frontiers.FifoFrontier([(None, start_url)])
+        self._truncated_pending = set()
+        resume and self.restore(resume)
+        if frontier is not None:
+            # restored pages are linked again as many times as they were,
+            # so the frontier ordering by links keeps their priority
+            links = resume and self._count_links(
+                url for _, url in self.frontier) or {}
+            for parent_url, url in self.frontier:
+                frontier.push(parent_url, url)
+                for _ in xrange(links.get(url, 1) - 1):
+                    frontier.linked(parent_url, url)
+            self.frontier = frontier
+
+    def restore(self, results):
+        ''' Restore state of the crawl replaying results of the finished
+        pages, pages which were in flight are queued again
+
+        @types: iterable[tuple[str, tuple[bool, iterable[str]?], bool]]
+        @param results: result of each page with flag whether the page is
+                        truncated'''
+        listeners, self.listeners = self.listeners, ()
+        finished = set()
+        for url, result, is_truncated in results:
+            is_truncated and self.mark_truncated(url)
+            self.add_result(None, url, result)
+            finished.add(url)
+        self.listeners = listeners
+        self.frontier = frontiers.FifoFrontier(
+            (parent_url, url) for parent_url, url in self.frontier
+            if url not in finished)
+        logger.info("crawl restored, %s" % self.stats)
+
+    def _count_links(self, urls):
+        ''' Number of reached pages linking to each of the URLs
+        @types: iterable[str] -> dict[str, int]'''
+        url_by_id = dict((self.graph.urls.id(url), url) for url in urls)
+        links = defaultdict(int)
+        for _, outgoing in self.graph.iteroutgoing_ids():
+            for id_ in outgoing:
+                if id_ in url_by_id:
+                    links[url_by_id[id_]] += 1
+        return links
+
+    def can_dispatch(self, in_flight, max_in_flight):
+        ''' Whether one more page can be fetched
+        @types: int, int -> bool'''
+        return (self._has_room(in_flight, max_in_flight)
+                and self.frontier.is_ready())
+
+    def wait_time(self, in_flight, max_in_flight):
+        ''' Seconds to wait before one more page can be fetched when the
+        window has room but queued pages are held back by the frontier
+
+        @types: int, int -> float?
+        @return: None if waiting does not let more pages to be fetched'''
+        if self._has_room(in_flight, max_in_flight):
+            return self.frontier.wait_time()
+        return None
+
+    def _has_room(self, in_flight, max_in_flight):
+        ''' In-flight pages never exceed the limit as each of them
+        may turn out to be reached
+        @types: int, int -> bool'''
+        return in_flight < min(max_in_flight, self.limit)
+
+    def report_progress(self, in_flight):
+        ''' Notify listeners about the window of the crawl
+        @types: int'''
+        for listener in self.listeners:
+            listener.crawl_progress(in_flight, len(self.frontier))
+
+    def next_page(self):
+        '@types: -> tuple[str?, str]'
+        parent_url, url = self.frontier.pop()
+        for listener in self.listeners:
+            listener.page_dispatched(url)
+        return parent_url, url
+
+    def mark_truncated(self, url):
+        ''' Content of the page in flight is truncated, the page is
+        reported when its result is added
+        @types: str'''
+        self._truncated_pending.add(url)
+
+    def add_result(self, parent_url, url, result, is_normalized=False):
+        '''
+        @types: str?, str, tuple[bool, iterable[str]?], bool
+        @param is_normalized: whether links are already normalized URLs
+                              without fragment references
+        '''
+        is_page_reached, urls = result
+        self.frontier.done(url)
+        is_truncated = url in self._truncated_pending
+        is_truncated and self._truncated_pending.discard(url)
+        if is_page_reached:
+            self.limit = self.limit - 1
+            self.stats.reached += 1
+            urls = is_normalized and urls or _outgoing_urls(url, urls)
+
+            graph_ = self.graph
+            unseen = set(u for u in urls if u not in graph_.urls)
+            graph_.add_page(url, urls)
+            if is_truncated:
+                self.stats.truncated += 1
+                graph_.truncated.add(url)
+                for listener in self.listeners:
+                    listener.page_truncated(url)
+
+            for u in urls:
+                if u in unseen:
+                    self.frontier.push(url, u)
+                elif u not in graph_:
+                    # URL is queued, in flight or failed
+                    self.stats.duplicates_skipped += 1
+                    self.frontier.linked(url, u)
+            for listener in self.listeners:
+                listener.page_reached(url, urls)
+            logging.debug("OK         %s <-- %s" % (url, parent_url))
+        else:
+            self.stats.failed += 1
+            for listener in self.listeners:
+                listener.page_failed(url)
+            logging.debug("FAILED     %s <-- %s" % (url, parent_url))
+
+
+class CrawlListener:
+    ''' Listener of the crawl events, does nothing by default '''
+
+    def page_dispatched(self, url):
+        ''' Page is taken from the frontier to be fetched
+        @types: str'''
+        pass
+
+    def page_truncated(self, url):
+        ''' Content of the page was truncated to max page size, so some
+        of its links may be missing. Notified right before page is reached.
+        @types: str'''
+        pass
+
+    def page_reached(self, url, outgoing):
+        ''' Page is reached and its outgoing links are final
+        @types: str, set[str]'''
+        pass
+
+    def page_failed(self, url):
+        '@types: str'
+        pass
+
+    def request_done(self, method, url, seconds, status_code):
+        ''' HTTP request of the page is done
+        @types: str, str, float, int?
+        @param status_code: None if no response is received'''
+        pass
+
+    def page_parsed(self, url, size, read_seconds, parse_seconds):
+        ''' Content of the page is read and parsed, when pages are parsed
+        in the parse pool only reading is measured
+
+        @types: str, int, float, float
+        @param size: number of bytes of the body downloaded
+        @param parse_seconds: time of parsing without time spent waiting
+                              for the content
+        '''
+        pass
+
+    def crawl_progress(self, in_flight, queued):
+        ''' Window of the crawl after one more page is done
+        @types: int, int
+        @param in_flight: number of pages fetched or parsed
+        @param queued: number of pages in the frontier
+        '''
+        pass
+
+
+class CrawlStats:
+    ''' Counters of the crawl '''
+
+    def __init__(self):
+        self.reached = 0
+        self.failed = 0
+        # fetches saved as URL was already queued, in flight or failed
+        self.duplicates_skipped = 0
+        self.truncated = 0
+
+    def __str__(self):
+        return ("reached: %s, failed: %s, duplicate fetches skipped: %s, "
+                "truncated: %s" % (self.reached, self.failed,
+                                   self.duplicates_skipped, self.truncated))
+
+
+def _outgoing_urls(url, links):
+    ''' Normalize links of the page skipping fragment references
+    @types: str, iterable[str] -> set[str]'''
+    return set(_normalize_url(url, u)
+               for u in ifilterfalse(_is_fragment_ref, links))
+
+
+def _parse_outgoing(url, content):
+    ''' Parse outgoing URLs from the page content,
+    runs in the process of parse pool
+
+    @types: str, str -> set[str]'''
+    return _outgoing_urls(url, extractor.iter_links((content,)))
+
+
+def _read_content(content_info):
+    ''' Read whole content to send it to the parse pool
+    @types: tuple[bool, iterable[str]?] -> tuple[bool, str?]'''
+    is_page_reached, content = content_info
+    return is_page_reached, ''.join(content) if content is not None else None
+
+
+def _fetch(url, do_head_fn, do_get_fn, parse_fn=None, cache=None,
+           listeners=(), max_page_size=None, on_truncated=None):
+    ''' Fetch outgoing URLs of the page, the page cached by the previous
+    crawl is validated with conditional GET request instead of HEAD,
+    its cached links are reused if the page is not modified
+
+    @types: str, callable?, callable, callable?, linkcache.LinkCache?, \
+            list[CrawlListener], int?, (str -> None)? \
+            -> tuple[tuple[bool, iterable[str]?], bool]
+    @param listeners: listeners notified as requests are done and
+                      the page is parsed
+    @param max_page_size: max number of characters of the content read
+    @param on_truncated: called with URL if the content is truncated
+    @return: result of the page and flag whether its links are already
+             normalized, as cached links are, the page is not reached if
+             its request or reading of its body fails
+    '''
+    parse_fn = parse_fn or _parse_a_tag_urls
+    if max_page_size:
+        parse_fn = partial(_truncating_parse, max_page_size,
+                           partial(on_truncated or _ignore, url), parse_fn)
+    if listeners:
+        # GET response is kept to tell the size of its body once parsed
+        received = []
+        do_head_fn = do_head_fn and partial(
+            _timed_request, listeners, "HEAD", url, do_head_fn)
+        do_get_fn = partial(_timed_request, listeners, "GET", url, do_get_fn,
+                            received=received)
+        parse_fn = partial(_timed_parse, listeners, url, parse_fn, received)
+    try:
+        if cache is None:
+            return _get_outgoing(url, do_head_fn, do_get_fn, parse_fn), False
+        entry = cache.get(url)
+        if entry is None:
+            do_get_fn = partial(_remembering_get, cache, url, do_get_fn)
+            return _get_outgoing(url, do_head_fn, do_get_fn, parse_fn), False
+        response, = do_get_fn((url,), headers=entry.conditional_headers())
+        cache.remember(url, response, entry)
+        if (response is not None
+                and response.status_code == httplib.NOT_MODIFIED):
+            return (True, entry.outgoing), True
+        return parse_fn(_parse_streamed_get_response(response)), False
+    except Exception:
+        # request or reading of the body failed, the page is not reached
+        logger.exception("Failed to fetch %s" % url)
+        return (False, None), False
+
+
+def _truncating_parse(max_page_size, on_truncated, parse_fn, content_info):
+    ''' Parse the prefix of the content of max page size, the rest
+    of the content is not read
+
+    @types: int, (-> None), callable, tuple[bool, str|iterable[str]?] \
+            -> tuple[bool, O]'''
+    is_page_reached, content = content_info
+    if content is None:
+        return parse_fn(content_info)
+    if isinstance(content, basestring):
+        content = (content,)
+    return parse_fn((is_page_reached,
+                     _truncated(content, max_page_size, on_truncated)))
+
+
+def _truncated(chunks, max_size, on_truncated):
+    ''' Chunks of the content prefix of max size
+    @types: iterable[str], int, (-> None) -> iterable[str]'''
+    size = 0
+    for chunk in chunks:
+        if size + len(chunk) > max_size:
+            yield chunk[:max_size - size]
+            on_truncated()
+            # the rest of the body is not read, its response is closed
+            # releasing the connection
+            getattr(chunks, "close", _ignore)()
+            return
+        size += len(chunk)
+        yield chunk
+
+
+def _ignore(*args):
+    pass
+
+
+def _timed_request(listeners, method, url, request_fn, urls, received=None,
+                   **kwargs):
+    ''' Do requests notifying listeners about their time
+    @types: list[CrawlListener], str, str, callable, list[str], \
+            list[requests.Response]?, **O -> list[requests.Response]
+    @param received: list the responses are added to'''
+    started = time.time()
+    responses = request_fn(urls, **kwargs)
+    seconds = time.time() - started
+    if received is not None:
+        received.extend(responses)
+    for response in responses:
+        status_code = response is not None and response.status_code or None
+        for listener in listeners:
+            listener.request_done(method, url, seconds, status_code)
+    return responses
+
+
+def _timed_parse(listeners, url, parse_fn, received, content_info):
+    ''' Parse content notifying listeners about its size, time of reading
+    and time of parsing
+
+    @types: list[CrawlListener], str, callable, list[requests.Response], \
+            tuple[bool, iterable[str]?] -> tuple[bool, O]
+    @param received: responses of the page, the last one has the content
+    '''
+    is_page_reached, content = content_info
+    if content is None:
+        return parse_fn(content_info)
+    chunks = _TimedChunks(content)
+    started = time.time()
+    result = parse_fn((is_page_reached, chunks))
+    parse_seconds = time.time() - started - chunks.seconds
+    size = _downloaded_size(received[-1] if received else None,
+                            chunks.size)
+    for listener in listeners:
+        listener.page_parsed(url, size, chunks.seconds, parse_seconds)
+    return result
 
-                parent_to_url_queue.extend(izip(repeat(url), candidates))
-                logging.debug("OK         %s <-- %s" % (url, parent_url))
-            else:
-                logging.debug("FAILED     %s <-- %s" % (url, parent_url))
-    return info_by_url
 
+def _downloaded_size(response, read_size):
+    ''' Number of bytes of the body read from the connection, as compressed
+    body is read it differs from the size of the content. Content-Length is
+    taken if the response does not count the bytes.
 
-def _get_outgoings(urls, do_head_fn, do_get_fn):
+    @types: requests.Response?, int -> int
+    @param read_size: size of the content read, taken if nothing else is
+                      known about the body
+    '''
+    size = getattr(response, "downloaded_size", None)
+    raw = getattr(response, "raw", None)
+    if not isinstance(size, (int, long)) and hasattr(raw, "tell"):
+        size = raw.tell()
+    if isinstance(size, (int, long)):
+        return size
+    try:
+        return int(response.headers.get("content-length"))
+    except (AttributeError, TypeError, ValueError):
+        return read_size
+
+
+class _TimedChunks:
+    ''' Chunks of the content counting their size and time spent
+    waiting for them '''
+
+    def __init__(self, chunks):
+        '@types: iterable[str]'
+        self._chunks = iter(chunks)
+        self.size = 0
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def close(self):
+        getattr(self._chunks, "close", _ignore)()
+
+    def next(self):
+        started = time.time()
+        try:
+            chunk = next(self._chunks)
+        finally:
+            self.seconds += time.time() - started
+        self.size += len(chunk)
+        return chunk
+
+
+def _remembering_get(cache, url, do_get_fn, urls):
+    ''' Do GET request remembering validators of the response in cache
+    @types: linkcache.LinkCache, str, callable, list[str] \
+            -> list[requests.Response]'''
+    responses = do_get_fn(urls)
+    for response in responses:
+        cache.remember(url, response)
+    return responses
+
+
+def _get_outgoing(url, do_head_fn, do_get_fn, parse_fn=None):
+    ''' Get outgoing URLs for the single URL
+    @types: str, callable, callable, callable? -> tuple[bool, set[str]?]'''
+    return next(_get_outgoings((url,), do_head_fn, do_get_fn,
+                               parse_fn or _parse_a_tag_urls))
+
+
+def _get_outgoings(urls, do_head_fn, do_get_fn, parse_fn=None):
     ''' Get outgoing URLs for each specified URL
 
     Approach used here is
@@ -95,10 +758,22 @@ def _get_outgoings(urls, do_head_fn, do_get_fn):
     3) return result in such order so it will correspond to the order of
        asked URLs
 
-    @types: iterable[str], callable, callable -> iterable[bool, list[str]]
+    When HEAD function is not specified content type is checked
+    on the headers of streamed GET response instead, the body is read
+    only for the pages of required type
+
+    @types: iterable[str], callable?, callable, callable? \
+            -> iterable[bool, list[str]]
+    @param parse_fn: function parsing pair of flag whether page is reached
+                     and its content, by default parses <a> tag URLs
     @return: list of pairs where first is flag whether page is reached
              and parsed URLs from it'''
     urls = tuple(urls)
+    parse_fn = parse_fn or _parse_a_tag_urls
+
+    if not do_head_fn:
+        contents = do_get_fn(urls)
+        return imap(F(parse_fn) << _parse_streamed_get_response, contents)
 
     # get head information for all passed URLs
     heads = do_head_fn(urls)
@@ -110,16 +785,18 @@ def _get_outgoings(urls, do_head_fn, do_get_fn):
 
     urls_with_outgoings = map(second, n_urls)
     contents = do_get_fn(urls_with_outgoings)
-    outgoings = imap(F(_parse_a_tag_urls) << _parse_get_response, contents)
+    outgoings = imap(F(parse_fn) << _parse_get_response, contents)
 
     outgoings_per_n_url = dict(izip(urls_with_outgoings, outgoings))
     # restore order of results according to passed URLs
     return (outgoings_per_n_url.get(u, (False, None)) for u in urls)
 
 
-def do_request(request_fn, realize_fn, urls):
-    '@types: callable, callable, list[str] -> list[requests.Response]'
-    return realize_fn((request_fn(u) for u in urls))
+def do_request(request_fn, realize_fn, urls, headers=None):
+    '''@types: callable, callable, list[str], dict[str, str]? \
+               -> list[requests.Response]'''
+    kwargs = headers and {"headers": headers} or {}
+    return realize_fn((request_fn(u, **kwargs) for u in urls))
 
 
 def _parse_head_response(r):
@@ -127,22 +804,50 @@ def _parse_head_response(r):
     code = None
     type_ = None
     if r:
-        code, type_ = r.status_code, r.headers.get('content-type')
-        if type_:
-            # truncate charset information
-            type_ = type_.split(';', 1)[0]
+        code = r.status_code
+        type_ = _parse_mime_type(r.headers.get('content-type'))
     return HeadResponse(code, type_)
 
 
+def _parse_mime_type(content_type):
+    '@types: str? -> str?'
+    # truncate charset information
+    return content_type and content_type.split(';', 1)[0]
+
+
 def _parse_get_response(r):
-    '@types: requests.Response -> tuple[bool, str]'
+    ''' Content of successful response is read lazily in chunks
+    @types: requests.Response -> tuple[bool, iterable[str]?]'''
     if r:
-        is_successful = r.status_code == requests.codes.ok
-        content = is_successful and r.text or None
+        is_successful = r.status_code == httplib.OK
+        content = is_successful and _iter_content(r) or None
         return is_successful, content
     return False, None
 
 
+def _iter_content(r):
+    ''' Chunks of the content, the response is closed as soon as reading
+    is finished or stopped, so the connection is released either way
+    @types: requests.Response -> iterable[str]'''
+    try:
+        for chunk in r.iter_content(CHUNK_SIZE, decode_unicode=True):
+            yield chunk
+    finally:
+        r.close()
+
+
+def _parse_streamed_get_response(r):
+    ''' Parse GET response which body is not read yet, connection is
+    dropped without reading the body if content type is not supported
+
+    @types: requests.Response -> tuple[bool, iterable[str]?]'''
+    if not _has_required_mime_type(_parse_head_response(r)):
+        if r is not None:
+            r.close()
+        return False, None
+    return _parse_get_response(r)
+
+
 HeadResponse = namedtuple("HeadResponse", ("status_code", "mime_type"))
 
 
@@ -170,26 +875,25 @@ def _common_by_index(dst, src):
             yield idx, dst_dict[idx]
 
 
-A_TAG_HREF_RE = re.compile("<a\s+.*?href=\"(.*?)\"")
-
-
 def _parse_a_tag_urls(content_info):
-    '@types: tuple[bool, str] -> tuple[bool, set[str]]'
+    '''
+    @types: tuple[bool, str|iterable[str]?] -> tuple[bool, set[str]]
+    @param content_info: flag whether page is reached and its content,
+                         either whole or in chunks
+    '''
     is_page_reached, content = content_info
+    if isinstance(content, basestring):
+        content = (content,)
     return (is_page_reached,
             set((is_page_reached and content)
-                and A_TAG_HREF_RE.findall(content)
+                and extractor.iter_links(content)
                 or ()))
 
 
 def _normalize_url(url, uri=None):
-    '@types: str, str? -> str'
-    result = uri or url
-    if uri and not urlparse.urlparse(uri).netloc:
-        result = urlparse.urljoin(url, uri)
-    if not urlparse.urlparse(result).scheme:
-        result = "http://%s" % result
-    return result
+    ''' Canonical URL of the link found on the page, see urlnorm
+    @types: str, str? -> str'''
+    return _normalizer.normalize(url, uri)
 
 
 def new_url_info(incomming=None, outgoing=None):
@@ -199,10 +903,13 @@ def new_url_info(incomming=None, outgoing=None):
 
 
 def url_to_info_as_pure_dict(graph):
-    '@types: dict[str, UrlInfo] -> dict[str, dict[str, list]]'
-    return dict(
-        (
-            (k, {"incomming": list(v.incomming), "outgoing": list(v.outgoing)})
-            for k, v in graph.iteritems()
-        )
-    )
+    ''' Pages of the graph as plain dicts, truncated pages are marked
+    @types: dict[str, UrlInfo] -> dict[str, dict[str, O]]'''
+    truncated = getattr(graph, "truncated", ())
+    result = {}
+    for k, v in graph.iteritems():
+        page = {"incomming": list(v.incomming), "outgoing": list(v.outgoing)}
+        if k in truncated:
+            page["truncated"] = True
+        result[k] = page
+    return result
@@ -0,0 +1,166 @@
+''' Executors run fetch tasks for the crawl loop and hand results back
+in the order the tasks complete, not in the order they were submitted.
+'''
+import sys
+from functools import partial
+from collections import deque
+
+
+class Executor:
+
+    def submit(self, key, fn, *args):
+        ''' Schedule call of fn with args, result is reported with the key
+        @types: object, callable, *object
+        '''
+        raise NotImplementedError()
+
+    def next_completed(self, timeout=None):
+        ''' Block until one of the submitted tasks completes
+
+        @types: float? -> tuple[object, object]?
+        @param timeout: max number of seconds to wait, waits until
+                        completion if not specified
+        @return: pair of the task key and the task result, None if
+                 none of the tasks completed within timeout
+        @raise Exception: exception raised by the task itself
+        '''
+        raise NotImplementedError()
+
+    def __len__(self):
+        ''' Number of submitted tasks which results are not taken yet
+        @types: -> int
+        '''
+        raise NotImplementedError()
+
+    def guarded(self, obj):
+        ''' Object shared by the tasks and the crawl loop, tasks of
+        executors running them in parallel threads call its methods
+        one at a time
+
+        @types: T -> T'''
+        return obj
+
+    def close(self):
+        pass
+
+
+class SerialExecutor(Executor):
+    ''' Runs tasks one by one in the calling thread, the task runs
+    when its result is asked, so timeout is never reached '''
+
+    def __init__(self):
+        self._tasks = deque()
+
+    def submit(self, key, fn, *args):
+        self._tasks.append((key, fn, args))
+
+    def next_completed(self, timeout=None):
+        key, fn, args = self._tasks.popleft()
+        return key, fn(*args)
+
+    def __len__(self):
+        return len(self._tasks)
+
+
+class _QueueExecutor(Executor):
+    ''' Tasks put their results to the queue of completed tasks '''
+
+    def __init__(self, done, empty):
+        '''
+        @types: Queue, type
+        @param empty: exception raised by the queue on timeout
+        '''
+        self._done = done
+        self._empty = empty
+        self._in_flight = 0
+
+    def _run(self, key, fn, args):
+        try:
+            self._done.put((key, fn(*args), None))
+        except Exception:
+            self._done.put((key, None, sys.exc_info()))
+
+    def next_completed(self, timeout=None):
+        try:
+            key, result, exc_info = self._done.get(timeout=timeout)
+        except self._empty:
+            return None
+        self._in_flight -= 1
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return key, result
+
+    def __len__(self):
+        return self._in_flight
+
+
+class GeventExecutor(_QueueExecutor):
+    ''' Runs each task in a separate greenlet of the bounded pool '''
+
+    def __init__(self, size):
+        '@types: int'
+        import gevent.pool
+        import gevent.queue
+        _QueueExecutor.__init__(self, gevent.queue.Queue(),
+                                gevent.queue.Empty)
+        self._pool = gevent.pool.Pool(size)
+
+    def submit(self, key, fn, *args):
+        self._in_flight += 1
+        self._pool.spawn(self._run, key, fn, args)
+
+    def close(self):
+        self._pool.kill()
+
+
+class ThreadExecutor(_QueueExecutor):
+    ''' Runs tasks in the pool of threads, nothing in the interpreter
+    is patched. Calls of the guarded objects are serialized by the lock
+    shared by all of them.
+    '''
+
+    def __init__(self, size):
+        '@types: int'
+        import Queue
+        import threading
+        from concurrent import futures
+        _QueueExecutor.__init__(self, Queue.Queue(), Queue.Empty)
+        self._pool = futures.ThreadPoolExecutor(size)
+        self._lock = threading.RLock()
+        self._futures = set()
+
+    def submit(self, key, fn, *args):
+        self._in_flight += 1
+        future = self._pool.submit(self._run, key, fn, args)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+
+    def guarded(self, obj):
+        return _Guarded(obj, self._lock)
+
+    def close(self):
+        # tasks which are not started yet are dropped, the running ones
+        # are waited for so no thread outlives the crawl
+        for future in list(self._futures):
+            future.cancel()
+        self._pool.shutdown(wait=True)
+
+
+class _Guarded:
+    ''' Proxy calling methods of the object while holding the lock '''
+
+    def __init__(self, obj, lock):
+        '@types: T, threading.RLock'
+        self._obj = obj
+        self._lock = lock
+
+    def __getattr__(self, name):
+        value = getattr(self._obj, name)
+        if callable(value):
+            return partial(_locked, self._lock, value)
+        return value
+
+
+def _locked(lock, fn, *args, **kwargs):
+    with lock:
+        return fn(*args, **kwargs)
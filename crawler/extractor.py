@@ -0,0 +1,55 @@
+''' Incremental extraction of the links from <a> tags
+
+Document is consumed in chunks, only the incomplete tag at the end of
+the chunk is carried over to the next one, so whole document is never
+held in memory. Matching never crosses tag boundaries, so each character
+is scanned a bounded number of times and extraction takes linear time.
+'''
+import re
+
+# longer incomplete tags are considered broken and skipped
+MAX_TAG_LENGTH = 16 * 1024
+
+# case-insensitive flag is avoided as it makes matching twice slower
+A_TAG_HREF_RE = re.compile(
+    r"""<[aA]\s(?:[^<>]*?\s)?[hH][rR][eE][fF]\s*=\s*"""
+    r"""(?:"([^"<>]*)"|'([^'<>]*)'|([^\s"'<>]+))"""
+    # link is taken only from the complete tag
+    r"""(?=[^<>]*>)""")
+
+
+class LinkExtractor:
+
+    def __init__(self):
+        self._tail = ''
+
+    def feed(self, chunk):
+        ''' Consume next chunk of the document
+
+        @types: str -> list[str]
+        @return: links of the tags completed in this chunk
+        '''
+        buffer = self._tail + chunk
+        self._tail = _incomplete_tag(buffer)
+        return [double_quoted or single_quoted or unquoted
+                for double_quoted, single_quoted, unquoted
+                in A_TAG_HREF_RE.findall(buffer)]
+
+
+def _incomplete_tag(buffer):
+    ''' Get the last tag if it is not closed, links are never taken
+    from such tag as matching requires closing bracket
+    @types: str -> str'''
+    start = buffer.rfind('<')
+    if start == -1 or buffer.find('>', start) != -1:
+        return ''
+    tail = buffer[start:]
+    return len(tail) <= MAX_TAG_LENGTH and tail or ''
+
+
+def iter_links(chunks):
+    '@types: iterable[str] -> iterable[str]'
+    extractor = LinkExtractor()
+    for chunk in chunks:
+        for link in extractor.feed(chunk):
+            yield link
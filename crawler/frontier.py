@@ -0,0 +1,239 @@
+''' Frontiers decide in which order queued pages are dispatched
+
+Frontier holds pages that are found but not fetched yet and hands
+them to the crawl loop one by one, the crawl tells the frontier when
+the dispatched page is done.
+'''
+import time
+import heapq
+import urlparse
+from itertools import count
+from collections import deque
+
+# default max number of pages fetched from one host at the same time
+DEFAULT_MAX_PER_HOST = 8
+
+
+class Frontier:
+
+    def push(self, parent_url, url):
+        '@types: str?, str'
+        raise NotImplementedError()
+
+    def pop(self):
+        ''' Take the next page to dispatch, call only if frontier is ready
+        @types: -> tuple[str?, str]'''
+        raise NotImplementedError()
+
+    def done(self, url):
+        ''' Dispatched page is done, either reached or failed
+        @types: str'''
+        pass
+
+    def linked(self, parent_url, url):
+        ''' Reached page links to the page which was already found, the page
+        is either queued, in flight or failed
+        @types: str, str'''
+        pass
+
+    def is_ready(self):
+        ''' Whether the page can be taken right now
+        @types: -> bool'''
+        raise NotImplementedError()
+
+    def wait_time(self):
+        ''' Seconds to wait before the next page can be taken
+        @types: -> float?
+        @return: None if no page gets ready by waiting'''
+        return None
+
+    def __len__(self):
+        ''' Number of queued pages
+        @types: -> int'''
+        raise NotImplementedError()
+
+
+class FifoFrontier(Frontier):
+    ''' Pages are dispatched in order they were found regardless
+    of their host '''
+
+    def __init__(self, pages=()):
+        '@types: iterable[tuple[str?, str]]'
+        self._pages = deque(pages)
+
+    def push(self, parent_url, url):
+        self._pages.append((parent_url, url))
+
+    def pop(self):
+        return self._pages.popleft()
+
+    def is_ready(self):
+        return bool(self._pages)
+
+    def __iter__(self):
+        return iter(self._pages)
+
+    def __len__(self):
+        return len(self._pages)
+
+
+class HostFrontier(Frontier):
+    ''' Pages are queued per host and hosts take turns, so the window of
+    in-flight pages is spread over all known hosts instead of being
+    filled by the links of the last reached page
+
+    Host is not dispatched to while it has max_per_host pages in flight
+    or earlier than min_delay seconds after its previous page was
+    dispatched.
+    '''
+
+    def __init__(self, max_per_host=DEFAULT_MAX_PER_HOST, min_delay=0,
+                 clock=time.time):
+        '''
+        @types: int, float, (-> float)
+        @param max_per_host: max number of pages fetched from one host
+                             at the same time
+        @param min_delay: min number of seconds between dispatches
+                          of the pages of one host
+        '''
+        self._max_per_host = max_per_host
+        self._min_delay = min_delay
+        self._clock = clock
+        self._pages_by_host = {}
+        self._in_flight_by_host = {}
+        self._next_time_by_host = {}
+        # host is scheduled when it has queued pages and a free slot,
+        # either it is ready in turn or it waits for the delay to pass
+        self._ready_hosts = deque()
+        self._waiting_hosts = []
+        self._size = 0
+
+    def push(self, parent_url, url):
+        host = _host(url)
+        pages = self._pages_by_host.get(host)
+        if pages is None:
+            pages = self._pages_by_host[host] = deque()
+        pages.append((parent_url, url))
+        self._size += 1
+        if len(pages) == 1 and self._has_free_slot(host):
+            self._schedule(host)
+
+    def pop(self):
+        self._release_waiting()
+        host = self._ready_hosts.popleft()
+        pages = self._pages_by_host[host]
+        page = pages.popleft()
+        if not pages:
+            del self._pages_by_host[host]
+        self._size -= 1
+        self._in_flight_by_host[host] = self._in_flight_by_host.get(
+            host, 0) + 1
+        if self._min_delay:
+            self._next_time_by_host[host] = self._clock() + self._min_delay
+        if pages and self._has_free_slot(host):
+            self._schedule(host)
+        return page
+
+    def done(self, url):
+        host = _host(url)
+        in_flight = self._in_flight_by_host.get(host)
+        if not in_flight:
+            return
+        if in_flight == 1:
+            del self._in_flight_by_host[host]
+        else:
+            self._in_flight_by_host[host] = in_flight - 1
+        if in_flight == self._max_per_host and host in self._pages_by_host:
+            self._schedule(host)
+
+    def is_ready(self):
+        self._release_waiting()
+        return bool(self._ready_hosts)
+
+    def wait_time(self):
+        if self.is_ready():
+            return 0
+        if self._waiting_hosts:
+            return max(0, self._waiting_hosts[0][0] - self._clock())
+        return None
+
+    def __len__(self):
+        return self._size
+
+    def _has_free_slot(self, host):
+        '@types: str -> bool'
+        return self._in_flight_by_host.get(host, 0) < self._max_per_host
+
+    def _schedule(self, host):
+        '@types: str'
+        next_time = self._next_time_by_host.get(host)
+        if next_time is not None and next_time > self._clock():
+            heapq.heappush(self._waiting_hosts, (next_time, host))
+        else:
+            self._ready_hosts.append(host)
+
+    def _release_waiting(self):
+        ''' Hosts which delay has passed take their turn '''
+        waiting = self._waiting_hosts
+        if waiting:
+            now = self._clock()
+            while waiting and waiting[0][0] <= now:
+                self._ready_hosts.append(heapq.heappop(waiting)[1])
+
+
+class PriorityFrontier(Frontier):
+    ''' Pages linked by more reached pages are dispatched first, pages
+    linked by the same number of pages are dispatched in order they were
+    found
+
+    Queued page moves up as soon as one more link to it is found: its heap
+    entry is invalidated and the new one is pushed, the heap is rebuilt
+    without invalidated entries once they outnumber the queued pages.
+    '''
+
+    def __init__(self):
+        # entry is [-number of links, order found, parent URL, URL],
+        # URL of the invalidated entry is None
+        self._heap = []
+        self._entry_by_url = {}
+        self._order = count()
+
+    def push(self, parent_url, url):
+        self._push([-1, next(self._order), parent_url, url])
+
+    def linked(self, parent_url, url):
+        entry = self._entry_by_url.get(url)
+        if entry is not None:
+            links, order, parent_url, _ = entry
+            entry[-1] = None
+            self._push([links - 1, order, parent_url, url])
+            if len(self._heap) > 2 * len(self._entry_by_url):
+                self._compact()
+
+    def _push(self, entry):
+        '@types: list'
+        self._entry_by_url[entry[-1]] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _compact(self):
+        ''' Drop invalidated entries from the heap '''
+        self._heap = [entry for entry in self._heap if entry[-1] is not None]
+        heapq.heapify(self._heap)
+
+    def pop(self):
+        while True:
+            _, _, parent_url, url = heapq.heappop(self._heap)
+            if url is not None:
+                del self._entry_by_url[url]
+                return parent_url, url
+
+    def is_ready(self):
+        return bool(self._entry_by_url)
+
+    def __len__(self):
+        return len(self._entry_by_url)
+
+
+def _host(url):
+    '@types: str -> str'
+    return urlparse.urlparse(url).netloc.lower()
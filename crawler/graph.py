@@ -0,0 +1,328 @@
+''' Compact representation of the crawled graph
+
+Each URL string is stored once in the URL table and edges reference
+URLs by integer id, adjacency of each page is kept in array of
+unsigned ints instead of the set of strings. Only outgoing edges are
+added while crawling, incoming edges are derived from them when first
+queried. Edges over the memory budget are spilled to the temporary file,
+URLs over their own budget are moved to the temporary database.
+'''
+import struct
+import sqlite3
+import tempfile
+from array import array
+from collections import Mapping
+
+import collector
+
+# type code of the array item holding URL id
+ID_TYPE = 'I'
+# header of the chunk in the spill file: offset of the previous chunk
+# of the same page or -1 and the number of ids in the chunk
+_CHUNK_HEADER = struct.Struct("=qI")
+
+
+class UrlTable:
+    ''' Interned URLs, each of them is referenced by int id
+
+    URLs are held in memory till their number exceeds the budget, then all
+    of them are moved to the temporary SQLite database and looked up there.
+    Ids are given in order URLs are interned, so URLs in memory are those
+    with the largest ids.
+    '''
+
+    def __init__(self, max_urls_in_memory=None):
+        '''@types: int?
+        @param max_urls_in_memory: by default URLs are never moved to disk'''
+        self._max_urls_in_memory = max_urls_in_memory
+        self._id_by_url = {}
+        self._urls = []
+        # id of the first URL held in memory
+        self._first_id = 0
+        self._db = None
+
+    def intern(self, url):
+        '@types: str -> int'
+        id_ = self.id(url)
+        if id_ is None:
+            id_ = self._id_by_url[url] = len(self)
+            self._urls.append(url)
+            if (self._max_urls_in_memory is not None
+                    and len(self._urls) > self._max_urls_in_memory):
+                self.spill()
+        return id_
+
+    def id(self, url):
+        '@types: str -> int?'
+        id_ = self._id_by_url.get(url)
+        if id_ is None and self._db is not None:
+            # URLs are looked up by hash as the index of hashes is much
+            # smaller than the one of URL strings
+            encoded = _encode(url)
+            for id_, stored in self._db.execute(
+                    "SELECT id, url FROM urls WHERE hash = ?",
+                    (hash(encoded),)):
+                if stored == encoded:
+                    return id_
+            return None
+        return id_
+
+    def url(self, id_):
+        '@types: int -> str'
+        if id_ >= self._first_id:
+            return self._urls[id_ - self._first_id]
+        return _decode(*self._db.execute(
+            "SELECT url, is_unicode FROM urls WHERE id = ?",
+            (id_,)).fetchone())
+
+    def spill(self):
+        ''' Move URLs held in memory to the database '''
+        if self._db is None:
+            # database of the empty name is the temporary file removed
+            # when the connection is closed
+            self._db = sqlite3.connect("")
+            self._db.text_factory = str
+            # nothing to recover if the crawl fails
+            self._db.execute("PRAGMA journal_mode = OFF")
+            self._db.execute("PRAGMA synchronous = OFF")
+            self._db.execute("CREATE TABLE urls (id INTEGER PRIMARY KEY, "
+                             "hash INTEGER, url TEXT, is_unicode INTEGER)")
+            self._db.execute("CREATE INDEX urls_hash ON urls (hash)")
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO urls (id, hash, url, is_unicode) "
+                "VALUES (?, ?, ?, ?)",
+                ((self._first_id + i, hash(_encode(url)), _encode(url),
+                  isinstance(url, unicode))
+                 for i, url in enumerate(self._urls)))
+        self._first_id += len(self._urls)
+        self._id_by_url = {}
+        self._urls = []
+
+    def __contains__(self, url):
+        return self.id(url) is not None
+
+    def __iter__(self):
+        ''' URLs in order of their ids '''
+        if self._db is not None:
+            for stored in self._db.execute(
+                    "SELECT url, is_unicode FROM urls ORDER BY id"):
+                yield _decode(*stored)
+        for url in self._urls:
+            yield url
+
+    def __len__(self):
+        return self._first_id + len(self._urls)
+
+    def close(self):
+        ''' Remove the database '''
+        self._db is not None and self._db.close()
+        self._db = None
+
+
+def _encode(url):
+    ''' URL as it is stored by the database, text is stored in UTF-8
+    @types: str|unicode -> str'''
+    return isinstance(url, unicode) and url.encode("utf-8") or url
+
+
+def _decode(stored, is_unicode):
+    ''' URL of the same type as it was before it was stored
+    @types: str, bool -> str|unicode'''
+    return is_unicode and stored.decode("utf-8") or stored
+
+
+class EdgeStore:
+    ''' Adjacency arrays of the pages keyed by page id
+
+    Arrays are held in memory till the number of edges in memory exceeds
+    the budget, then all of them are appended to the spill file as chunks.
+    Chunks of the same page are chained from the last one, so only the
+    offset of the last chunk is kept in memory for the spilled page.
+    '''
+
+    def __init__(self, max_edges_in_memory=None):
+        '''@types: int?
+        @param max_edges_in_memory: by default edges are never spilled'''
+        self._max_edges_in_memory = max_edges_in_memory
+        self._edges_in_memory = 0
+        self._ids_by_id = {}
+        self._offset_by_id = {}
+        self._size = 0
+        self._file = None
+
+    def extend(self, id_, ids):
+        ''' Add edges of the page, the page is added even without edges
+        @types: int, iterable[int]'''
+        ids_ = self._get_in_memory(id_)
+        size = len(ids_)
+        ids_.extend(ids)
+        self._added(len(ids_) - size)
+
+    def append(self, id_, other_id):
+        '@types: int, int'
+        self._get_in_memory(id_).append(other_id)
+        self._added(1)
+
+    def _get_in_memory(self, id_):
+        '@types: int -> array[int]'
+        ids_ = self._ids_by_id.get(id_)
+        if ids_ is None:
+            if id_ not in self._offset_by_id:
+                self._size += 1
+            ids_ = self._ids_by_id[id_] = array(ID_TYPE)
+        return ids_
+
+    def _added(self, n):
+        '@types: int'
+        self._edges_in_memory += n
+        if (self._max_edges_in_memory is not None
+                and self._edges_in_memory > self._max_edges_in_memory):
+            self.spill()
+
+    def spill(self):
+        ''' Append arrays held in memory to the spill file '''
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="crawler-edges-")
+        f = self._file
+        f.seek(0, 2)
+        offset_by_id = self._offset_by_id
+        for id_, ids_ in self._ids_by_id.iteritems():
+            offset = f.tell()
+            f.write(_CHUNK_HEADER.pack(offset_by_id.get(id_, -1),
+                                       len(ids_)))
+            ids_.tofile(f)
+            offset_by_id[id_] = offset
+        self._ids_by_id = {}
+        self._edges_in_memory = 0
+
+    def get(self, id_):
+        ''' Edges of the page read back from the spill file if needed,
+        the page without edges has empty array
+        @types: int -> array[int]'''
+        ids_ = array(ID_TYPE)
+        offset = self._offset_by_id.get(id_, -1)
+        chunks = []
+        while offset != -1:
+            self._file.seek(offset)
+            offset, count = _CHUNK_HEADER.unpack(
+                self._file.read(_CHUNK_HEADER.size))
+            chunk = array(ID_TYPE)
+            chunk.fromfile(self._file, count)
+            chunks.append(chunk)
+        for chunk in reversed(chunks):
+            ids_.extend(chunk)
+        ids_.extend(self._ids_by_id.get(id_, ()))
+        return ids_
+
+    def __contains__(self, id_):
+        return id_ in self._ids_by_id or id_ in self._offset_by_id
+
+    def __iter__(self):
+        for id_ in self._offset_by_id:
+            yield id_
+        for id_ in self._ids_by_id:
+            if id_ not in self._offset_by_id:
+                yield id_
+
+    def __len__(self):
+        return self._size
+
+    def close(self):
+        ''' Remove the spill file '''
+        self._file is not None and self._file.close()
+        self._file = None
+
+
+class Graph(Mapping):
+    ''' Graph of reached pages viewed as dict[str, collector.UrlInfo],
+    the view of the page is built on access
+
+    Graph does not check edges for duplicates, the crawl adds each of
+    them once. Incoming links of the page are the reached pages linking
+    to it.
+    '''
+
+    def __init__(self, urls=None, max_edges_in_memory=None,
+                 max_urls_in_memory=None):
+        '''@types: UrlTable?, int?, int?
+        @param max_edges_in_memory: max number of outgoing edges and,
+                                    separately, of incoming edges held
+                                    in memory, see EdgeStore
+        @param max_urls_in_memory: max number of URLs held in memory,
+                                   see UrlTable'''
+        if urls is None:
+            urls = UrlTable(max_urls_in_memory)
+        self.urls = urls
+        self._max_edges_in_memory = max_edges_in_memory
+        self._outgoing = EdgeStore(max_edges_in_memory)
+        # derived from outgoing edges, reset when the page is added
+        self._incomming = None
+        # pages which links were parsed from the truncated content
+        self.truncated = set()
+
+    def add_page(self, url, outgoing):
+        ''' Add reached page with its outgoing links
+
+        @types: str, iterable[str] -> int
+        @return: id of the page
+        '''
+        id_ = self.urls.intern(url)
+        self._outgoing.extend(id_, (self.urls.intern(u) for u in outgoing))
+        self._reset_incomming()
+        return id_
+
+    def iteroutgoing_ids(self):
+        ''' Id of each reached page with ids of the URLs it links to
+        @types: -> iterable[tuple[int, array[int]]]'''
+        outgoing = self._outgoing
+        return ((id_, outgoing.get(id_)) for id_ in outgoing)
+
+    def outgoing_ids(self, id_):
+        ''' Ids of the URLs the page links to
+        @types: int -> array[int]?
+        @return: None if URL of the id is not the reached page'''
+        if id_ in self._outgoing:
+            return self._outgoing.get(id_)
+        return None
+
+    def _get_incomming(self):
+        ''' Incoming edges of the reached pages built in one pass over
+        outgoing edges
+        @types: -> EdgeStore'''
+        if self._incomming is None:
+            outgoing = self._outgoing
+            incomming = EdgeStore(self._max_edges_in_memory)
+            for id_ in outgoing:
+                for target_id in outgoing.get(id_):
+                    if target_id in outgoing:
+                        incomming.append(target_id, id_)
+            self._incomming = incomming
+        return self._incomming
+
+    def _reset_incomming(self):
+        if self._incomming is not None:
+            self._incomming.close()
+            self._incomming = None
+
+    def __getitem__(self, url):
+        '@types: str -> collector.UrlInfo'
+        id_ = self.urls.id(url)
+        if id_ not in self._outgoing:
+            raise KeyError(url)
+        return collector.UrlInfo(
+            self._as_urls(self._get_incomming().get(id_)),
+            self._as_urls(self._outgoing.get(id_)))
+
+    def _as_urls(self, ids):
+        '@types: array[int] -> set[str]'
+        return set(self.urls.url(id_) for id_ in ids)
+
+    def __contains__(self, url):
+        return self.urls.id(url) in self._outgoing
+
+    def __iter__(self):
+        return (self.urls.url(id_) for id_ in self._outgoing)
+
+    def __len__(self):
+        return len(self._outgoing)
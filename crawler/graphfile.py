@@ -0,0 +1,305 @@
+''' Compact binary file of the crawled graph loaded by memory mapping
+
+Each URL is stored once in the URL table sorted by its UTF-8 bytes, so
+the id of the URL is its position in the table and it is found by binary
+search. Outgoing and incoming edges are kept in compressed sparse row
+form: offsets of the edges of each URL and the array of URL ids. All
+ints are fixed-width little-endian, sections start at 8 byte boundaries.
+
+    header      magic, version, number of URLs, pages and edges,
+                offset of each section
+    url offsets (urls + 1) uint64, offsets of URLs in the URL data
+    url data    UTF-8 bytes of URLs in sorted order
+    page flags  byte per URL, 1 if the URL is the reached page
+    out offsets (urls + 1) uint64, index of the first outgoing edge
+    out ids     (edges) uint32, targets of the edges sorted per URL
+    in offsets  (urls + 1) uint64, index of the first incoming edge
+    in ids      (edges) uint32, sources of the edges sorted per URL
+
+Loaded file is not parsed, each lookup reads only the part of the file
+it needs, so the graph of any size is opened at once.
+'''
+import sys
+import mmap
+import struct
+from array import array
+from collections import Mapping
+
+import collector
+import graph as graph_
+
+MAGIC = "HLGRAPH\0"
+VERSION = 1
+
+# number of ints packed at once while writing
+_BLOCK_SIZE = 64 * 1024
+_SECTIONS = ("url_offsets", "url_data", "page_flags", "out_offsets",
+             "out_ids", "in_offsets", "in_ids")
+_HEADER = struct.Struct("<8sIIIQ%dQ" % len(_SECTIONS))
+_OFFSET = struct.Struct("<Q")
+_OFFSETS_PAIR = struct.Struct("<2Q")
+_ID_SIZE = struct.calcsize("<I")
+
+
+class GraphFileException(Exception):
+    pass
+
+
+def write(graph, path):
+    ''' Write the graph to the file, the file is replaced if it exists
+
+    Outgoing edges are written as they are read from the graph, incoming
+    edges are sorted in memory taking 4 bytes per edge.
+
+    @types: dict[str, collector.UrlInfo], str
+    '''
+    if not isinstance(graph, graph_.Graph):
+        graph = _as_graph(graph)
+    encoded = map(_encode, graph.urls)
+    # old ids in order of the sorted URLs, new id is the position
+    order = sorted(xrange(len(encoded)), key=encoded.__getitem__)
+    ids = array(graph_.ID_TYPE, [0]) * len(order)
+    for id_, old_id in enumerate(order):
+        ids[old_id] = id_
+    sections = {}
+    with open(path, "w+b") as f:
+        f.write("\0" * _HEADER.size)
+
+        sections["url_offsets"] = _align(f)
+        _write_offsets(f, (len(encoded[old_id]) for old_id in order))
+        sections["url_data"] = f.tell()
+        for old_id in order:
+            f.write(encoded[old_id])
+
+        page_flags = bytearray(len(order))
+        out_degrees = array(graph_.ID_TYPE, [0]) * len(order)
+        in_degrees = array(graph_.ID_TYPE, [0]) * len(order)
+        sections["out_ids"] = _align(f)
+        for id_, old_id in enumerate(order):
+            outgoing = graph.outgoing_ids(old_id)
+            if outgoing is None:
+                continue
+            page_flags[id_] = 1
+            targets = array(graph_.ID_TYPE,
+                            sorted(set(ids[t] for t in outgoing)))
+            out_degrees[id_] = len(targets)
+            for target in targets:
+                in_degrees[target] += 1
+            _write_ids(f, targets)
+        sections["page_flags"] = f.tell()
+        f.write(page_flags)
+        sections["out_offsets"] = _align(f)
+        _write_offsets(f, out_degrees)
+
+        # sources are visited in order of ids, so incoming edges of each
+        # URL are sorted as they are placed
+        sources = array(graph_.ID_TYPE, [0]) * sum(in_degrees)
+        cursors = _cumulative(in_degrees)
+        f.seek(sections["out_ids"])
+        for source, degree in enumerate(out_degrees):
+            for target in _read_ids(f, degree):
+                sources[cursors[target]] = source
+                cursors[target] += 1
+        f.seek(0, 2)
+        sections["in_offsets"] = _align(f)
+        _write_offsets(f, in_degrees)
+        sections["in_ids"] = _align(f)
+        _write_ids(f, sources)
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, len(order), sum(page_flags),
+                             len(sources),
+                             *[sections[name] for name in _SECTIONS]))
+
+
+def _as_graph(graph):
+    ''' Graph with the same pages and links as the plain dict
+    @types: dict[str, collector.UrlInfo] -> graph.Graph'''
+    result = graph_.Graph()
+    for url, info in graph.iteritems():
+        result.add_page(url, info.outgoing)
+    return result
+
+
+def _encode(url):
+    '@types: str|unicode -> str'
+    return isinstance(url, unicode) and url.encode("utf-8") or url
+
+
+def _align(f):
+    ''' Pad the file to 8 byte boundary
+    @types: file -> int
+    @return: position of the file after padding'''
+    f.write("\0" * (-f.tell() % 8))
+    return f.tell()
+
+
+def _cumulative(counts):
+    ''' Index of the first item of each group counted
+    @types: array[int] -> array[int]'''
+    result = array('L', [0]) * len(counts)
+    total = 0
+    for i, count in enumerate(counts):
+        result[i] = total
+        total += count
+    return result
+
+
+def _write_offsets(f, counts):
+    ''' Write offsets of the groups of items with the offset past the last
+    group, so the group i spans offsets i and i + 1
+    @types: file, iterable[int]'''
+    offsets = [0]
+    for count in counts:
+        offsets.append(offsets[-1] + count)
+        if len(offsets) > _BLOCK_SIZE:
+            f.write(struct.pack("<%dQ" % (len(offsets) - 1), *offsets[:-1]))
+            offsets = offsets[-1:]
+    f.write(struct.pack("<%dQ" % len(offsets), *offsets))
+
+
+def _write_ids(f, ids):
+    '@types: file, array[int]'
+    if sys.byteorder == "big":
+        ids = array(ids.typecode, ids)
+        ids.byteswap()
+    ids.tofile(f)
+
+
+def _read_ids(f, count):
+    '@types: file, int -> array[int]'
+    ids = array(graph_.ID_TYPE)
+    ids.fromfile(f, count)
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids
+
+
+class GraphFile(Mapping):
+    ''' Graph loaded from the file viewed as dict[str, collector.UrlInfo],
+    the same as graph.Graph, the file is read through the memory map
+    as URLs are looked up '''
+
+    def __init__(self, buffer_):
+        '''@types: mmap.mmap
+        @raise GraphFileException: buffer is not the graph file'''
+        self._buffer = buffer_
+        if len(buffer_) < _HEADER.size:
+            raise GraphFileException("Not a graph file")
+        header = _HEADER.unpack_from(buffer_)
+        magic, version, self._size, self._pages, _ = header[:5]
+        if magic != MAGIC:
+            raise GraphFileException("Not a graph file")
+        if version != VERSION:
+            raise GraphFileException(
+                "Unsupported graph file version %s" % version)
+        for name, offset in zip(_SECTIONS, header[5:]):
+            setattr(self, "_" + name, offset)
+
+    @classmethod
+    def open(cls, path):
+        ''' Open the file written by write
+        @types: str -> GraphFile
+        @raise GraphFileException: file cannot be opened
+        '''
+        try:
+            with open(path, "rb") as f:
+                buffer_ = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, ValueError, mmap.error), e:
+            raise GraphFileException("Cannot open graph file. %s" % e)
+        try:
+            return cls(buffer_)
+        except GraphFileException:
+            buffer_.close()
+            raise
+
+    def id(self, url):
+        ''' Id of the URL found by binary search in the URL table
+        @types: str -> int?'''
+        key = _encode(url)
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._url_bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._size and self._url_bytes(low) == key:
+            return low
+        return None
+
+    def url(self, id_):
+        '@types: int -> unicode'
+        return self._url_bytes(id_).decode("utf-8")
+
+    def _url_bytes(self, id_):
+        '@types: int -> str'
+        start, end = _OFFSETS_PAIR.unpack_from(
+            self._buffer, self._url_offsets + id_ * _OFFSET.size)
+        return self._buffer[self._url_data + start:self._url_data + end]
+
+    def is_page(self, id_):
+        '@types: int -> bool'
+        return self._buffer[self._page_flags + id_] == "\1"
+
+    def outgoing_ids(self, id_):
+        '@types: int -> tuple[int]'
+        return self._ids(self._out_offsets, self._out_ids, id_)
+
+    def incomming_ids(self, id_):
+        '@types: int -> tuple[int]'
+        return self._ids(self._in_offsets, self._in_ids, id_)
+
+    def _ids(self, offsets, ids, id_):
+        '@types: int, int, int -> tuple[int]'
+        start, end = _OFFSETS_PAIR.unpack_from(
+            self._buffer, offsets + id_ * _OFFSET.size)
+        return struct.unpack_from("<%dI" % (end - start), self._buffer,
+                                  ids + start * _ID_SIZE)
+
+    def outgoing(self, url):
+        ''' URLs the page links to, empty if URL is not the reached page
+        @types: str -> set[unicode]'''
+        id_ = self.id(url)
+        if id_ is None:
+            return set()
+        return self._as_urls(self.outgoing_ids(id_))
+
+    def incomming(self, url):
+        ''' Reached pages linking to the URL
+        @types: str -> set[unicode]'''
+        id_ = self.id(url)
+        if id_ is None:
+            return set()
+        return self._as_urls(self.incomming_ids(id_))
+
+    def _as_urls(self, ids):
+        '@types: iterable[int] -> set[unicode]'
+        return set(self.url(id_) for id_ in ids)
+
+    def pages(self):
+        ''' URLs of the reached pages in sorted order
+        @types: -> iterable[unicode]'''
+        return (self.url(id_) for id_ in xrange(self._size)
+                if self.is_page(id_))
+
+    def __getitem__(self, url):
+        '@types: str -> collector.UrlInfo'
+        id_ = self.id(url)
+        if id_ is None or not self.is_page(id_):
+            raise KeyError(url)
+        return collector.UrlInfo(self._as_urls(self.incomming_ids(id_)),
+                                 self._as_urls(self.outgoing_ids(id_)))
+
+    def __contains__(self, url):
+        id_ = self.id(url)
+        return id_ is not None and self.is_page(id_)
+
+    def __iter__(self):
+        return self.pages()
+
+    def __len__(self):
+        return self._pages
+
+    def close(self):
+        self._buffer.close()
@@ -7,6 +7,7 @@ for each or them, until --limit URLs will have been traversed.
 
 USAGE:
     hyperlinks [options] --url <start-url> --limit <limit>
+    hyperlinks [options] --resume <checkpoint>
     hyperlinks -h | --help
     hyperlinks --version
 
@@ -18,49 +19,245 @@ OPTIONS:
     --out <dest-file>     File path to the JSON file where to store output,
                           if not specified output JSON to STDOUT
     --pretty-print        JSON output will be pretty printed
-    --dbout               Causes the data to be stored in a MongoDB collection
+    --out-format <format> Output format: "json" - the whole graph is written
+                          when the crawl is finished, "ndjson" - one record
+                          per page is written as soon as page is finished,
+                          "binary" - the whole graph is written to --out file
+                          with URL table and link arrays loaded by memory
+                          mapping, see graphfile [default: json]
+    --dbout               Causes the data to be stored in the db
+    --dbout-live          Store pages to the db as soon as they are finished,
+                          incoming links are stored when the crawl is over
+    --db-batch-size <n>   Number of pages written to the db in one request
+                          [default: 1000]
+    --db <uri>            The db where the data is stored: MongoDB server
+                          "mongodb://<host>:<port>" or SQLite database file
+                          "sqlite:<path>", by default MongoDB on localhost
     --concurrent          Run crawler using async HTTP requests
+    --async               Run crawler on the event loop with async HTTP
+                          client, no monkey-patching involved, connections
+                          are kept alive only if pycurl is installed
+    --threads             Run crawler in the pool of threads sharing pooled
+                          HTTP session, no monkey-patching involved
+    --single-get          Fetch each page with single streamed GET request
+                          instead of HEAD request followed by GET
+    --max-in-flight <n>   Max number of pages fetched at the same time
+                          by the concurrent, async or threads crawler,
+                          the threads crawler runs as many threads
+                          [default: 50]
+    --pool-size <n>       Number of connections kept alive per host, by default
+                          1 for serial and --max-in-flight for concurrent
+                          and threads crawler, async crawler is limited
+                          by --max-in-flight
+    --per-host <n>        Visit hosts in turns fetching at most <n> pages
+                          of one host at the same time
+    --host-delay <sec>    Visit hosts in turns waiting at least <sec> seconds
+                          between fetches of the pages of one host
+    --order <order>       Order of visiting found pages: "bfs" - in order
+                          they were found, "inlinks" - the pages linked by
+                          more reached pages first [default: bfs]
+    --max-page-size <n>   Max size of the page content read, links are taken
+                          from the beginning of the larger page which is
+                          marked as "truncated" in the output
+    --content-budget <n>  Max total size of the content of pages fetched at
+                          the same time, each page in flight reserves the max
+                          page size of it
+    --max-edges-in-memory <n>
+                          Max number of links of the graph held in memory,
+                          links over it are spilled to the temporary file
+    --max-urls-in-memory <n>
+                          Max number of URLs of the graph held in memory,
+                          URLs over it are moved to the temporary database
+    --workers <n>         Number of processes parsing fetched pages,
+                          by default pages are parsed in crawling process
+    --cache <file>        Cache links of the pages in the file, pages cached
+                          by the previous crawl are fetched again only
+                          if modified
+    --cache-size <n>      Max number of pages kept in the cache, the least
+                          recently used pages are evicted [default: 100000]
+    --metrics <file>      Write metrics of the crawl to the file periodically
+                          and when the crawl is finished
+    --metrics-format <format>
+                          Metrics format: "json" or "prometheus" text format
+                          [default: json]
+    --metrics-every <sec> Seconds between metrics writes [default: 10]
+    --analyze <file>      Write PageRank, in and out degree distributions and
+                          strongly connected components of the crawled graph
+                          to the JSON file, requires NumPy and SciPy
+    --checkpoint <file>   Record progress of the crawl to the new checkpoint
+                          file, so the crawl can be resumed if interrupted
+    --resume <checkpoint> Resume interrupted crawl from the checkpoint file,
+                          the progress is recorded to the same file
 
 """
 import sys
 import json
 import docopt
+import logging.config
 import urlparse
 import contextlib
+from functools import partial
 from fn import _ as __
 
+import checkpoint
 import collector
+import frontier
+import graphfile
+import linkcache
+import metrics
 import storage
+import writers
 
 VERSION = "0.0.1"
 
+JSON_FORMAT = "json"
+NDJSON_FORMAT = "ndjson"
+BINARY_FORMAT = "binary"
+OUT_FORMATS = (JSON_FORMAT, NDJSON_FORMAT, BINARY_FORMAT)
+
+BFS_ORDER = "bfs"
+INLINKS_ORDER = "inlinks"
+ORDERS = (BFS_ORDER, INLINKS_ORDER)
+
 
 def cli(args):
     '@types: dict[str, O]'
     try:
-        (url, limit, dest_file_name, dbout,
-         pretty_print, is_concurrent) = _parse_args(
+        (dest_file_name, dbout,
+         pretty_print, is_concurrent, is_async, is_threaded, single_get,
+         max_in_flight, out_format, dbout_live, db_batch_size, db_uri,
+         checkpoint_path, resume_path, workers, pool_size,
+         max_per_host, host_delay, cache_path, cache_size,
+         metrics_path, metrics_format, metrics_every,
+         max_page_size, content_budget, max_edges_in_memory,
+         max_urls_in_memory, order, analysis_path) = _parse_args(
             args,
-            ("--url", get_url),
-            ("--limit", get_limit),
             ("--out", identity),
             ("--dbout", identity),
             ("--pretty-print", identity),
-            ("--concurrent", identity))
-
-        collect = (is_concurrent
-                   and collector.pcollect
-                   or collector.collect)
-        graph = collect(url, limit)
-        print_graph(
-            graph,
-            dest_file_name=dest_file_name,
-            pretty_print=pretty_print)
-        dbout and send_to_mongodb(graph)
-    except CliException, ce:
+            ("--concurrent", identity),
+            ("--async", identity),
+            ("--threads", identity),
+            ("--single-get", identity),
+            ("--max-in-flight", get_max_in_flight),
+            ("--out-format", get_out_format),
+            ("--dbout-live", identity),
+            ("--db-batch-size", get_db_batch_size),
+            ("--db", get_db_uri),
+            ("--checkpoint", identity),
+            ("--resume", identity),
+            ("--workers", get_workers),
+            ("--pool-size", get_pool_size),
+            ("--per-host", get_max_per_host),
+            ("--host-delay", get_host_delay),
+            ("--cache", identity),
+            ("--cache-size", get_cache_size),
+            ("--metrics", identity),
+            ("--metrics-format", get_metrics_format),
+            ("--metrics-every", get_metrics_every),
+            ("--max-page-size", get_max_page_size),
+            ("--content-budget", get_content_budget),
+            ("--max-edges-in-memory", get_max_edges_in_memory),
+            ("--max-urls-in-memory", get_max_urls_in_memory),
+            ("--order", get_order),
+            ("--analyze", identity))
+        if content_budget and not max_page_size:
+            raise InvalidArgumentValue(
+                "Content budget requires max page size to be specified")
+        if out_format == BINARY_FORMAT and not dest_file_name:
+            raise InvalidArgumentValue(
+                "Binary output requires destination file to be specified")
+        if order == INLINKS_ORDER and (max_per_host or host_delay is not None):
+            raise InvalidArgumentValue(
+                "Hosts cannot take turns when pages are visited by inlinks")
+        # analysis dependencies are checked before the crawl
+        analysis = analysis_path and import_analysis()
+
+        collect = choose_engine(is_concurrent, is_async,
+                                is_threaded=is_threaded,
+                                max_in_flight=max_in_flight,
+                                head_first=False if single_get else None,
+                                workers=workers,
+                                pool_size=pool_size,
+                                frontier=new_frontier(max_per_host,
+                                                      host_delay, order),
+                                max_page_size=max_page_size,
+                                content_budget=content_budget,
+                                max_edges_in_memory=max_edges_in_memory,
+                                max_urls_in_memory=max_urls_in_memory)
+        if cache_path:
+            collect = partial(collect_with_cache, collect,
+                              linkcache.LinkCache.open(
+                                  cache_path, **_options(
+                                      max_entries=cache_size)))
+        if metrics_path:
+            collect = partial(collect_with_metrics, collect,
+                              metrics.MetricsFile(
+                                  metrics.CrawlMetrics(), metrics_path,
+                                  metrics_format,
+                                  **_options(export_every=metrics_every)))
+        if dbout and dbout_live:
+            collect = partial(collect_to_db, collect, db_uri, db_batch_size)
+        if resume_path:
+            url, limit, collect = resume_with_checkpoint(collect, resume_path)
+        else:
+            url, limit = _parse_args(args,
+                                     ("--url", get_url),
+                                     ("--limit", get_limit))
+            if checkpoint_path:
+                collect = partial(collect_with_checkpoint, collect,
+                                  checkpoint.Checkpoint.create(
+                                      checkpoint_path, url, limit))
+        if out_format == NDJSON_FORMAT:
+            graph = collect_to_ndjson(collect, url, limit, dest_file_name)
+        elif out_format == BINARY_FORMAT:
+            graph = collect(url, limit)
+            graphfile.write(graph, dest_file_name)
+        else:
+            graph = collect(url, limit)
+            print_graph(
+                graph,
+                dest_file_name=dest_file_name,
+                pretty_print=pretty_print)
+        dbout and not dbout_live and send_to_db(graph, db_uri)
+        analysis and write_analysis(analysis, graph, analysis_path)
+    except (CliException, checkpoint.CheckpointException,
+            linkcache.CacheException), ce:
         exit_cli(str(ce), 1)
 
 
+def choose_engine(is_concurrent, is_async, is_threaded=False, **options):
+    ''' Get crawl engine with options applied, when several engines
+    are asked the async one wins and the threads one is the last
+
+    @types: bool, bool, bool, **O \
+            -> (str, int -> dict[str, collector.UrlInfo])'''
+    if is_async:
+        collect = collector.acollect
+        # the client limits connections with max in-flight pages
+        options.pop("pool_size", None)
+    elif is_concurrent:
+        collect = collector.pcollect
+    elif is_threaded:
+        collect = collector.tcollect
+    else:
+        collect = collector.collect
+        options.pop("max_in_flight", None)
+    return partial(collect, **_options(**options))
+
+
+def new_frontier(max_per_host=None, host_delay=None, order=None):
+    ''' Frontier visiting the most linked pages first if asked or hosts
+    in turns if any of host limits is specified
+    @types: int?, float?, str? -> frontier.Frontier?'''
+    if order == INLINKS_ORDER:
+        return frontier.PriorityFrontier()
+    if max_per_host is not None or host_delay is not None:
+        return frontier.HostFrontier(**_options(max_per_host=max_per_host,
+                                                min_delay=host_delay))
+    return None
+
+
 def exit_cli(msg, error_code):
     '''Exit from running CLI with error code specified and
     printing error message into STDERR
@@ -80,15 +277,119 @@ def print_graph(graph, dest_file_name=None, pretty_print=False):
         print(graph_in_json)
 
 
-def send_to_mongodb(graph):
-    '@types: dict[str, collector.UrlInfo]'
+def collect_to_ndjson(collect, url, limit, dest_file_name=None):
+    ''' Collect writing pages as soon as they are finished
+    @types: callable, str, int, str? -> graph.Graph'''
+    with _open_output(dest_file_name) as out:
+        with contextlib.closing(writers.NdjsonWriter(out)) as writer:
+            return collect(url, limit, listeners=[writer])
+
+
+@contextlib.contextmanager
+def _open_output(dest_file_name=None):
+    ''' Open destination file or use STDOUT if not specified
+    @types: str? -> context[file]'''
+    if dest_file_name:
+        with open(dest_file_name, "w+") as f:
+            yield f
+    else:
+        yield sys.stdout
+
+
+def resume_with_checkpoint(collect, path):
+    ''' Get start URL, limit and the engine resuming the crawl
+    @types: callable, str -> tuple[str, int, callable]'''
+    checkpoint_ = checkpoint.Checkpoint.open(path)
+    return (checkpoint_.start_url, checkpoint_.limit,
+            partial(collect_with_checkpoint, collect, checkpoint_,
+                    resume=checkpoint_.results()))
+
+
+def collect_with_checkpoint(collect, checkpoint_, url, limit,
+                            listeners=(), **crawl_options):
+    ''' Collect recording finished pages to the checkpoint, the checkpoint
+    is committed even if the crawl is interrupted
+
+    @types: callable, checkpoint.Checkpoint, str, int, \
+            list[collector.CrawlListener], **O -> graph.Graph'''
+    with contextlib.closing(checkpoint_):
+        return collect(url, limit, listeners=list(listeners) + [checkpoint_],
+                       **crawl_options)
+
+
+def collect_with_cache(collect, cache, url, limit, **crawl_options):
+    ''' Collect reusing links of the pages not modified since the previous
+    crawl, the cache is committed even if the crawl is interrupted
+
+    @types: callable, linkcache.LinkCache, str, int, **O -> graph.Graph'''
+    with contextlib.closing(cache):
+        return collect(url, limit, cache=cache, **crawl_options)
+
+
+def collect_with_metrics(collect, metrics_file, url, limit, listeners=(),
+                         **crawl_options):
+    ''' Collect measuring the crawl, the metrics are written even if
+    the crawl is interrupted
+
+    @types: callable, metrics.MetricsFile, str, int, \
+            list[collector.CrawlListener], **O -> graph.Graph'''
+    with contextlib.closing(metrics_file):
+        return collect(url, limit,
+                       listeners=list(listeners) + [metrics_file.metrics,
+                                                    metrics_file],
+                       **crawl_options)
+
+
+def send_to_db(graph, uri=None):
+    '@types: dict[str, collector.UrlInfo], str?'
     try:
-        with contextlib.closing(storage.get_default()) as db:
+        with contextlib.closing(
+                storage.get_default(**_options(uri=uri))) as db:
             db.write(graph)
     except storage._BaseException, se:
         raise CliException("Error while storing to the db. %s" % se)
 
 
+def collect_to_db(collect, uri, batch_size, url, limit, listeners=(),
+                  **crawl_options):
+    ''' Collect storing pages to the db in batches as soon as they
+    are finished, the whole graph is written when the crawl is over
+    to complete incoming links
+
+    @types: callable, str?, int?, str, int, \
+            list[collector.CrawlListener], **O -> graph.Graph'''
+    try:
+        with contextlib.closing(storage.get_default(**_options(
+                uri=uri, batch_size=batch_size))) as db:
+            with contextlib.closing(
+                    writers.StorageWriter(db, **_options(
+                        batch_size=batch_size))) as writer:
+                graph = collect(url, limit,
+                                listeners=list(listeners) + [writer],
+                                **crawl_options)
+            db.write(graph)
+            return graph
+    except storage._BaseException, se:
+        raise CliException("Error while storing to the db. %s" % se)
+
+
+def import_analysis():
+    ''' Import analysis module which requires NumPy and SciPy
+    @types: -> module
+    @raise CliException: NumPy or SciPy is not installed'''
+    try:
+        import analysis
+        return analysis
+    except ImportError, e:
+        raise CliException("Analysis requires NumPy and SciPy. %s" % e)
+
+
+def write_analysis(analysis, graph, path):
+    '@types: module, dict[str, collector.UrlInfo], str'
+    with open(path, "w") as f:
+        json.dump(analysis.analyze(graph), f, indent=4, sort_keys=True)
+
+
 def to_json(graph, pretty_print=False):
     '@types: dict[str, collector.UrlInfo], bool -> str'
     graph = collector.url_to_info_as_pure_dict(graph)
@@ -106,13 +407,144 @@ def get_url(url):
     raise InvalidArgumentValue("Invalid URL specified")
 
 
+def get_out_format(value):
+    '@types: str? -> str'
+    value = value or JSON_FORMAT
+    if value in OUT_FORMATS:
+        return value
+    raise InvalidArgumentValue("Invalid output format specified")
+
+
+def get_order(value):
+    '@types: str? -> str'
+    value = value or BFS_ORDER
+    if value in ORDERS:
+        return value
+    raise InvalidArgumentValue("Invalid order specified")
+
+
+def get_metrics_format(value):
+    '@types: str? -> str'
+    value = value or metrics.JSON_FORMAT
+    if value in metrics.FORMATS:
+        return value
+    raise InvalidArgumentValue("Invalid metrics format specified")
+
+
+def get_metrics_every(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid metrics interval specified")
+
+
 def get_limit(limit):
     '@types: str -> int'
-    if limit and limit.isdigit():
-        value = int(limit)
+    return _get_positive_int(limit, "Invalid limit value specified")
+
+
+def get_db_batch_size(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid db batch size specified")
+
+
+def get_db_uri(value):
+    '@types: str? -> str?'
+    if value is not None:
+        try:
+            storage.parse_uri(value)
+        except ValueError:
+            raise InvalidArgumentValue("Invalid db URI specified")
+    return value
+
+
+def get_pool_size(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid connection pool size specified")
+
+
+def get_max_per_host(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid max pages per host specified")
+
+
+def get_host_delay(value):
+    '''
+    @types: str? -> float?
+    @raise: InvalidArgumentValue: value is not a non-negative number
+    '''
+    if value is None:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        delay = -1
+    if delay >= 0:
+        return delay
+    raise InvalidArgumentValue("Invalid host delay specified")
+
+
+def get_cache_size(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid cache size specified")
+
+
+def get_max_page_size(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid max page size specified")
+
+
+def get_content_budget(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid content budget specified")
+
+
+def get_max_edges_in_memory(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid max number of edges in memory specified")
+
+
+def get_max_urls_in_memory(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid max number of URLs in memory specified")
+
+
+def get_workers(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid number of workers specified")
+
+
+def get_max_in_flight(value):
+    '@types: str? -> int?'
+    return value and _get_positive_int(
+        value, "Invalid max in-flight value specified")
+
+
+def _get_positive_int(value, error_msg):
+    '''
+    @types: str, str -> int
+    @raise: InvalidArgumentValue: value is not a positive integer
+    '''
+    if value and value.isdigit():
+        value = int(value)
         if value > 0:
             return value
-    raise InvalidArgumentValue("Invalid limit value specified")
+    raise InvalidArgumentValue(error_msg)
+
+
+def _options(**kwargs):
+    ''' Keyword arguments for the engine, options that are not
+    specified are skipped so engine defaults are applied
+    @types: **O -> dict[str, O]'''
+    return dict((k, v) for k, v in kwargs.iteritems() if v is not None)
 
 
 def _parse_args(arg_by_name, *argument_to_fn_pairs):
@@ -134,6 +566,7 @@ identity = __
 
 
 if __name__ == '__main__':
+    logging.config.fileConfig("logging.ini")
     try:
         args = docopt.docopt(__doc__, version=VERSION)
         if args.get("--help"):
@@ -0,0 +1,169 @@
+''' Cache of the outgoing links of pages stored in SQLite database
+
+Recrawl of the same site sends conditional GET requests for the pages
+cached by the previous crawl, the page which is not modified is not
+downloaded and parsed again, its cached links are reused instead.
+Only validators of the response and the outgoing links are stored,
+not the content of the page. The least recently used pages are evicted
+when the cache grows over its size.
+'''
+import json
+import httplib
+import sqlite3
+from collections import namedtuple
+
+import collector
+
+# default max number of pages kept in the cache
+DEFAULT_MAX_ENTRIES = 100000
+# default number of changes written in one transaction
+DEFAULT_COMMIT_EVERY = 100
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS pages ("
+    "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+    "outgoing TEXT, used INTEGER)",
+    "CREATE INDEX IF NOT EXISTS pages_used ON pages (used)")
+
+
+class Entry(namedtuple("Entry", ("etag", "last_modified", "outgoing"))):
+
+    def conditional_headers(self):
+        ''' Headers of the request validating the cached page
+        @types: -> dict[str, str]'''
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class CacheException(Exception):
+    pass
+
+
+class LinkCache(collector.CrawlListener):
+    ''' Cache is filled as the crawl listener, validators of the fetched
+    page are remembered until the page is finished and stored along with
+    its final outgoing links
+    '''
+
+    def __init__(self, connection, max_entries=DEFAULT_MAX_ENTRIES,
+                 commit_every=DEFAULT_COMMIT_EVERY):
+        '@types: sqlite3.Connection, int, int'
+        self._connection = connection
+        self._max_entries = max_entries
+        self._commit_every = commit_every
+        self._uncommitted = 0
+        self._validators_by_url = {}
+        self._size, self._last_used = connection.execute(
+            "SELECT COUNT(*), COALESCE(MAX(used), 0) FROM pages").fetchone()
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        ''' Open the cache creating it if it does not exist
+        @types: str, **O -> LinkCache
+        @raise CacheException: cache cannot be opened
+        '''
+        try:
+            # threads of the thread engine use the connection one
+            # at a time, see executors.ThreadExecutor
+            connection = sqlite3.connect(path, check_same_thread=False)
+            with connection:
+                for statement in _SCHEMA:
+                    connection.execute(statement)
+            return cls(connection, **kwargs)
+        except sqlite3.Error, e:
+            raise CacheException("Cannot open cache. %s" % e)
+
+    def get(self, url):
+        ''' Get cached page marking it as recently used
+        @types: str -> Entry?'''
+        row = self._connection.execute(
+            "SELECT etag, last_modified, outgoing FROM pages WHERE url = ?",
+            (url,)).fetchone()
+        if row is None:
+            return None
+        self._execute("UPDATE pages SET used = ? WHERE url = ?",
+                      (self._next_used(), url))
+        etag, last_modified, outgoing = row
+        return Entry(etag, last_modified, json.loads(outgoing))
+
+    def remember(self, url, response, entry=None):
+        ''' Remember validators of the response until the page is finished
+        @types: str, requests.Response?, Entry?
+        @param entry: cached page validated by the response, not modified
+                      response may omit validators (RFC 7232), those of
+                      the cached page are kept then
+        '''
+        headers = response is not None and response.headers or {}
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if (entry is not None and response is not None
+                and response.status_code == httplib.NOT_MODIFIED):
+            etag = etag or entry.etag
+            last_modified = last_modified or entry.last_modified
+        if etag or last_modified:
+            self._validators_by_url[url] = etag, last_modified
+        else:
+            self._validators_by_url.pop(url, None)
+
+    def page_reached(self, url, outgoing):
+        validators = self._validators_by_url.pop(url, None)
+        if validators is None:
+            # page cannot be validated anymore
+            self._delete(url)
+            return
+        etag, last_modified = validators
+        row = (etag, last_modified, json.dumps(list(outgoing)),
+               self._next_used(), url)
+        if not self._execute(
+                "UPDATE pages SET etag = ?, last_modified = ?, "
+                "outgoing = ?, used = ? WHERE url = ?", row).rowcount:
+            self._execute(
+                "INSERT INTO pages (etag, last_modified, outgoing, used, url) "
+                "VALUES (?, ?, ?, ?, ?)", row)
+            self._size += 1
+            self._size > self._max_entries and self._evict()
+
+    def page_failed(self, url):
+        self._validators_by_url.pop(url, None)
+        self._delete(url)
+
+    def _delete(self, url):
+        '@types: str'
+        self._size -= self._execute(
+            "DELETE FROM pages WHERE url = ?", (url,)).rowcount
+
+    def _evict(self):
+        ''' Evict the least recently used pages over the size '''
+        self._size -= self._execute(
+            "DELETE FROM pages WHERE url IN "
+            "(SELECT url FROM pages ORDER BY used LIMIT ?)",
+            (self._size - self._max_entries,)).rowcount
+
+    def _next_used(self):
+        '@types: -> int'
+        self._last_used += 1
+        return self._last_used
+
+    def _execute(self, statement, params):
+        '@types: str, tuple -> sqlite3.Cursor'
+        cursor = self._connection.execute(statement, params)
+        self._uncommitted += 1
+        if self._uncommitted >= self._commit_every:
+            self.commit()
+        return cursor
+
+    def commit(self):
+        self._connection.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+
+    def __len__(self):
+        return self._size
+
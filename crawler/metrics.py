@@ -0,0 +1,241 @@
+''' Metrics of the crawl collected by the crawl listener
+
+Metrics tell where the crawl spends its time: latency of HEAD and GET
+requests, size and parse time of pages, the window of in-flight and
+queued pages, results per host, truncated pages and the rate of reached
+pages. They are exported as JSON document or in Prometheus text format,
+periodically while crawling and once the crawl is finished.
+'''
+import os
+import json
+import time
+import urlparse
+from collections import defaultdict
+
+import collector
+
+JSON_FORMAT = "json"
+PROMETHEUS_FORMAT = "prometheus"
+FORMATS = (JSON_FORMAT, PROMETHEUS_FORMAT)
+
+# default number of seconds between exports while crawling
+DEFAULT_EXPORT_EVERY = 10
+
+# upper bounds of the latency buckets in seconds, the same as
+# Prometheus client uses by default
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+_PREFIX = "crawler_"
+
+
+class Histogram:
+    ''' Counts of observed values per bucket, the last bucket counts
+    values greater than all bounds '''
+
+    def __init__(self, bounds=SECONDS_BUCKETS):
+        '@types: tuple[float]'
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        '@types: float'
+        i = 0
+        for bound in self.bounds:
+            if value <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        ''' Number of values less or equal to each bound and total count
+        @types: -> list[int]'''
+        total = 0
+        counts = []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def as_dict(self):
+        '@types: -> dict[str, O]'
+        return {"buckets": dict(zip(map(str, self.bounds) + ["+Inf"],
+                                    self.cumulative_counts())),
+                "sum": self.sum,
+                "count": self.count}
+
+
+class CrawlMetrics(collector.CrawlListener):
+
+    def __init__(self, clock=time.time):
+        '@types: (-> float)'
+        self._clock = clock
+        self.started = clock()
+        self.request_seconds_by_method = defaultdict(Histogram)
+        self.responses_by_status = defaultdict(int)
+        self.parse_seconds = Histogram()
+        self.downloaded = 0
+        self.truncated = 0
+        self.reached = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.reached_by_host = defaultdict(int)
+        self.failed_by_host = defaultdict(int)
+
+    def request_done(self, method, url, seconds, status_code):
+        self.request_seconds_by_method[method].observe(seconds)
+        self.responses_by_status[status_code or "none"] += 1
+
+    def page_parsed(self, url, size, read_seconds, parse_seconds):
+        self.downloaded += size
+        self.parse_seconds.observe(parse_seconds)
+
+    def crawl_progress(self, in_flight, queued):
+        self.in_flight = in_flight
+        self.queued = queued
+
+    def page_truncated(self, url):
+        self.truncated += 1
+
+    def page_reached(self, url, outgoing):
+        self.reached += 1
+        self.reached_by_host[_host(url)] += 1
+
+    def page_failed(self, url):
+        self.failed += 1
+        self.failed_by_host[_host(url)] += 1
+
+    def pages_per_second(self):
+        '@types: -> float'
+        elapsed = self._clock() - self.started
+        return elapsed > 0 and self.reached / elapsed or 0.0
+
+    def error_rate_by_host(self):
+        '@types: -> dict[str, float]'
+        hosts = set(self.reached_by_host) | set(self.failed_by_host)
+        return dict((host, float(self.failed_by_host[host])
+                     / (self.failed_by_host[host]
+                        + self.reached_by_host[host]))
+                    for host in hosts)
+
+    def as_dict(self):
+        '@types: -> dict[str, O]'
+        return {
+            "pages_reached": self.reached,
+            "pages_failed": self.failed,
+            "pages_truncated": self.truncated,
+            "pages_per_second": self.pages_per_second(),
+            "downloaded_bytes": self.downloaded,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "request_seconds": dict(
+                (method, histogram.as_dict()) for method, histogram
+                in self.request_seconds_by_method.iteritems()),
+            "parse_seconds": self.parse_seconds.as_dict(),
+            "responses_by_status": dict(
+                (str(status), count) for status, count
+                in self.responses_by_status.iteritems()),
+            "error_rate_by_host": self.error_rate_by_host()}
+
+    def to_json(self):
+        '@types: -> str'
+        return json.dumps(self.as_dict(), indent=4, sort_keys=True)
+
+    def to_prometheus(self):
+        ''' Metrics in Prometheus text exposition format
+        @types: -> str'''
+        lines = []
+        _gauge(lines, "pages_reached_total", self.reached, "counter")
+        _gauge(lines, "pages_failed_total", self.failed, "counter")
+        _gauge(lines, "pages_truncated_total", self.truncated, "counter")
+        _gauge(lines, "downloaded_bytes_total", self.downloaded,
+               "counter")
+        _gauge(lines, "pages_per_second", self.pages_per_second())
+        _gauge(lines, "in_flight_pages", self.in_flight)
+        _gauge(lines, "queued_pages", self.queued)
+        _histograms(lines, "request_seconds", "method",
+                    self.request_seconds_by_method)
+        _histograms(lines, "parse_seconds", None,
+                    {None: self.parse_seconds})
+        _labeled(lines, "responses_total", "status",
+                 self.responses_by_status, "counter")
+        _labeled(lines, "host_pages_reached_total", "host",
+                 self.reached_by_host, "counter")
+        _labeled(lines, "host_pages_failed_total", "host",
+                 self.failed_by_host, "counter")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsFile(collector.CrawlListener):
+    ''' Writes the metrics to the file every export_every seconds while
+    crawling and when closed. The file is replaced on each export by
+    renaming the temporary file written next to it, so the file is never
+    read half-written. '''
+
+    def __init__(self, metrics, path, format_=JSON_FORMAT,
+                 export_every=DEFAULT_EXPORT_EVERY, clock=time.time):
+        '@types: CrawlMetrics, str, str, float, (-> float)'
+        self.metrics = metrics
+        self._path = path
+        self._format = format_
+        self._export_every = export_every
+        self._clock = clock
+        self._exported = clock()
+
+    def crawl_progress(self, in_flight, queued):
+        if self._clock() - self._exported >= self._export_every:
+            self.export()
+
+    def export(self):
+        content = (self._format == PROMETHEUS_FORMAT
+                   and self.metrics.to_prometheus()
+                   or self.metrics.to_json())
+        temporary_path = self._path + ".tmp"
+        with open(temporary_path, "w") as f:
+            f.write(content)
+        os.rename(temporary_path, self._path)
+        self._exported = self._clock()
+
+    def close(self):
+        self.export()
+
+
+def _gauge(lines, name, value, type_="gauge"):
+    '@types: list[str], str, float, str'
+    lines.append("# TYPE %s%s %s" % (_PREFIX, name, type_))
+    lines.append("%s%s %s" % (_PREFIX, name, value))
+
+
+def _labeled(lines, name, label, value_by_label, type_="gauge"):
+    '@types: list[str], str, str, dict[str, float], str'
+    lines.append("# TYPE %s%s %s" % (_PREFIX, name, type_))
+    for label_value, value in sorted(value_by_label.iteritems()):
+        lines.append('%s%s{%s="%s"} %s' % (_PREFIX, name, label,
+                                           label_value, value))
+
+
+def _histograms(lines, name, label, histogram_by_label):
+    '@types: list[str], str, str?, dict[str?, Histogram]'
+    lines.append("# TYPE %s%s histogram" % (_PREFIX, name))
+    for label_value, histogram in sorted(histogram_by_label.iteritems()):
+        labels = label and ['%s="%s"' % (label, label_value)] or []
+        bounds = map(str, histogram.bounds) + ["+Inf"]
+        for bound, count in zip(bounds, histogram.cumulative_counts()):
+            lines.append('%s%s_bucket{%s} %s' % (
+                _PREFIX, name, ",".join(labels + ['le="%s"' % bound]),
+                count))
+        suffix = labels and "{%s}" % ",".join(labels) or ""
+        lines.append("%s%s_sum%s %s" % (_PREFIX, name, suffix,
+                                        histogram.sum))
+        lines.append("%s%s_count%s %s" % (_PREFIX, name, suffix,
+                                          histogram.count))
+
+
+def _host(url):
+    '@types: str -> str'
+    return urlparse.urlparse(url).netloc
@@ -0,0 +1,51 @@
+''' HTTP sessions shared by all requests of the crawl
+
+Connections are kept alive and reused per host, results of the name
+resolution are cached for the duration of the crawl.
+'''
+import socket
+import contextlib
+
+# number of hosts which connection pools are kept
+DEFAULT_POOL_CONNECTIONS = 100
+# number of connections kept alive per host
+DEFAULT_POOL_MAXSIZE = 10
+
+
+def new_session(pool_connections=DEFAULT_POOL_CONNECTIONS,
+                pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    '''
+    @types: int, int -> requests.Session
+    @param pool_connections: number of hosts which connection pools are kept
+    @param pool_maxsize: number of connections kept alive per host
+    '''
+    # not imported by the async engine which does not use requests
+    import requests
+    import requests.adapters
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                            pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@contextlib.contextmanager
+def dns_cache():
+    ''' Cache successful name resolutions while in context,
+    failures are not cached '''
+    getaddrinfo = socket.getaddrinfo
+    addrinfo_by_args = {}
+
+    def cached_getaddrinfo(*args, **kwargs):
+        key = args, tuple(sorted(kwargs.iteritems()))
+        addrinfo = addrinfo_by_args.get(key)
+        if addrinfo is None:
+            addrinfo = addrinfo_by_args[key] = getaddrinfo(*args, **kwargs)
+        return addrinfo
+
+    socket.getaddrinfo = cached_getaddrinfo
+    try:
+        yield
+    finally:
+        socket.getaddrinfo = getaddrinfo
@@ -1,5 +1,29 @@
-import pymongo
-import pymongo.errors
+import logging
+import sqlite3
+import urlparse
+from itertools import islice
+
+# pymongo is imported by Mongo storage only, the rest works without it
+
+# default number of documents sent to the db in one request
+DEFAULT_BATCH_SIZE = 1000
+
+MONGODB_SCHEME = "mongodb"
+SQLITE_SCHEME = "sqlite"
+SCHEMES = (MONGODB_SCHEME, SQLITE_SCHEME)
+DEFAULT_URI = "mongodb://localhost:27017"
+
+logger = logging.getLogger("storage")
+
+_SQLITE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS urls ("
+    "id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL, "
+    "is_page INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS edges ("
+    "source INTEGER NOT NULL, target INTEGER NOT NULL, "
+    "PRIMARY KEY (source, target)) WITHOUT ROWID",
+    # incoming edges of the page are looked up by the target
+    "CREATE INDEX IF NOT EXISTS edges_target ON edges (target, source)")
 
 
 class _BaseException(Exception):
@@ -29,37 +53,213 @@ class GraphStorage:
 
 
 class Mongo(GraphStorage):
-    def __init__(self, client):
-        '@types: pymongo.MongoClient'
+    ''' Each page is a document keyed by URL, writing the same page again
+    merges its edges into the document '''
+
+    def __init__(self, client, batch_size=DEFAULT_BATCH_SIZE):
+        '@types: pymongo.MongoClient, int'
         if not client:
             raise ValueError("Mongo client for storage is not specified")
         self._client = client
+        self._batch_size = batch_size
+        self._collection = None
 
     def close(self):
-        self._client.disconnect()
+        self._client.close()
 
     def write(self, graph):
-        '@types: dict[str, collector.UrlInfo]'
-        db = self._client.graph_db
-        collection = db.in_out_by_url
-        collection.insert(
-            ({"url": url,
-              "incomming": list(incomming),
-              "outgoing": list(outgoing)}
-             for url, (incomming, outgoing) in graph.iteritems()))
+        ''' Write graph in batches of unordered upserts, the graph may be
+        the part of the whole one
+
+        @types: dict[str, collector.UrlInfo]
+        @raise storage.WriteException:
+        '''
+        import pymongo.errors
+        requests = (_upsert(url, incomming, outgoing)
+                    for url, (incomming, outgoing) in graph.iteritems())
+        try:
+            # client connects lazily, so unavailable server is found here
+            collection = self._get_collection()
+            for batch in _batches(requests, self._batch_size):
+                collection.bulk_write(batch, ordered=False)
+        except pymongo.errors.PyMongoError, e:
+            raise WriteException(str(e))
+
+    def _get_collection(self):
+        ''' Collection indexed by URL, the index is not unique if the
+        collection already holds duplicate documents of the same page
+        @types: -> pymongo.collection.Collection'''
+        import pymongo.errors
+        if self._collection is None:
+            collection = self._client.graph_db.in_out_by_url
+            try:
+                collection.create_index("url", unique=True)
+            except pymongo.errors.DuplicateKeyError, e:
+                logger.warning("Pages are stored in duplicate documents, "
+                               "URL index is not unique. %s" % e)
+                collection.create_index("url")
+            self._collection = collection
+        return self._collection
 
     @classmethod
-    def connect(cls, host, port):
-        '@types: str, int -> MongoStorage'
+    def connect(cls, host, port, batch_size=DEFAULT_BATCH_SIZE):
+        ''' Connect to the server checking it is available, the client
+        itself connects lazily on the first request
+        @types: str, int, int -> MongoStorage
+        @raise storage.ConnectException:
+        '''
+        import pymongo
+        import pymongo.errors
         try:
             client = pymongo.MongoClient(host, port)
-            return cls(client)
+            client.admin.command("ping")
+            return cls(client, batch_size)
         except (pymongo.errors.ConnectionFailure,
                 pymongo.errors.AutoReconnect), e:
             raise ConnectException(str(e))
 
 
-def get_default():
-    '@types: -> GraphStorage'
-    # read data from configuration file
-    return Mongo.connect("localhost", 27017)
+class SQLite(GraphStorage):
+    ''' Graph stored in the SQLite database file: each URL is stored once
+    in the URL table and edges reference URLs by id. Edge table is indexed
+    in both directions, so links of the page are looked up without scan.
+    Writing the same page again merges its edges.
+    '''
+
+    def __init__(self, connection, batch_size=DEFAULT_BATCH_SIZE):
+        '@types: sqlite3.Connection, int'
+        self._connection = connection
+        self._batch_size = batch_size
+
+    @classmethod
+    def connect(cls, path, batch_size=DEFAULT_BATCH_SIZE):
+        ''' Open the database creating it if it does not exist
+        @types: str, int -> SQLite
+        @raise storage.ConnectException:
+        '''
+        try:
+            connection = sqlite3.connect(path)
+            with connection:
+                for statement in _SQLITE_SCHEMA:
+                    connection.execute(statement)
+            return cls(connection, batch_size)
+        except sqlite3.Error, e:
+            raise ConnectException(str(e))
+
+    def close(self):
+        self._connection.close()
+
+    def write(self, graph):
+        ''' Write graph in batches of pages, each batch in its own
+        transaction, the graph may be the part of the whole one
+
+        @types: dict[str, collector.UrlInfo]
+        @raise storage.WriteException:
+        '''
+        try:
+            for batch in _batches(graph.iteritems(), self._batch_size):
+                with self._connection:
+                    self._write_batch(batch)
+        except sqlite3.Error, e:
+            raise WriteException(str(e))
+
+    def _write_batch(self, pages):
+        '@types: list[tuple[str, collector.UrlInfo]]'
+        edges = [(source, target)
+                 for url, (incomming, outgoing) in pages
+                 for source, target in _edges(url, incomming, outgoing)]
+        execute = self._connection.executemany
+        urls = [(url,) for url, _ in pages]
+        execute("INSERT OR IGNORE INTO urls (url) VALUES (?)",
+                urls + [(url,) for edge in edges for url in edge])
+        execute("UPDATE urls SET is_page = 1 WHERE url = ?", urls)
+        execute("INSERT OR IGNORE INTO edges (source, target) "
+                "SELECT s.id, t.id FROM urls s, urls t "
+                "WHERE s.url = ? AND t.url = ?", edges)
+
+    def outgoing(self, url):
+        '@types: str -> set[str]'
+        return self._query(
+            "SELECT t.url FROM urls s "
+            "JOIN edges e ON e.source = s.id "
+            "JOIN urls t ON t.id = e.target WHERE s.url = ?", url)
+
+    def incomming(self, url):
+        '@types: str -> set[str]'
+        return self._query(
+            "SELECT s.url FROM urls t "
+            "JOIN edges e ON e.target = t.id "
+            "JOIN urls s ON s.id = e.source WHERE t.url = ?", url)
+
+    def pages(self):
+        ''' URLs of the written pages
+        @types: -> iterable[str]'''
+        rows = self._connection.execute(
+            "SELECT url FROM urls WHERE is_page = 1 ORDER BY id")
+        return (url for url, in rows)
+
+    def _query(self, statement, url):
+        '@types: str, str -> set[str]'
+        return set(url_ for url_, in self._connection.execute(statement,
+                                                              (url,)))
+
+
+def _edges(url, incomming, outgoing):
+    '@types: str, iterable[str], iterable[str] -> iterable[tuple[str, str]]'
+    for source in incomming:
+        yield source, url
+    for target in outgoing:
+        yield url, target
+
+
+def _upsert(url, incomming, outgoing):
+    '@types: str, iterable[str], iterable[str] -> pymongo.UpdateOne'
+    import pymongo
+    return pymongo.UpdateOne(
+        {"url": url},
+        {"$addToSet": {"incomming": {"$each": list(incomming)},
+                       "outgoing": {"$each": list(outgoing)}}},
+        upsert=True)
+
+
+def _batches(xs, size):
+    '@types: iterable[T], int -> iterable[list[T]]'
+    xs = iter(xs)
+    batch = list(islice(xs, size))
+    while batch:
+        yield batch
+        batch = list(islice(xs, size))
+
+
+def get_default(uri=DEFAULT_URI, batch_size=DEFAULT_BATCH_SIZE):
+    ''' Connect to the storage given by URI, see parse_uri
+
+    @types: str, int -> GraphStorage
+    @raise ValueError: URI of unknown storage
+    @raise storage.ConnectException:
+    '''
+    scheme, address = parse_uri(uri)
+    if scheme == SQLITE_SCHEME:
+        return SQLite.connect(address, batch_size)
+    host, port = address
+    return Mongo.connect(host, port, batch_size)
+
+
+def parse_uri(uri):
+    ''' Scheme and address of the storage given by URI,
+    "mongodb://<host>:<port>" for the MongoDB server or "sqlite:<path>"
+    for the SQLite database file
+
+    @types: str -> tuple[str, str|tuple[str, int]]
+    @return: scheme with the path of the database file or the pair
+             of MongoDB host and port
+    @raise ValueError: URI of unknown storage or without address
+    '''
+    scheme, _, rest = uri.partition(":")
+    if scheme == SQLITE_SCHEME and rest:
+        return scheme, rest
+    if scheme == MONGODB_SCHEME:
+        address = urlparse.urlparse(uri)
+        if address.hostname:
+            return scheme, (address.hostname, address.port or 27017)
+    raise ValueError("Unknown storage %s" % uri)
@@ -0,0 +1,331 @@
+''' Crawl engine on top of tornado event loop and its async HTTP client
+
+Unlike the gevent based engine nothing in the interpreter is patched,
+so it can run side by side with pymongo and other blocking libraries.
+On Python 3 tornado event loop runs on asyncio.
+'''
+import time
+import httplib
+import datetime
+from functools import partial
+
+from tornado import gen, httpclient, ioloop, queues, httputil
+
+import collector
+
+# pycurl based client reuses connections to the same host, the default
+# one opens the connection for each request
+CURL_CLIENT = "tornado.curl_httpclient.CurlAsyncHTTPClient"
+
+
+def collect(start_url, limit, max_in_flight, head_first=True,
+            max_page_size=None, content_budget=None, **crawl_options):
+    '''
+    @types: str, int, int, bool, int?, int?, **O -> graph.Graph
+    @param max_page_size: max number of bytes of the page content kept,
+                          see collector._collect
+    @param content_budget: see collector._window
+    @param crawl_options: options of the crawl, see collector._Crawl
+    '''
+    max_in_flight = collector._window(max_in_flight, max_page_size,
+                                      content_budget)
+    loop = ioloop.IOLoop()
+    try:
+        client = new_http_client(max_in_flight)
+        try:
+            do_head = head_first and partial(do_request, client, "HEAD")
+            do_get = (head_first and not max_page_size
+                      and partial(do_request, client, "GET")
+                      or partial(do_streamed_get, client,
+                                 max_page_size=max_page_size))
+            return loop.run_sync(partial(_collect, start_url, limit,
+                                         do_head, do_get, max_in_flight,
+                                         max_page_size=max_page_size,
+                                         **crawl_options))
+        finally:
+            client.close()
+    finally:
+        loop.close()
+
+
+def new_http_client(max_clients):
+    '@types: int -> tornado.httpclient.AsyncHTTPClient'
+    try:
+        import pycurl  # noqa
+        impl = CURL_CLIENT
+    except ImportError:
+        collector.logger.warning(
+            "pycurl is not installed, connections are not kept alive")
+        impl = None
+    httpclient.AsyncHTTPClient.configure(impl, max_clients=max_clients)
+    return httpclient.AsyncHTTPClient(force_instance=True)
+
+
+@gen.coroutine
+def do_request(client, method, url, headers=None):
+    '@types: AsyncHTTPClient, str, str, dict[str, str]? -> Future[Response]'
+    response = yield client.fetch(url, method=method, raise_error=False,
+                                  follow_redirects=True, headers=headers)
+    raise gen.Return(Response(response))
+
+
+@gen.coroutine
+def do_streamed_get(client, url, headers=None, max_page_size=None):
+    ''' Do GET request checking content type as soon as headers are
+    received, the body of unsupported type is not downloaded. Chunks of
+    the body over max page size are dropped as they are received, the
+    response is truncated then.
+
+    @types: AsyncHTTPClient, str, dict[str, str]?, int? -> Future[Response]
+    '''
+    response_headers = httputil.HTTPHeaders()
+    chunks = []
+    # size of the body kept and received and whether the rest of the body
+    # is dropped
+    state = {"size": 0, "received": 0, "is_truncated": False}
+
+    def on_header(line):
+        if line.startswith("HTTP/"):
+            # headers of the next response in the redirect chain
+            response_headers.clear()
+        elif line.strip():
+            response_headers.parse_line(line)
+
+    def on_chunk(chunk):
+        if not chunks:
+            head = collector.HeadResponse(200, collector._parse_mime_type(
+                response_headers.get('content-type')))
+            if not collector._has_required_mime_type(head):
+                raise UnsupportedContentType(head.mime_type)
+        state["received"] += len(chunk)
+        if state["is_truncated"]:
+            return
+        rest = max_page_size and max_page_size - state["size"]
+        if rest is not None and len(chunk) > rest:
+            # exception raised here would be logged by the client, so the
+            # rest of the body is read but not kept
+            chunk = chunk[:rest]
+            state["is_truncated"] = True
+        chunks.append(chunk)
+        state["size"] += len(chunk)
+
+    response = yield client.fetch(url, method="GET", raise_error=False,
+                                  follow_redirects=True, headers=headers,
+                                  header_callback=on_header,
+                                  streaming_callback=on_chunk)
+    raise gen.Return(Response(response, ''.join(chunks),
+                              is_truncated=state["is_truncated"],
+                              downloaded_size=state["received"]))
+
+
+class UnsupportedContentType(Exception):
+    pass
+
+
+@gen.coroutine
+def _collect(start_url, limit, do_head_fn, do_get_fn, max_in_flight,
+             parse_pool=None, cache=None, max_page_size=None,
+             **crawl_options):
+    ''' Same as collector._collect but fetching pages in coroutines
+
+    @types: str, int, callable, callable, int, multiprocessing.Pool?, \
+            linkcache.LinkCache?, int?, **O -> Future[graph.Graph]
+
+    @type do_head_fn: (str -> Future[Response])
+    @type do_get_fn: (str -> Future[Response])
+    @param parse_pool: pool of processes where fetched pages are parsed
+    @param cache: cache of the links of pages from the previous crawl
+    @param max_page_size: max number of characters of the content parsed
+    '''
+    crawl = collector._Crawl(start_url, limit,
+                             **collector._with_cache(cache, crawl_options))
+    done = queues.Queue()
+    in_flight = 0
+    while True:
+
+        while crawl.can_dispatch(in_flight, max_in_flight):
+            parent_url, url = crawl.next_page()
+            in_flight += 1
+            ioloop.IOLoop.current().spawn_callback(
+                _fetch, done, parent_url, url, do_head_fn, do_get_fn,
+                parse_pool, cache, crawl.listeners, max_page_size,
+                crawl.mark_truncated)
+
+        crawl.report_progress(in_flight)
+        wait_time = crawl.wait_time(in_flight, max_in_flight)
+        if not in_flight:
+            if wait_time is None:
+                break
+            yield gen.sleep(wait_time)
+            continue
+
+        try:
+            parent_url, url, result, is_normalized = yield done.get(
+                wait_time and datetime.timedelta(seconds=wait_time))
+        except gen.TimeoutError:
+            # frontier let one more page to be fetched
+            continue
+        in_flight -= 1
+        crawl.add_result(parent_url, url, result, is_normalized)
+    collector._log_finished(crawl)
+    raise gen.Return(crawl.graph)
+
+
+@gen.coroutine
+def _fetch(done, parent_url, url, do_head_fn, do_get_fn, parse_pool=None,
+           cache=None, listeners=(), max_page_size=None, on_truncated=None):
+    '''@types: tornado.queues.Queue, str?, str, callable, callable,
+               multiprocessing.Pool?, linkcache.LinkCache?,
+               list[collector.CrawlListener], int?, (str -> None)?'''
+    parse_fn = (parse_pool and collector._read_content
+                or collector._parse_a_tag_urls)
+    if max_page_size:
+        on_truncated = partial(on_truncated or collector._ignore, url)
+        do_get_fn = partial(_truncation_reporting, on_truncated, do_get_fn)
+        parse_fn = partial(collector._truncating_parse, max_page_size,
+                           on_truncated, parse_fn)
+    if listeners:
+        received = []
+        do_head_fn = do_head_fn and partial(
+            _timed_request, listeners, "HEAD", do_head_fn)
+        do_get_fn = partial(_timed_request, listeners, "GET", do_get_fn,
+                            received=received)
+        parse_fn = partial(collector._timed_parse, listeners, url, parse_fn,
+                           received)
+    is_normalized = False
+    try:
+        if cache is None:
+            result = yield _get_outgoing(url, do_head_fn, do_get_fn,
+                                         parse_fn)
+        else:
+            result, is_normalized = yield _get_cached_outgoing(
+                url, do_head_fn, do_get_fn, parse_fn, cache)
+        if parse_pool and result[0] and not is_normalized:
+            is_normalized = True
+            parsed = parse_pool.apply_async(collector._parse_outgoing,
+                                            (url, result[1]))
+            # wait for the result without blocking the event loop
+            result = True, (yield ioloop.IOLoop.current().run_in_executor(
+                None, parsed.get))
+    except Exception:
+        collector.logger.exception("Failed to fetch %s" % url)
+        result, is_normalized = (False, None), False
+    done.put_nowait((parent_url, url, result, is_normalized))
+
+
+@gen.coroutine
+def _truncation_reporting(on_truncated, request_fn, url, **kwargs):
+    ''' Do request calling on_truncated if the response is truncated
+    @types: (-> None), callable, str, **O -> Future[Response]'''
+    response = yield request_fn(url, **kwargs)
+    response.is_truncated and on_truncated()
+    raise gen.Return(response)
+
+
+@gen.coroutine
+def _timed_request(listeners, method, request_fn, url, received=None,
+                   **kwargs):
+    ''' Same as collector._timed_request for the single URL
+    @types: list[collector.CrawlListener], str, callable, str, \
+            list[Response]?, **O -> Future[Response]'''
+    started = time.time()
+    response = yield request_fn(url, **kwargs)
+    seconds = time.time() - started
+    if received is not None:
+        received.append(response)
+    for listener in listeners:
+        listener.request_done(method, url, seconds, response.status_code)
+    raise gen.Return(response)
+
+
+@gen.coroutine
+def _get_cached_outgoing(url, do_head_fn, do_get_fn, parse_fn, cache):
+    ''' Same as collector._fetch with cache
+
+    @types: str, callable, callable, callable, linkcache.LinkCache \
+            -> Future[tuple[tuple[bool, set[str]?], bool]]'''
+    entry = cache.get(url)
+    if entry is None:
+        do_get_fn = partial(_remembering_get, cache, url, do_get_fn)
+        result = yield _get_outgoing(url, do_head_fn, do_get_fn, parse_fn)
+        raise gen.Return((result, False))
+    response = yield do_get_fn(url, headers=entry.conditional_headers())
+    cache.remember(url, response, entry)
+    if response.status_code == httplib.NOT_MODIFIED:
+        raise gen.Return(((True, entry.outgoing), True))
+    raise gen.Return(
+        (parse_fn(collector._parse_streamed_get_response(response)), False))
+
+
+@gen.coroutine
+def _remembering_get(cache, url, do_get_fn, url_):
+    '''@types: linkcache.LinkCache, str, callable, str -> Future[Response]'''
+    response = yield do_get_fn(url_)
+    cache.remember(url, response)
+    raise gen.Return(response)
+
+
+@gen.coroutine
+def _get_outgoing(url, do_head_fn, do_get_fn, parse_fn):
+    '''@types: str, callable, callable, callable
+               -> Future[tuple[bool, set[str]?]]'''
+    if do_head_fn:
+        head = collector._parse_head_response((yield do_head_fn(url)))
+        if not collector._has_required_mime_type(head):
+            raise gen.Return((False, None))
+        content = collector._parse_get_response((yield do_get_fn(url)))
+    else:
+        content = collector._parse_streamed_get_response(
+            (yield do_get_fn(url)))
+    raise gen.Return(parse_fn(content))
+
+
+class Response(object):
+    ''' Subset of requests.Response interface used by the collector '''
+
+    def __init__(self, response, body=None, is_truncated=False,
+                 downloaded_size=None):
+        '''
+        @types: tornado.httpclient.HTTPResponse, str?, bool, int?
+        @param body: body of the response which was read in chunks
+        @param is_truncated: whether the body is cut at max page size
+        @param downloaded_size: number of bytes of the body received,
+                                the size of the body by default
+        '''
+        self._response = response
+        self._body = body
+        self.status_code = response.code
+        self.headers = response.headers
+        self.is_truncated = is_truncated
+        self._downloaded_size = downloaded_size
+
+    @property
+    def downloaded_size(self):
+        '@types: -> int'
+        if self._downloaded_size is not None:
+            return self._downloaded_size
+        return len(self._body or self._response.body or '')
+
+    @property
+    def text(self):
+        '@types: -> unicode'
+        body = self._body or self._response.body or ''
+        _, params = httputil._parse_header(
+            self.headers.get('content-type', ''))
+        try:
+            return body.decode(params.get('charset', 'utf-8'), 'replace')
+        except LookupError:
+            return body.decode('utf-8', 'replace')
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        ''' Body is already downloaded, so it is returned in one chunk
+        @types: int, bool -> iterable[str]'''
+        yield (decode_unicode and self.text
+               or self._body or self._response.body or '')
+
+    def close(self):
+        pass
+
+    def __nonzero__(self):
+        # the same as requests.Response.ok
+        return self.status_code < 400
@@ -0,0 +1,93 @@
+''' Normalization of the links to canonical URLs
+
+Different spellings of the same page are normalized to one URL, so the
+page is fetched once and is a single node of the graph: scheme and host
+are lowercased, default port, fragment and trailing slash of the root
+path are dropped. Pages link to the same URLs over and over, so results
+are memoized by the pair of page URL and the link.
+'''
+import re
+import urlparse
+from collections import OrderedDict
+
+# default max number of memoized links
+DEFAULT_MEMO_SIZE = 100000
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# link that has scheme is not resolved against the page URL
+_ABSOLUTE_RE = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+class Normalizer:
+    ''' Normalizer memoizing the least recently used links '''
+
+    def __init__(self, memo_size=DEFAULT_MEMO_SIZE):
+        '@types: int'
+        self._memo_size = memo_size
+        self._memo = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def normalize(self, url, uri=None):
+        ''' Canonical URL of the link found on the page
+
+        @types: str, str? -> str
+        @param url: URL of the page
+        @param uri: link found on the page, the page URL itself
+                    is normalized if not specified
+        '''
+        if uri is None or _ABSOLUTE_RE.match(uri):
+            key = None, uri or url
+        else:
+            key = url, uri
+        memo = self._memo
+        result = memo.pop(key, None)
+        if result is None:
+            self.misses += 1
+            base, uri = key
+            result = canonicalize(base and urlparse.urljoin(base, uri) or uri)
+            if len(memo) >= self._memo_size:
+                memo.popitem(last=False)
+        else:
+            self.hits += 1
+        memo[key] = result
+        return result
+
+    def hit_rate(self):
+        '@types: -> float'
+        lookups = self.hits + self.misses
+        return lookups and float(self.hits) / lookups
+
+    def __str__(self):
+        return ("normalized links: %s, memo hit rate: %.2f"
+                % (self.hits + self.misses, self.hit_rate()))
+
+
+def canonicalize(url):
+    ''' Canonical form of the absolute URL, URL without scheme is
+    considered to be HTTP one
+
+    @types: str -> str'''
+    scheme, netloc, path, query, _ = urlparse.urlsplit(url)
+    if not scheme:
+        scheme, netloc, path, query, _ = urlparse.urlsplit("http://" + url)
+    scheme = scheme.lower()
+    if netloc:
+        netloc = _canonical_netloc(scheme, netloc)
+        if path == "/":
+            path = ""
+    return urlparse.urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _canonical_netloc(scheme, netloc):
+    ''' Network location with lowercased host and without default port
+    @types: str, str -> str'''
+    userinfo, at, hostport = netloc.rpartition("@")
+    host, colon, port = hostport.rpartition(":")
+    if not colon or "]" in port:
+        # no port or the colon is a part of IPv6 address
+        host, port = hostport, ""
+    if port == DEFAULT_PORTS.get(scheme):
+        port = ""
+    return "".join((userinfo, at, host.lower(), port and ":" + port))
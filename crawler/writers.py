@@ -0,0 +1,75 @@
+''' Writers of the crawl output that work while the crawl is running '''
+import json
+
+import collector
+
+# default number of records buffered before they are written out
+DEFAULT_BATCH_SIZE = 100
+
+
+class NdjsonWriter(collector.CrawlListener):
+    ''' Writes one JSON record per line for each reached page as soon as
+    the page is finished
+
+    Record contains page URL and its outgoing links. The output has one
+    record per reached page, so incoming links of the page are the
+    records which outgoing links contain its URL. Record of the page which
+    content was truncated is marked.
+    '''
+
+    def __init__(self, out, batch_size=DEFAULT_BATCH_SIZE):
+        '@types: file, int'
+        self._out = out
+        self._batch_size = batch_size
+        self._lines = []
+        self._truncated = None
+
+    def page_truncated(self, url):
+        self._truncated = url
+
+    def page_reached(self, url, outgoing):
+        '@types: str, set[str]'
+        record = {"url": url, "outgoing": list(outgoing)}
+        if self._truncated == url:
+            record["truncated"] = True
+        self._lines.append(json.dumps(record))
+        if len(self._lines) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self._out.write("\n".join(self._lines))
+            self._out.write("\n")
+            self._out.flush()
+            self._lines = []
+
+    def close(self):
+        self.flush()
+
+
+class StorageWriter(collector.CrawlListener):
+    ''' Writes reached pages with outgoing links to the storage in batches
+    while crawling, so they survive the crash of the crawl. Incoming links
+    are known only when the crawl is finished.
+    '''
+
+    def __init__(self, storage, batch_size=DEFAULT_BATCH_SIZE):
+        '@types: storage.GraphStorage, int'
+        self._storage = storage
+        self._batch_size = batch_size
+        self._pages = {}
+
+    def page_reached(self, url, outgoing):
+        '@types: str, set[str]'
+        self._pages[url] = collector.UrlInfo((), outgoing)
+        if len(self._pages) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        '@raise storage.WriteException:'
+        if self._pages:
+            self._storage.write(self._pages)
+            self._pages = {}
+
+    def close(self):
+        self.flush()
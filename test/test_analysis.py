@@ -0,0 +1,76 @@
+import pytest
+
+pytest.importorskip("scipy")
+
+import analysis
+import graph
+
+from collector import new_url_info
+
+
+def __graph(outgoing_by_url):
+    return dict((url, new_url_info(outgoing=outgoing))
+                for url, outgoing in outgoing_by_url.iteritems())
+
+
+def test_links_to_pages_not_reached_are_not_in_matrix():
+    # given
+    graph = __graph({"http://a.com": ["http://b.com", "http://x.com"],
+                     "http://b.com": ["http://a.com"]})
+
+    # when
+    urls, matrix = analysis.adjacency(graph)
+
+    # then
+    a, b = urls.index("http://a.com"), urls.index("http://b.com")
+    assert [[0, 1], [1, 0]] == [[matrix[a, a], matrix[a, b]],
+                                [matrix[b, a], matrix[b, b]]]
+    assert 2 == matrix.nnz
+
+
+def test_pagerank_of_cycle_is_uniform_and_hub_ranked_first():
+    # given
+    cycle = __graph({"a": ["b"], "b": ["c"], "c": ["a"]})
+    star = __graph({"hub": ["a"], "a": ["hub"], "b": ["hub"], "c": []})
+
+    # when
+    _, matrix = analysis.adjacency(cycle)
+    ranks = analysis.pagerank(matrix)
+    report = analysis.analyze(star, top=1)
+
+    # then
+    assert pytest.approx([1 / 3.0] * 3, abs=1e-5) == list(ranks)
+    assert "hub" == report["pagerank"][0]["url"]
+
+
+def test_degrees_and_components_reported():
+    # given
+    graph = __graph({"a": ["b"], "b": ["a", "c"], "c": [], "d": ["c"]})
+
+    # when
+    report = analysis.analyze(graph)
+
+    # then
+    assert 4 == report["pages"]
+    assert 4 == report["links"]
+    assert {"0": 1, "1": 2, "2": 1} == report["in_degree"]["distribution"]
+    assert 2 == report["out_degree"]["max"]
+    assert {"count": 3, "largest": [2, 1, 1]} == report["components"]
+
+
+def test_crawled_graph_gives_the_same_matrix_as_its_dict_view():
+    # given
+    graph_ = graph.Graph()
+    graph_.add_page("http://a.com", ["http://b.com", "http://x.com"])
+    graph_.add_page("http://b.com", [])
+    graph_.add_page("http://c.com", ["http://a.com", "http://c.com"])
+
+    # when
+    urls, matrix = analysis.adjacency(graph_)
+    dict_urls, dict_matrix = analysis.adjacency(dict(graph_))
+
+    # then
+    order = [dict_urls.index(url) for url in urls]
+    assert (matrix.toarray() ==
+            dict_matrix.toarray()[order][:, order]).all()
+    assert 3 == matrix.nnz
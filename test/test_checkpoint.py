@@ -0,0 +1,93 @@
+import pytest
+
+import checkpoint
+import collector
+import frontier
+
+
+def test_interrupted_crawl_resumed_from_checkpoint(tmpdir):
+    # given
+    path = str(tmpdir.join("crawl.checkpoint"))
+    start_url = "http://a.com"
+    outgoing_by_url = {start_url: ["http://b.com"],
+                       "http://b.com": ["http://c.com", start_url],
+                       "http://c.com": ["http://d.com", "http://b.com"],
+                       "http://d.com": []}
+    checkpoint_ = checkpoint.Checkpoint.create(path, start_url, 10,
+                                               commit_every=1)
+    crawl = collector._Crawl(start_url, 10, listeners=[checkpoint_])
+
+    # when a.com and b.com are finished, c.com is in flight
+    for _ in xrange(2):
+        parent_url, url = crawl.next_page()
+        crawl.add_result(parent_url, url, (True, outgoing_by_url[url]))
+    crawl.next_page()
+    checkpoint_.close()
+
+    # and crawl is resumed
+    checkpoint_ = checkpoint.Checkpoint.open(path)
+    resumed = collector._Crawl(checkpoint_.start_url, checkpoint_.limit,
+                               resume=checkpoint_.results())
+
+    # then
+    assert 8 == resumed.limit
+    assert resumed.graph == crawl.graph
+    pages = []
+    while resumed.can_dispatch(0, 1):
+        parent_url, url = resumed.next_page()
+        pages.append(url)
+        resumed.add_result(parent_url, url, (True, outgoing_by_url[url]))
+    assert ["http://c.com", "http://d.com"] == pages
+    assert resumed.graph["http://b.com"] == collector.new_url_info(
+        incomming=[start_url, "http://c.com"],
+        outgoing=["http://c.com", start_url])
+
+
+def __resumed(path, pages, **options):
+    ''' Record reached pages to the new checkpoint in order they are
+    finished, then resume the crawl from the checkpoint
+    @types: str, list[tuple[str, list[str], bool]], **O -> collector._Crawl
+    '''
+    checkpoint_ = checkpoint.Checkpoint.create(path, "http://a.com", 10)
+    for url, outgoing, is_truncated in pages:
+        is_truncated and checkpoint_.page_truncated(url)
+        checkpoint_.page_reached(url, outgoing)
+    checkpoint_.close()
+    checkpoint_ = checkpoint.Checkpoint.open(path)
+    return collector._Crawl(checkpoint_.start_url, checkpoint_.limit,
+                            resume=checkpoint_.results(), **options)
+
+
+def test_truncated_pages_restored_from_checkpoint(tmpdir):
+    # when
+    resumed = __resumed(str(tmpdir.join("crawl.checkpoint")),
+                        [("http://a.com", ["http://b.com"], True)])
+
+    # then
+    assert set(["http://a.com"]) == resumed.graph.truncated
+    assert 1 == resumed.stats.truncated
+
+
+def test_pages_linked_more_dispatched_first_after_resume(tmpdir):
+    # given b.com, c.com and f.com fetched at once
+    pages = [("http://a.com", ["http://b.com", "http://c.com",
+                               "http://f.com"], False),
+             ("http://b.com", ["http://e.com"], False),
+             ("http://c.com", ["http://d.com"], False),
+             ("http://f.com", ["http://d.com"], False)]
+
+    # when
+    resumed = __resumed(str(tmpdir.join("crawl.checkpoint")), pages,
+                        frontier=frontier.PriorityFrontier())
+
+    # then
+    assert ["http://d.com", "http://e.com"] == [
+        resumed.next_page()[1] for _ in xrange(2)]
+
+
+def test_existing_checkpoint_is_not_overwritten(tmpdir):
+    path = str(tmpdir.join("crawl.checkpoint"))
+    checkpoint.Checkpoint.create(path, "http://a.com", 10).close()
+
+    with pytest.raises(checkpoint.CheckpointException):
+        checkpoint.Checkpoint.create(path, "http://b.com", 10)
@@ -2,7 +2,13 @@
 import mock
 
 import collector
+import frontier
+import linkcache
 import contextlib
+import time
+import requests
+
+from functools import partial
 
 from collector import _normalize_url, new_url_info
 
@@ -141,7 +147,8 @@ def test_cycle_references():
                                                       outgoing=[start_url])}
 
 
-def __collect_links(start_url, route_table, visit_limit):
+def __collect_links(start_url, route_table, visit_limit,
+                    collect=collector.collect, **options):
     ''' Test how link collecting works in small sandbox
 
     @types: str, dict[str, tuple[int, str, str]], int -> dict[str, UrlInfo]
@@ -154,32 +161,341 @@ def __collect_links(start_url, route_table, visit_limit):
         - status code and mime type for HEAD request
         - list of outgoing links included in visited page
     '''
-    def get_from_route(url):
+    get_from_route = get_response_from_route(route_table)
+    head_from_route = head_response_from_route(route_table)
+
+    with contextlib.nested(
+            mock.patch("requests.Session.get",
+                       mock.Mock(side_effect=get_from_route)),
+            mock.patch("requests.Session.head",
+                       mock.Mock(side_effect=head_from_route)),
+            mock.patch("grequests.get", get_from_route),
+            mock.patch("grequests.head", head_from_route),
+            mock.patch("grequests.map", list)):
+        return collect(start_url, visit_limit, **options)
+
+
+def test_page_linked_from_several_pages_is_fetched_once():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://first.com",
+            "http://second.com")),
+        "http://first.com":
+        (200, 'text/html', content_with_urls("http://nav.com")),
+        "http://second.com":
+        (200, 'text/html', content_with_urls("http://nav.com")),
+        "http://nav.com": (200, 'text/html', content_with_urls())
+    }
+    requested = []
+
+    def do_gets(urls):
+        requested.extend(urls)
+        return map(get_response_from_route(route_table), urls)
+
+    do_heads = lambda urls: map(head_response_from_route(route_table), urls)
+    crawl = collector._Crawl(start_url, 10)
+
+    # when
+    while crawl.can_dispatch(0, 1):
+        parent_url, url = crawl.next_page()
+        result = collector._get_outgoing(url, do_heads, do_gets)
+        crawl.add_result(parent_url, url, result)
+
+    # then
+    assert 1 == requested.count("http://nav.com")
+    assert crawl.graph["http://nav.com"] == new_url_info(
+        incomming=["http://first.com", "http://second.com"])
+    assert 1 == crawl.stats.duplicates_skipped
+    assert 4 == crawl.stats.reached
+
+
+def test_listeners_notified_as_pages_are_finished():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://first.com",
+            "http://gone.com")),
+        "http://first.com": (200, 'text/html', content_with_urls())
+    }
+    listener = mock.Mock()
+
+    # when
+    __collect_links(start_url, route_table, 3, listeners=[listener])
+
+    # then
+    assert listener.page_reached.call_args_list == [
+        mock.call(start_url, set(["http://first.com", "http://gone.com"])),
+        mock.call("http://first.com", set())]
+    listener.page_failed.assert_called_once_with("http://gone.com")
+    assert 3 == listener.page_dispatched.call_count
+    assert listener.request_done.call_count == 5
+    parsed_urls = [c[0][0] for c in listener.page_parsed.call_args_list]
+    assert [start_url, "http://first.com"] == parsed_urls
+
+
+def test_listeners_notified_about_bytes_downloaded_not_characters():
+    # given
+    url = "http://a.com"
+    compressed, content_length = mock.Mock(), mock.Mock()
+    compressed.raw.tell.return_value = 12
+    content_length.raw = None
+    content_length.headers = {"content-type": "text/html",
+                              "content-length": "40"}
+    for response in (compressed, content_length):
+        response.status_code = 200
+        response.iter_content.return_value = iter((u"веб" * 10,))
+    compressed.headers.get.return_value = "text/html"
+    listener = mock.Mock(spec=collector.CrawlListener)
+
+    # when
+    for response in (compressed, content_length):
+        collector._fetch(url, None, lambda urls, r=response: [r],
+                         listeners=[listener])
+
+    # then
+    assert [12, 40] == [c[0][1] for c in listener.page_parsed.call_args_list]
+
+
+def test_pages_parsed_in_process_pool_give_the_same_graph():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://first.com",
+            "/relative",
+            "#fragment")),
+        "http://first.com":
+        (200, 'text/html', content_with_urls(start_url)),
+        "http://today.sunday.in.ua/relative":
+        (200, 'text/html', content_with_urls())
+    }
+
+    # when
+    graph = __collect_links(start_url, route_table, 5, workers=2)
+
+    # then
+    assert graph == __collect_links(start_url, route_table, 5)
+    assert 3 == len(graph)
+
+
+def test_single_get_gives_the_same_graph_as_head_first():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html; charset=utf-8', content_with_urls(
+            "http://first.com",
+            "http://first.com/file.zip")),
+
+        "http://first.com":
+        (200, 'text/html', content_with_urls(start_url)),
+
+        "http://first.com/file.zip":
+        (200, 'application/zip', None)
+    }
+
+    # when
+    graph = __collect_links(start_url, route_table, 3, head_first=False)
+
+    # then
+    assert graph == __collect_links(start_url, route_table, 3)
+    assert graph == {start_url: new_url_info(
+                     incomming=["http://first.com"],
+                     outgoing=["http://first.com",
+                               "http://first.com/file.zip"]),
+                     "http://first.com": new_url_info(
+                     incomming=[start_url],
+                     outgoing=[start_url])}
+
+
+def test_thread_engine_gives_the_same_graph_as_serial_one():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://first.com",
+            "http://second.com",
+            "http://gone.com")),
+        "http://first.com":
+        (200, 'text/html', content_with_urls(start_url)),
+        "http://second.com":
+        (200, 'text/html', content_with_urls("http://first.com"))
+    }
+    listener = mock.Mock(spec=collector.CrawlListener)
+
+    # when
+    graph = __collect_links(start_url, route_table, 4,
+                            collect=collector.tcollect, max_in_flight=3,
+                            listeners=[listener])
+
+    # then
+    assert graph == __collect_links(start_url, route_table, 4)
+    assert 3 == len(graph)
+    assert 3 == listener.page_reached.call_count
+    listener.page_failed.assert_called_once_with("http://gone.com")
+
+
+def test_unreachable_host_is_failed_page_of_thread_engine():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://first.com",
+            "http://unreachable.com")),
+        "http://first.com": (200, 'text/html', content_with_urls())
+    }
+    get_from_route = get_response_from_route(route_table)
+
+    def get(url, **kwargs):
+        if url == "http://unreachable.com":
+            raise requests.ConnectionError("Name or service not known")
+        return get_from_route(url)
+    listener = mock.Mock(spec=collector.CrawlListener)
+
+    # when
+    with mock.patch("requests.Session.get", mock.Mock(side_effect=get)):
+        graph = collector.tcollect(start_url, 3, max_in_flight=2,
+                                   head_first=False, listeners=[listener])
+
+    # then
+    assert 2 == len(graph)
+    listener.page_failed.assert_called_once_with("http://unreachable.com")
+
+
+def __requested_by_gevent_engine(start_url, route_table, visit_limit,
+                                 **options):
+    ''' Collect with gevent engine recording keyword arguments
+    of the requests sent by the session
+    @types: str, dict[str, tuple[int, str, str]], int, **O \
+            -> tuple[graph.Graph, list[tuple[str, dict]]]'''
+    get_from_route = get_response_from_route(route_table)
+    head_from_route = head_response_from_route(route_table)
+    requested = []
+
+    def request(self, method, url, **kwargs):
+        requested.append((method, kwargs))
+        return (method == "HEAD" and head_from_route or get_from_route)(url)
+
+    with mock.patch("requests.Session.request", request):
+        graph = collector.pcollect(start_url, visit_limit, max_in_flight=2,
+                                   **options)
+    return graph, requested
+
+
+def test_gevent_engine_streams_body_of_get_responses():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls("http://first.com")),
+        "http://first.com": (200, 'text/html', content_with_urls())
+    }
+
+    # when
+    graph, requested = __requested_by_gevent_engine(
+        start_url, route_table, 2, max_page_size=1000)
+
+    # then
+    assert 2 == len(graph)
+    gets = [kwargs for method, kwargs in requested if method == "GET"]
+    assert 2 == len(gets)
+    assert all(kwargs["stream"] for kwargs in gets)
+
+
+def test_gevent_engine_single_get_does_not_download_unsupported_body():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls("http://first.com/file.zip")),
+        "http://first.com/file.zip": (200, 'application/zip', "PK")
+    }
+
+    # when
+    graph, requested = __requested_by_gevent_engine(
+        start_url, route_table, 2, head_first=False)
+
+    # then
+    assert graph == __collect_links(start_url, route_table, 2)
+    assert ["GET", "GET"] == [method for method, _ in requested]
+    assert all(kwargs["stream"] for _, kwargs in requested)
+
+
+def test_gevent_engine_fails_page_which_body_is_broken():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls("http://broken.com")),
+        "http://broken.com": (200, 'text/html', None)
+    }
+    get_from_route = get_response_from_route(route_table)
+
+    def broken_body(*args, **kwargs):
+        yield '<a href="http://first.com">'
+        raise requests.exceptions.ChunkedEncodingError("Connection broken")
+
+    def request(self, method, url, **kwargs):
+        response = get_from_route(url)
+        if url == "http://broken.com":
+            response.iter_content.side_effect = broken_body
+        return response
+
+    # when
+    with mock.patch("requests.Session.request", request):
+        graph = collector.pcollect(start_url, 2, max_in_flight=2,
+                                   head_first=False)
+
+    # then
+    assert [start_url] == list(graph)
+
+
+def test_streamed_body_of_unsupported_type_is_not_read():
+    response = mock.Mock()
+    response.status_code = 200
+    response.headers.get.return_value = 'application/zip'
+
+    assert (False, None) == collector._parse_streamed_get_response(response)
+    response.close.assert_called_once_with()
+
+
+def get_response_from_route(route_table):
+    ''' Make function that mocks GET request with route table
+    @types: dict[str, tuple[int, str, str]] -> (str -> mock.Mock)'''
+    def get_from_route(url, **kwargs):
         print "GET from route: ", url
         record = route_table.get(url)
-        code, content = 404, None
+        code, mimetype, content = 404, None, None
         if record:
-            code, _, content = record
+            code, mimetype, content = record
         response = mock.Mock()
         response.text = content
+        response.iter_content.return_value = iter((content,))
         response.status_code = code
+        response.headers.get.return_value = mimetype
         return response
+    return get_from_route
+
 
-    def head_from_route(url):
+def head_response_from_route(route_table):
+    ''' Make function that mocks HEAD request with route table
+    @types: dict[str, tuple[int, str, str]] -> (str -> mock.Mock)'''
+    def head_from_route(url, **kwargs):
         r = route_table.get(url, (404, None, None))
         status_code, mimetype, _ = r
         response = mock.Mock()
         response.status_code = status_code
         response.headers.get.return_value = mimetype
         return response
-
-    with contextlib.nested(
-            mock.patch("requests.get", get_from_route),
-            mock.patch("requests.head", head_from_route),
-            mock.patch("grequests.get", get_from_route),
-            mock.patch("grequests.head", head_from_route),
-            mock.patch("grequests.map", list)):
-        return collector.collect(start_url, visit_limit)
+    return head_from_route
 
 
 def content_with_urls(*urls):
@@ -251,3 +567,319 @@ def test_urls_parsed_from_html_content():
                           'http://area51.stackexchange.com',
                           'http://careers.stackoverflow.com'])
     assert expected == collector._parse_a_tag_urls((True, content))
+
+
+def test_slow_page_does_not_stall_the_window():
+    # given
+    import gevent
+    import executors
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://slow.com",
+            "http://first.com")),
+        "http://slow.com": (200, 'text/html', content_with_urls()),
+        "http://first.com":
+        (200, 'text/html', content_with_urls("http://second.com")),
+        "http://second.com": (200, 'text/html', content_with_urls())
+    }
+    completed = []
+
+    def do_gets(urls):
+        urls = list(urls)
+        "http://slow.com" in urls and gevent.sleep(0.1)
+        completed.extend(urls)
+        return map(get_response_from_route(route_table), urls)
+
+    do_heads = lambda urls: map(head_response_from_route(route_table), urls)
+
+    # when
+    graph = collector._collect(start_url, 4, do_heads, do_gets,
+                               executor=executors.GeventExecutor(2),
+                               max_in_flight=2)
+
+    # then
+    assert len(graph) == 4
+    assert completed.index("http://second.com") < completed.index(
+        "http://slow.com")
+
+
+def test_slow_page_does_not_stall_the_thread_window():
+    # given
+    import time
+    import executors
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://slow.com",
+            "http://first.com")),
+        "http://slow.com": (200, 'text/html', content_with_urls()),
+        "http://first.com":
+        (200, 'text/html', content_with_urls("http://second.com")),
+        "http://second.com": (200, 'text/html', content_with_urls())
+    }
+    completed = []
+
+    def do_gets(urls):
+        urls = list(urls)
+        "http://slow.com" in urls and time.sleep(0.2)
+        completed.extend(urls)
+        return map(get_response_from_route(route_table), urls)
+
+    do_heads = lambda urls: map(head_response_from_route(route_table), urls)
+    executor = executors.ThreadExecutor(2)
+
+    # when
+    try:
+        graph = collector._collect(start_url, 4, do_heads, do_gets,
+                                   executor=executor, max_in_flight=2)
+    finally:
+        executor.close()
+
+    # then
+    assert len(graph) == 4
+    assert completed.index("http://second.com") < completed.index(
+        "http://slow.com")
+
+
+class DelayedParse:
+    ''' Result of the parse pool which is ready after the delay '''
+
+    def __init__(self, fn, args, delay=0.0):
+        self._ready_at = time.time() + delay
+        self._fn = fn
+        self._args = args
+
+    def ready(self):
+        return time.time() >= self._ready_at
+
+    def get(self):
+        time.sleep(max(0.0, self._ready_at - time.time()))
+        return self._fn(*self._args)
+
+
+def test_parsed_page_merged_while_slow_page_is_fetched():
+    # given
+    import gevent
+    import executors
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://slow.com",
+            "http://first.com")),
+        "http://slow.com": (200, 'text/html', content_with_urls()),
+        "http://first.com": (200, 'text/html', content_with_urls())
+    }
+    completed = []
+
+    def do_gets(urls):
+        urls = list(urls)
+        "http://slow.com" in urls and gevent.sleep(0.3)
+        completed.extend(urls)
+        return map(get_response_from_route(route_table), urls)
+
+    do_heads = lambda urls: map(head_response_from_route(route_table), urls)
+    parse_pool = mock.Mock()
+    parse_pool.apply_async.side_effect = (
+        lambda fn, args: DelayedParse(fn, args, delay=0.05))
+    completed_when_reached = {}
+    listener = mock.Mock(spec=collector.CrawlListener)
+    listener.page_reached.side_effect = (
+        lambda url, _: completed_when_reached.setdefault(url,
+                                                         list(completed)))
+
+    # when
+    graph = collector._collect(start_url, 3, do_heads, do_gets,
+                               executor=executors.GeventExecutor(2),
+                               max_in_flight=2, parse_pool=parse_pool,
+                               listeners=[listener])
+
+    # then
+    assert len(graph) == 3
+    assert "http://slow.com" not in completed_when_reached["http://first.com"]
+
+
+def test_page_failed_to_be_parsed_is_not_reached():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls("http://first.com")),
+        "http://first.com": (200, 'text/html', content_with_urls())
+    }
+    do_gets = lambda urls: map(get_response_from_route(route_table), urls)
+    do_heads = lambda urls: map(head_response_from_route(route_table), urls)
+
+    def parse(url, content):
+        if url == "http://first.com":
+            raise ValueError("cannot parse")
+        return collector._parse_outgoing(url, content)
+    parse_pool = mock.Mock()
+    parse_pool.apply_async.side_effect = (
+        lambda fn, args: DelayedParse(parse, args))
+    listener = mock.Mock(spec=collector.CrawlListener)
+
+    # when
+    graph = collector._collect(start_url, 2, do_heads, do_gets,
+                               parse_pool=parse_pool, listeners=[listener])
+
+    # then
+    assert [start_url] == list(graph)
+    listener.page_failed.assert_called_once_with("http://first.com")
+
+
+def test_in_flight_pages_never_exceed_the_limit():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://first.com",
+            "http://second.com")),
+        "http://first.com": (200, 'text/html', content_with_urls()),
+        "http://second.com": (200, 'text/html', content_with_urls())
+    }
+    requested = []
+
+    def do_gets(urls):
+        requested.extend(urls)
+        return map(get_response_from_route(route_table), urls)
+
+    do_heads = lambda urls: map(head_response_from_route(route_table), urls)
+
+    # when
+    graph = collector._collect(start_url, 2, do_heads, do_gets,
+                               max_in_flight=10)
+
+    # then
+    assert len(graph) == 2
+    assert len(requested) == 2
+
+
+def test_hosts_visited_in_turns_with_host_frontier():
+    # given
+    start_url = "http://a.com"
+    route_table = {
+        start_url: (200, 'text/html', content_with_urls(
+            "http://a.com/1", "http://a.com/2", "http://b.com/1")),
+        "http://a.com/1": (200, 'text/html', content_with_urls()),
+        "http://a.com/2": (200, 'text/html', content_with_urls()),
+        "http://b.com/1": (200, 'text/html', content_with_urls()),
+    }
+    listener = mock.Mock(spec=collector.CrawlListener)
+
+    # when
+    __collect_links(start_url, route_table, 3, listeners=[listener],
+                    frontier=frontier.HostFrontier())
+
+    # then
+    reached = [c[0][0] for c in listener.page_reached.call_args_list]
+    assert start_url == reached[0]
+    assert "http://b.com/1" == reached[2]
+
+
+def test_links_of_not_modified_page_reused_from_cache(tmpdir):
+    # given
+    start_url = "http://a.com"
+    route_table = {
+        start_url: (200, 'text/html', content_with_urls("http://b.com")),
+        "http://b.com": (200, 'text/html', content_with_urls()),
+    }
+    get_from_route = get_response_from_route(route_table)
+
+    def get_with_etag(url, headers=None, **kwargs):
+        response = get_from_route(url)
+        if headers and headers.get("If-None-Match") == "1":
+            response.status_code = 304
+        response.headers = {"etag": "1", "content-type": "text/html"}
+        return response
+    do_gets = mock.Mock(side_effect=get_with_etag)
+    path = str(tmpdir.join("links.cache"))
+
+    # when
+    graphs = []
+    for _ in xrange(2):
+        with contextlib.closing(linkcache.LinkCache.open(path)) as cache:
+            graphs.append(collector._collect(
+                start_url, 2, None, partial(collector.do_request, do_gets,
+                                            list),
+                cache=cache))
+
+    # then
+    assert graphs[0] == graphs[1]
+    conditional_gets = do_gets.call_args_list[2:]
+    assert 2 == len(conditional_gets)
+    assert all(kwargs == {"headers": {"If-None-Match": "1"}}
+               for _, kwargs in conditional_gets)
+
+
+def test_cache_used_by_threads_of_thread_engine(tmpdir):
+    # given
+    start_url = "http://a.com"
+    route_table = {
+        start_url: (200, 'text/html', content_with_urls(
+            "http://b.com", "http://c.com")),
+        "http://b.com": (200, 'text/html', content_with_urls()),
+        "http://c.com": (200, 'text/html', content_with_urls()),
+    }
+    path = str(tmpdir.join("links.cache"))
+
+    # when
+    with contextlib.closing(linkcache.LinkCache.open(path)) as cache:
+        graph = __collect_links(start_url, route_table, 3,
+                                collect=collector.tcollect, cache=cache)
+
+        # then
+        assert 3 == len(graph)
+        assert 3 == len(cache)
+
+
+def test_links_parsed_from_truncated_content_of_large_page():
+    # given
+    start_url = "http://a.com"
+    route_table = {
+        start_url: (200, 'text/html', content_with_urls(
+            "http://b.com", "http://c.com")),
+        "http://b.com": (200, 'text/html', content_with_urls()),
+    }
+    listener = mock.Mock()
+    max_page_size = len(content_with_urls("http://b.com")) + 1
+
+    # when
+    graph = __collect_links(start_url, route_table, 5, listeners=[listener],
+                            max_page_size=max_page_size)
+
+    # then
+    assert graph[start_url].outgoing == set(["http://b.com"])
+    listener.page_truncated.assert_called_once_with(start_url)
+    pages = collector.url_to_info_as_pure_dict(graph)
+    assert pages[start_url]["truncated"]
+    assert "truncated" not in pages["http://b.com"]
+
+
+def test_response_closed_when_reading_stops_at_max_page_size():
+    # given
+    response = mock.Mock(status_code=200)
+    response.headers.get.return_value = "text/html"
+    chunks = iter(('<a href="http://b.com">', '<a href="http://c.com">',
+                   '<a href="http://d.com">'))
+    response.iter_content.return_value = chunks
+
+    # when
+    result, _ = collector._fetch("http://a.com", None, lambda urls: [response],
+                                 max_page_size=30)
+
+    # then
+    assert (True, set(["http://b.com"])) == result
+    response.close.assert_called_once_with()
+    assert '<a href="http://d.com">' == next(chunks)
+
+
+def test_content_budget_limits_pages_in_flight():
+    assert 50 == collector._window(50)
+    assert 50 == collector._window(50, max_page_size=10)
+    assert 4 == collector._window(50, max_page_size=10, content_budget=45)
+    assert 1 == collector._window(50, max_page_size=10, content_budget=5)
@@ -0,0 +1,38 @@
+import extractor
+
+from extractor import iter_links
+
+
+def test_quoted_and_unquoted_hrefs():
+    content = '''
+        <a href="http://double.com">
+        <a class='x' href='http://single.com'>
+        <a href=http://unquoted.com>
+        <A HREF = "http://upper.com" >
+        '''
+    assert ["http://double.com", "http://single.com",
+            "http://unquoted.com", "http://upper.com"] == list(
+        iter_links([content]))
+
+
+def test_tags_and_attributes_that_only_look_like_links():
+    content = '''
+        <abbr href="http://abbr.com">
+        <a data-href="http://data.com">
+        <a name="anchor">
+        '''
+    assert [] == list(iter_links([content]))
+
+
+def test_tag_split_between_chunks():
+    content = '<p>text</p><a href="http://split.com">x</a><a href="/next">'
+    for i in xrange(len(content)):
+        chunks = content[:i], content[i:]
+        assert ["http://split.com", "/next"] == list(iter_links(chunks))
+
+
+def test_unclosed_tag_longer_than_limit_is_skipped():
+    broken = '<a href="http://broken.com" ' + 'x' * extractor.MAX_TAG_LENGTH
+    chunks = [broken[i:i + 1024] for i in xrange(0, len(broken), 1024)]
+    chunks.append('<a href="http://ok.com">')
+    assert ["http://ok.com"] == list(iter_links(chunks))
@@ -0,0 +1,101 @@
+from frontier import FifoFrontier, HostFrontier, PriorityFrontier
+
+
+def pop_all(frontier):
+    pages = []
+    while frontier.is_ready():
+        pages.append(frontier.pop()[1])
+    return pages
+
+
+def test_fifo_frontier_keeps_order_pages_were_found():
+    frontier = FifoFrontier([(None, "http://a.com/1")])
+    frontier.push("http://a.com/1", "http://a.com/2")
+    frontier.push("http://a.com/1", "http://b.com/1")
+
+    assert ["http://a.com/1", "http://a.com/2",
+            "http://b.com/1"] == pop_all(frontier)
+    assert frontier.wait_time() is None
+
+
+def test_hosts_take_turns():
+    # given
+    frontier = HostFrontier()
+    for url in ("http://a.com/1", "http://a.com/2", "http://a.com/3",
+                "http://b.com/1", "http://B.com/2", "http://c.com/1"):
+        frontier.push(None, url)
+
+    # when
+    pages = pop_all(frontier)
+
+    # then
+    assert ["http://a.com/1", "http://b.com/1", "http://c.com/1",
+            "http://a.com/2", "http://B.com/2", "http://a.com/3"] == pages
+    assert 0 == len(frontier)
+
+
+def test_host_is_not_dispatched_over_max_per_host():
+    # given
+    frontier = HostFrontier(max_per_host=1)
+    for url in ("http://a.com/1", "http://a.com/2", "http://b.com/1"):
+        frontier.push(None, url)
+
+    # when
+    pages = pop_all(frontier)
+
+    # then
+    assert ["http://a.com/1", "http://b.com/1"] == pages
+    assert frontier.wait_time() is None
+    frontier.done("http://a.com/1")
+    assert ["http://a.com/2"] == pop_all(frontier)
+
+
+def test_host_waits_min_delay_between_dispatches():
+    # given
+    now = [100.0]
+    frontier = HostFrontier(min_delay=2, clock=lambda: now[0])
+    for url in ("http://a.com/1", "http://a.com/2", "http://b.com/1"):
+        frontier.push(None, url)
+
+    # when
+    pages = pop_all(frontier)
+
+    # then
+    assert ["http://a.com/1", "http://b.com/1"] == pages
+    assert 2 == frontier.wait_time()
+    now[0] += 2
+    assert ["http://a.com/2"] == pop_all(frontier)
+
+
+def test_most_linked_pages_dispatched_first():
+    # given
+    frontier = PriorityFrontier()
+    for url in ("http://a.com/1", "http://a.com/2", "http://a.com/3"):
+        frontier.push("http://a.com", url)
+
+    # when
+    frontier.linked("http://b.com", "http://a.com/3")
+    frontier.linked("http://c.com", "http://a.com/3")
+    frontier.linked("http://c.com", "http://a.com/2")
+    frontier.linked("http://c.com", "http://x.com/failed")
+
+    # then
+    assert 3 == len(frontier)
+    assert ["http://a.com/3", "http://a.com/2", "http://a.com/1"] == \
+        pop_all(frontier)
+    assert 0 == len(frontier)
+
+
+def test_invalidated_entries_dropped_from_priority_frontier():
+    # given
+    frontier = PriorityFrontier()
+    frontier.push(None, "http://a.com/1")
+    frontier.push(None, "http://a.com/2")
+
+    # when
+    for _ in xrange(10):
+        frontier.linked("http://b.com", "http://a.com/1")
+
+    # then
+    assert len(frontier._heap) <= 4
+    assert (None, "http://a.com/1") == frontier.pop()
@@ -0,0 +1,137 @@
+from graph import EdgeStore, Graph, UrlTable
+from collector import new_url_info
+
+
+def test_url_interned_once():
+    urls = UrlTable()
+    id_ = urls.intern("http://a.com")
+    assert id_ == urls.intern("http://a.com")
+    assert "http://a.com" == urls.url(id_)
+    assert 1 == len(urls)
+
+
+def test_graph_viewed_as_dict_of_url_info():
+    # given
+    graph = Graph()
+
+    # when
+    graph.add_page("http://a.com", ["http://b.com", "http://c.com"])
+    graph.add_page("http://b.com", ["http://a.com"])
+
+    # then
+    assert graph == {
+        "http://a.com": new_url_info(
+            incomming=["http://b.com"],
+            outgoing=["http://b.com", "http://c.com"]),
+        "http://b.com": new_url_info(
+            incomming=["http://a.com"],
+            outgoing=["http://a.com"])}
+
+
+def test_linked_but_not_reached_url_is_not_in_graph():
+    graph = Graph()
+    graph.add_page("http://a.com", ["http://b.com"])
+
+    assert "http://b.com" in graph.urls
+    assert "http://b.com" not in graph
+    assert ["http://a.com"] == list(graph)
+
+
+def test_incomming_links_derived_again_when_page_added():
+    # given
+    graph = Graph()
+    graph.add_page("http://a.com", ["http://a.com", "http://b.com"])
+    assert set(["http://a.com"]) == graph["http://a.com"].incomming
+
+    # when
+    graph.add_page("http://b.com", ["http://a.com"])
+
+    # then
+    assert set(["http://a.com", "http://b.com"]) == \
+        graph["http://a.com"].incomming
+    assert set(["http://a.com"]) == graph["http://b.com"].incomming
+
+
+def test_graph_spilled_to_disk_viewed_the_same():
+    # given
+    pages = [("http://%s.com" % i,
+              ["http://%s.com" % ((i + d) % 7) for d in (1, 2, 3)])
+             for i in xrange(6)]
+    graph, spilling_graph = Graph(), Graph(max_edges_in_memory=4)
+
+    # when
+    for url, outgoing in pages:
+        graph.add_page(url, outgoing)
+        spilling_graph.add_page(url, outgoing)
+
+    # then
+    assert graph == spilling_graph
+    assert len(graph) == len(spilling_graph)
+
+
+def test_urls_moved_to_disk_keep_their_ids():
+    # given
+    urls = UrlTable(max_urls_in_memory=2)
+    ids = [urls.intern("http://%s.com" % i) for i in xrange(5)]
+
+    # when
+    moved_id = urls.intern("http://0.com")
+
+    # then
+    assert range(5) == ids
+    assert 0 == moved_id
+    assert "http://3.com" == urls.url(3)
+    assert "http://4.com" in urls
+    assert "http://5.com" not in urls
+    assert ["http://%s.com" % i for i in xrange(5)] == list(urls)
+    assert 5 == len(urls)
+
+
+def test_graph_with_urls_on_disk_viewed_the_same():
+    # given
+    pages = [("http://%s.com" % i,
+              ["http://%s.com" % ((i + d) % 7) for d in (1, 2, 3)])
+             for i in xrange(6)]
+    graph, spilling_graph = Graph(), Graph(max_urls_in_memory=3)
+
+    # when
+    for url, outgoing in pages:
+        graph.add_page(url, outgoing)
+        spilling_graph.add_page(url, outgoing)
+
+    # then
+    assert graph == spilling_graph
+
+
+def test_non_ascii_urls_moved_to_disk_found_as_they_were():
+    # given
+    url = u"http://a.com/caf\xe9"
+    graph = Graph(max_urls_in_memory=1)
+
+    # when
+    graph.add_page(url, [u"http://b.com/\u0432", "http://c.com"])
+
+    # then
+    assert url in graph.urls
+    assert [url] == list(graph)
+    assert isinstance(graph.urls.url(0), unicode)
+    assert "http://c.com" == graph.urls.url(2)
+    assert set([u"http://b.com/\u0432", "http://c.com"]) == \
+        graph[url].outgoing
+
+
+def test_spilled_chunks_of_page_joined_in_order():
+    # given
+    store = EdgeStore(max_edges_in_memory=2)
+
+    # when
+    store.extend(1, [10, 11, 12])
+    store.append(2, 20)
+    store.append(1, 13)
+
+    # then
+    assert [10, 11, 12, 13] == list(store.get(1))
+    assert [20] == list(store.get(2))
+    assert [] == list(store.get(3))
+    assert set([1, 2]) == set(store)
+    assert 2 == len(store)
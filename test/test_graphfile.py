@@ -0,0 +1,59 @@
+# coding: utf-8
+import pytest
+
+import graphfile
+from graph import Graph
+from collector import new_url_info
+
+
+def __written(tmpdir, graph, name="graph.bin"):
+    path = str(tmpdir.join(name))
+    graphfile.write(graph, path)
+    return path
+
+
+def test_graph_loaded_from_file_is_the_same_as_written(tmpdir):
+    # given
+    graph = Graph()
+    graph.add_page(u"http://a.com", [u"http://b.com", u"http://x.com/ж"])
+    graph.add_page(u"http://b.com", [u"http://a.com"])
+    graph.add_page(u"http://c.com", [])
+
+    # when
+    loaded = graphfile.GraphFile.open(__written(tmpdir, graph))
+
+    # then
+    assert dict(graph) == dict(loaded)
+    assert [u"http://a.com", u"http://b.com", u"http://c.com"] == \
+        list(loaded.pages())
+    assert set([u"http://a.com"]) == loaded.incomming(u"http://x.com/ж")
+    assert u"http://x.com/ж" not in loaded
+    assert set() == loaded.outgoing("http://unknown.com")
+    loaded.close()
+
+
+def test_spilled_graph_written_the_same_as_its_dict_view(tmpdir):
+    # given
+    graph = Graph(max_edges_in_memory=1)
+    graph.add_page("http://b.com", ["http://a.com", "http://c.com"])
+    graph.add_page("http://a.com", ["http://b.com"])
+    view = {"http://a.com": new_url_info(outgoing=["http://b.com"]),
+            "http://b.com": new_url_info(outgoing=["http://c.com",
+                                                   "http://a.com"])}
+
+    # when
+    path = __written(tmpdir, graph)
+    view_path = __written(tmpdir, view, "view.bin")
+
+    # then
+    assert open(path, "rb").read() == open(view_path, "rb").read()
+
+
+def test_file_of_other_format_is_not_opened(tmpdir):
+    # given
+    path = tmpdir.join("graph.json")
+    path.write("{}" * 100)
+
+    # when
+    with pytest.raises(graphfile.GraphFileException):
+        graphfile.GraphFile.open(str(path))
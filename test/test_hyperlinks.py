@@ -1,5 +1,8 @@
+import os
+import sys
 import pytest
 import mock
+import subprocess
 
 from itertools import izip
 from functools import partial as Fn
@@ -10,6 +13,9 @@ import json
 
 import hyperlinks
 import collector
+import frontier
+import graphfile
+import storage
 
 
 class TestCliArgumentsParsingUsingUsageHelpDefined:
@@ -119,21 +125,187 @@ class TestCli:
                 "--pretty-print": True}
 
         with nested(mock.patch("collector.collect"),
-                    mock.patch("hyperlinks.send_to_mongodb")) as (
+                    mock.patch("hyperlinks.send_to_db")) as (
                 collect_links,
-                send_to_mongodb):
+                send_to_db):
             collect_links.return_value = graph
 
             hyperlinks.cli(args)
 
             collect_links.assert_called_once_with("http://me.at.com", 20)
-            send_to_mongodb.assert_called_once_with(graph)
+            send_to_db.assert_called_once_with(graph, None)
 
             # assert
             out, _ = capsys.readouterr()
             dict_ = collector.url_to_info_as_pure_dict(graph)
             assert json.loads(out) == dict_
 
+    def test_ndjson_records_written_while_crawling(self, capsys):
+        # given
+        args = {"--url": "http://me.at.com",
+                "--limit": '20',
+                "--out-format": "ndjson"}
+
+        def collect(url, limit, listeners):
+            for listener in listeners:
+                listener.page_reached(url, set(["http://x.com"]))
+            return {}
+
+        with mock.patch("collector.collect", collect):
+            # when
+            hyperlinks.cli(args)
+
+        # then
+        out, _ = capsys.readouterr()
+        assert [{"url": "http://me.at.com", "outgoing": ["http://x.com"]}] == \
+            map(json.loads, out.splitlines())
+
+    def test_binary_output_written_to_destination_file(self, tmpdir):
+        # given
+        path = str(tmpdir.join("graph.bin"))
+        args = {"--url": "http://me.at.com",
+                "--limit": '20',
+                "--out": path,
+                "--out-format": "binary"}
+        graph = {"http://me.at.com": collector.new_url_info(
+            outgoing=["http://x.com"])}
+
+        with mock.patch("collector.collect", return_value=graph):
+            # when
+            hyperlinks.cli(args)
+
+        # then
+        loaded = graphfile.GraphFile.open(path)
+        assert set(["http://me.at.com"]) == loaded.incomming("http://x.com")
+
+    def test_pages_stored_while_crawling_with_dbout_live(self, capsys):
+        # given
+        args = {"--url": "http://me.at.com",
+                "--limit": '20',
+                "--dbout": True,
+                "--dbout-live": True,
+                "--db-batch-size": "1"}
+        graph = {"http://me.at.com": collector.new_url_info()}
+
+        def collect(url, limit, listeners):
+            for listener in listeners:
+                listener.page_reached(url, set())
+            return graph
+
+        with nested(mock.patch("collector.collect", collect),
+                    mock.patch("storage.get_default")) as (_, get_default):
+            # when
+            hyperlinks.cli(args)
+
+        # then
+        get_default.assert_called_once_with(batch_size=1)
+        db = get_default.return_value
+        assert 2 == db.write.call_count
+        db.write.assert_called_with(graph)
+        db.close.assert_called_once_with()
+
+    def test_graph_stored_to_sqlite_db(self, tmpdir, capsys):
+        # given
+        path = str(tmpdir.join("graph.db"))
+        args = {"--url": "http://me.at.com",
+                "--limit": '20',
+                "--dbout": True,
+                "--db": "sqlite:" + path}
+        graph = {"http://me.at.com": collector.new_url_info(
+            outgoing=["http://x.com"])}
+
+        with mock.patch("collector.collect", return_value=graph):
+            # when
+            hyperlinks.cli(args)
+
+        # then
+        db = storage.SQLite.connect(path)
+        assert set(["http://me.at.com"]) == db.incomming("http://x.com")
+
+    def test_no_head_request_sent_with_single_get(self, capsys):
+        # given
+        args = {"--url": "http://me.at.com",
+                "--limit": '1',
+                "--single-get": True}
+        response = mock.Mock(status_code=200)
+        response.headers.get.return_value = "text/html"
+        response.iter_content.return_value = iter(
+            ('<a href="http://x.com">',))
+
+        with nested(mock.patch("requests.Session.head"),
+                    mock.patch("requests.Session.get",
+                               return_value=response)) as (head, get):
+            # when
+            hyperlinks.cli(args)
+
+        # then
+        assert not head.called
+        assert 1 == get.call_count
+        out, _ = capsys.readouterr()
+        assert ["http://x.com"] == json.loads(
+            out)["http://me.at.com"]["outgoing"]
+
+    def test_async_engine_wins_when_several_are_asked(self):
+        collect = hyperlinks.choose_engine(True, True, max_in_flight=10)
+        assert collect.func == collector.acollect
+        assert collect.keywords == {"max_in_flight": 10}
+
+    def test_thread_engine_chosen_when_threads_asked(self):
+        collect = hyperlinks.choose_engine(False, False, is_threaded=True,
+                                           max_in_flight=10)
+        assert collect.func == collector.tcollect
+        assert collect.keywords == {"max_in_flight": 10}
+
+    def test_serial_engine_skips_concurrency_options(self):
+        collect = hyperlinks.choose_engine(False, False, max_in_flight=10,
+                                           head_first=False)
+        assert collect.func == collector.collect
+        assert collect.keywords == {"head_first": False}
+
+    def test_hosts_visited_in_turns_when_host_limit_specified(self):
+        assert hyperlinks.new_frontier() is None
+        frontier_ = hyperlinks.new_frontier(host_delay=0.0)
+        assert isinstance(frontier_, frontier.HostFrontier)
+
+    def test_engines_and_drivers_not_imported_on_startup(self):
+        # when
+        loaded = subprocess.check_output([sys.executable, "-c", (
+            "import sys, hyperlinks; print ' '.join(m for m in "
+            "('gevent', 'grequests', 'requests', 'tornado', 'pymongo') "
+            "if m in sys.modules)")]).split()
+
+        # then
+        assert [] == loaded
+
+    def test_log_written_once_to_stderr_keeping_stdout_for_output(
+            self, tmpdir):
+        # given
+        config = os.path.join(os.path.dirname(__file__), os.pardir,
+                              "logging.ini")
+
+        # when
+        process = subprocess.Popen([sys.executable, "-c", (
+            "import logging.config; logging.config.fileConfig(%r); "
+            "logging.getLogger('collector').warning('pycurl is missing')"
+            % config)], cwd=str(tmpdir), stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        out, err = process.communicate()
+
+        # then
+        assert "" == out
+        assert 1 == err.count("pycurl is missing")
+
+    def test_most_linked_pages_visited_first_when_asked(self):
+        frontier_ = hyperlinks.new_frontier(order=hyperlinks.INLINKS_ORDER)
+        assert isinstance(frontier_, frontier.PriorityFrontier)
+
+    def test_host_delay_parsing(self):
+        assert 0.5 == hyperlinks.get_host_delay("0.5")
+        assert hyperlinks.get_host_delay(None) is None
+        for value in ("-1", "soon"):
+            with pytest.raises(hyperlinks.InvalidArgumentValue):
+                hyperlinks.get_host_delay(value)
+
     def test_arg_parsing_failed(self):
         args = {"--limit": "20.0"}
         with pytest.raises(hyperlinks.InvalidArgumentValue):
@@ -180,6 +352,17 @@ class TestArgumentValidation:
             "m.c", False,
             "mo.co", False)
 
+    def test_get_db_uri(self):
+        are_valid(
+            hyperlinks.get_db_uri,
+            hyperlinks.InvalidArgumentValue,
+            "sqlite:graph.db", True,
+            "mongodb://db:27018", True,
+            None, True,
+            "sqlite:", False,
+            "mongodb:", False,
+            "redis://db", False)
+
 
 def get_exit_params(args, monkeypatch):
     "Helper to test cli function and capture exit error if happens"
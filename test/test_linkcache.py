@@ -0,0 +1,82 @@
+import mock
+
+import linkcache
+
+
+def response_with(**headers):
+    response = mock.Mock()
+    response.headers = headers
+    return response
+
+
+def test_links_cached_with_validators_survive_reopening(tmpdir):
+    # given
+    path = str(tmpdir.join("links.cache"))
+    cache = linkcache.LinkCache.open(path)
+    cache.remember("http://a.com", response_with(etag='"v1"'))
+    cache.page_reached("http://a.com", set(["http://b.com"]))
+    cache.close()
+
+    # when
+    cache = linkcache.LinkCache.open(path)
+    entry = cache.get("http://a.com")
+
+    # then
+    assert ["http://b.com"] == entry.outgoing
+    assert {"If-None-Match": '"v1"'} == entry.conditional_headers()
+    assert cache.get("http://b.com") is None
+
+
+def test_page_without_validators_or_failed_is_not_cached(tmpdir):
+    # given
+    cache = linkcache.LinkCache.open(str(tmpdir.join("links.cache")))
+    for url in ("http://a.com", "http://b.com"):
+        cache.remember(url, response_with(**{"last-modified": "Mon"}))
+        cache.page_reached(url, set())
+
+    # when
+    cache.remember("http://a.com", response_with())
+    cache.page_reached("http://a.com", set())
+    cache.page_failed("http://b.com")
+
+    # then
+    assert 0 == len(cache)
+    assert cache.get("http://a.com") is None
+    assert cache.get("http://b.com") is None
+
+
+def test_validators_omitted_by_not_modified_response_are_kept(tmpdir):
+    # given
+    cache = linkcache.LinkCache.open(str(tmpdir.join("links.cache")))
+    cache.remember("http://a.com", response_with(**{"last-modified": "Mon"}))
+    cache.page_reached("http://a.com", set(["http://b.com"]))
+    not_modified = response_with()
+    not_modified.status_code = 304
+
+    # when
+    cache.remember("http://a.com", not_modified,
+                   cache.get("http://a.com"))
+    cache.page_reached("http://a.com", set(["http://b.com"]))
+
+    # then
+    entry = cache.get("http://a.com")
+    assert {"If-Modified-Since": "Mon"} == entry.conditional_headers()
+
+
+def test_least_recently_used_pages_are_evicted(tmpdir):
+    # given
+    cache = linkcache.LinkCache.open(str(tmpdir.join("links.cache")),
+                                     max_entries=2)
+    for url in ("http://a.com", "http://b.com"):
+        cache.remember(url, response_with(etag="1"))
+        cache.page_reached(url, set())
+
+    # when
+    cache.get("http://a.com")
+    cache.remember("http://c.com", response_with(etag="1"))
+    cache.page_reached("http://c.com", set())
+
+    # then
+    assert 2 == len(cache)
+    assert cache.get("http://b.com") is None
+    assert cache.get("http://a.com") is not None
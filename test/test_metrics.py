@@ -0,0 +1,92 @@
+import json
+
+import metrics
+
+
+def test_values_counted_in_cumulative_buckets():
+    histogram = metrics.Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+
+    assert [2, 3, 4] == histogram.cumulative_counts()
+    assert 4 == histogram.count
+    assert 3.65 == histogram.sum
+
+
+def test_metrics_collected_from_crawl_events():
+    # given
+    now = [100.0]
+    metrics_ = metrics.CrawlMetrics(clock=lambda: now[0])
+
+    # when
+    metrics_.request_done("HEAD", "http://a.com", 0.02, 200)
+    metrics_.request_done("GET", "http://a.com", 0.2, 200)
+    metrics_.page_parsed("http://a.com", 1024, 0.1, 0.003)
+    metrics_.page_reached("http://a.com", set(["http://b.com/1"]))
+    metrics_.request_done("HEAD", "http://b.com/1", 0.02, 503)
+    metrics_.page_failed("http://b.com/1")
+    metrics_.crawl_progress(3, 10)
+    now[0] += 2
+
+    # then
+    actual = json.loads(metrics_.to_json())
+    assert 0.5 == actual["pages_per_second"]
+    assert 1024 == actual["downloaded_bytes"]
+    assert {"a.com": 0.0, "b.com": 1.0} == actual["error_rate_by_host"]
+    assert {"200": 2, "503": 1} == actual["responses_by_status"]
+    assert 2 == actual["request_seconds"]["HEAD"]["count"]
+    assert (3, 10) == (actual["in_flight"], actual["queued"])
+
+
+def test_prometheus_text_format():
+    metrics_ = metrics.CrawlMetrics()
+    metrics_.request_done("GET", "http://a.com", 0.2, 200)
+    metrics_.page_failed("http://a.com")
+
+    lines = metrics_.to_prometheus().splitlines()
+
+    assert "# TYPE crawler_request_seconds histogram" in lines
+    assert 'crawler_request_seconds_bucket{method="GET",le="0.1"} 0' in lines
+    assert 'crawler_request_seconds_bucket{method="GET",le="+Inf"} 1' in lines
+    assert 'crawler_request_seconds_count{method="GET"} 1' in lines
+    assert 'crawler_host_pages_failed_total{host="a.com"} 1' in lines
+    assert "crawler_parse_seconds_count 0" in lines
+
+
+def test_metrics_file_written_periodically_and_when_closed(tmpdir):
+    # given
+    path = tmpdir.join("metrics.json")
+    now = [0]
+    metrics_ = metrics.CrawlMetrics()
+    metrics_file = metrics.MetricsFile(metrics_, str(path), export_every=10,
+                                       clock=lambda: now[0])
+
+    # when
+    metrics_file.crawl_progress(1, 1)
+    is_written_early = path.check()
+    now[0] = 10
+    metrics_.page_reached("http://a.com", set())
+    metrics_file.crawl_progress(1, 1)
+    reached_in_time = json.loads(path.read())["pages_reached"]
+    metrics_.page_reached("http://b.com", set())
+    metrics_file.close()
+
+    # then
+    assert not is_written_early
+    assert 1 == reached_in_time
+    assert 2 == json.loads(path.read())["pages_reached"]
+
+
+def test_metrics_file_replaced_without_leaving_temporary_file(tmpdir):
+    # given
+    path = tmpdir.join("metrics.prom")
+    path.write("stale")
+    metrics_file = metrics.MetricsFile(metrics.CrawlMetrics(), str(path),
+                                       format_=metrics.PROMETHEUS_FORMAT)
+
+    # when
+    metrics_file.close()
+
+    # then
+    assert "crawler_pages_reached_total 0" in path.read().splitlines()
+    assert [path] == tmpdir.listdir()
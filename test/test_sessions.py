@@ -0,0 +1,45 @@
+import mock
+import socket
+
+import sessions
+
+
+def test_connection_pool_sized_per_host():
+    session = sessions.new_session(pool_connections=3, pool_maxsize=7)
+
+    for prefix in ("http://", "https://"):
+        adapter = session.get_adapter(prefix + "x.com")
+        assert 3 == adapter._pool_connections
+        assert 7 == adapter._pool_maxsize
+
+
+def test_name_resolved_once_while_in_dns_cache_context():
+    # given
+    addrinfo = [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                 ('10.0.0.1', 80))]
+    getaddrinfo = mock.Mock(return_value=addrinfo)
+
+    with mock.patch("socket.getaddrinfo", getaddrinfo):
+        with sessions.dns_cache():
+            # when
+            for _ in xrange(3):
+                actual = socket.getaddrinfo("x.com", 80, 0,
+                                            socket.SOCK_STREAM)
+            socket.getaddrinfo("y.com", 80)
+
+        # then
+        assert addrinfo == actual
+        assert 2 == getaddrinfo.call_count
+        assert getaddrinfo == socket.getaddrinfo
+
+
+def test_failed_resolution_is_not_cached():
+    getaddrinfo = mock.Mock(side_effect=[socket.gaierror(), [()]])
+
+    with mock.patch("socket.getaddrinfo", getaddrinfo):
+        with sessions.dns_cache():
+            try:
+                socket.getaddrinfo("x.com", 80)
+            except socket.gaierror:
+                pass
+            assert [()] == socket.getaddrinfo("x.com", 80)
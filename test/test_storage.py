@@ -0,0 +1,112 @@
+import mock
+import pytest
+import pymongo
+import pymongo.errors
+
+import storage
+
+from collector import new_url_info
+
+
+def test_graph_written_in_batches_of_upserts():
+    # given
+    client = mock.MagicMock()
+    collection = client.graph_db.in_out_by_url
+    db = storage.Mongo(client, batch_size=2)
+    graph = {"http://a.com": new_url_info(incomming=["http://b.com"]),
+             "http://b.com": new_url_info(outgoing=["http://a.com"]),
+             "http://c.com": new_url_info()}
+
+    # when
+    db.write(graph)
+
+    # then
+    collection.create_index.assert_called_once_with("url", unique=True)
+    batches = [args[0] for args, _ in collection.bulk_write.call_args_list]
+    assert [2, 1] == map(len, batches)
+    for _, kwargs in collection.bulk_write.call_args_list:
+        assert {"ordered": False} == kwargs
+    upsert = dict((r._filter["url"], r) for batch in batches for r in batch)
+    assert upsert["http://a.com"]._doc == {"$addToSet": {
+        "incomming": {"$each": ["http://b.com"]},
+        "outgoing": {"$each": []}}}
+    assert upsert["http://a.com"]._upsert
+
+
+def test_graph_written_to_collection_with_duplicate_pages():
+    # given
+    client = mock.MagicMock()
+    collection = client.graph_db.in_out_by_url
+
+    def create_index(key, unique=False):
+        if unique:
+            raise pymongo.errors.DuplicateKeyError("E11000 duplicate key")
+    collection.create_index.side_effect = create_index
+    db = storage.Mongo(client)
+
+    # when
+    db.write({"http://a.com": new_url_info()})
+
+    # then
+    assert [mock.call("url", unique=True), mock.call("url")] == \
+        collection.create_index.call_args_list
+    assert 1 == collection.bulk_write.call_count
+
+
+def test_failed_write_raises_storage_exception():
+    client = mock.MagicMock()
+    client.graph_db.in_out_by_url.bulk_write.side_effect = \
+        pymongo.errors.BulkWriteError({})
+    db = storage.Mongo(client)
+
+    with pytest.raises(storage.WriteException):
+        db.write({"http://a.com": new_url_info()})
+
+
+def test_unavailable_server_raises_storage_exceptions():
+    client = mock.MagicMock()
+    client.graph_db.in_out_by_url.create_index.side_effect = \
+        pymongo.errors.ServerSelectionTimeoutError("no server")
+    client.admin.command.side_effect = \
+        pymongo.errors.ServerSelectionTimeoutError("no server")
+    db = storage.Mongo(client)
+
+    with pytest.raises(storage.WriteException):
+        db.write({"http://a.com": new_url_info()})
+    with mock.patch("pymongo.MongoClient", return_value=client):
+        with pytest.raises(storage.ConnectException):
+            storage.Mongo.connect("db", 27017)
+
+
+def test_edges_of_page_found_in_sqlite_storage():
+    # given
+    db = storage.SQLite.connect(":memory:", batch_size=2)
+    graph = {"http://a.com": new_url_info(outgoing=["http://b.com",
+                                                    "http://c.com"]),
+             "http://b.com": new_url_info(incomming=["http://a.com"],
+                                          outgoing=["http://a.com"]),
+             "http://c.com": new_url_info(incomming=["http://a.com"])}
+
+    # when
+    db.write(graph)
+    db.write({"http://c.com": new_url_info(outgoing=["http://d.com"])})
+
+    # then
+    assert set(["http://b.com", "http://c.com"]) == \
+        db.outgoing("http://a.com")
+    assert set(["http://b.com"]) == db.incomming("http://a.com")
+    assert set(["http://d.com"]) == db.outgoing("http://c.com")
+    assert set(["http://a.com", "http://b.com", "http://c.com"]) == \
+        set(db.pages())
+    assert set() == db.outgoing("http://x.com")
+
+
+def test_storage_chosen_by_uri(tmpdir):
+    path = str(tmpdir.join("graph.db"))
+    assert isinstance(storage.get_default("sqlite:" + path), storage.SQLite)
+    with mock.patch("pymongo.MongoClient") as client:
+        assert isinstance(storage.get_default("mongodb://db:27018"),
+                          storage.Mongo)
+    client.assert_called_once_with("db", 27018)
+    with pytest.raises(ValueError):
+        storage.get_default("redis://db")
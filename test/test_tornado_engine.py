@@ -0,0 +1,143 @@
+# coding: utf-8
+import mock
+
+from functools import partial
+
+from tornado import gen, ioloop
+
+import collector
+import tornado_engine
+
+from collector import new_url_info
+from test_collector import (content_with_urls, get_response_from_route,
+                            head_response_from_route)
+
+
+def test_cycle_references():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://first.com")),
+
+        "http://first.com":
+        (200, 'text/html', content_with_urls(
+            start_url))
+    }
+
+    # when
+    graph = __collect_links(start_url, route_table, 11)
+
+    # then
+    assert graph == {start_url: new_url_info(incomming=["http://first.com"],
+                                             outgoing=["http://first.com"]),
+                     "http://first.com": new_url_info(incomming=[start_url],
+                                                      outgoing=[start_url])}
+
+
+def test_page_of_unsupported_type_is_not_fetched():
+    # given
+    start_url = "http://today.sunday.in.ua/url1"
+    route_table = {
+        start_url:
+        (200, 'text/html', content_with_urls(
+            "http://first.com/file.zip")),
+
+        "http://first.com/file.zip":
+        (200, 'application/zip', content_with_urls())
+    }
+
+    # when
+    graph = __collect_links(start_url, route_table, 2)
+
+    # then
+    assert graph == {start_url: new_url_info(
+        outgoing=["http://first.com/file.zip"])}
+
+
+def test_text_decoded_using_charset_from_content_type():
+    response = mock.Mock()
+    response.code = 200
+    response.body = u"веб".encode("cp1251")
+    response.headers = {"content-type": "text/html; charset=cp1251"}
+
+    assert u"веб" == tornado_engine.Response(response).text
+
+
+def test_response_truthiness_follows_status_code():
+    response = mock.Mock()
+    response.headers = {}
+
+    response.code = 200
+    assert tornado_engine.Response(response)
+    response.code = 599
+    assert not tornado_engine.Response(response)
+
+
+def __collect_links(start_url, route_table, visit_limit):
+    '@types: str, dict[str, tuple[int, str, str]], int -> dict[str, UrlInfo]'
+    do_head = fn_returning_future(head_response_from_route(route_table))
+    do_get = fn_returning_future(get_response_from_route(route_table))
+    return ioloop.IOLoop().run_sync(partial(
+        tornado_engine._collect, start_url, visit_limit, do_head, do_get,
+        collector.DEFAULT_MAX_IN_FLIGHT))
+
+
+def fn_returning_future(fn):
+    '@types: (A -> B) -> (A -> Future[B])'
+    return lambda *args: gen.maybe_future(fn(*args))
+
+
+def test_streamed_get_sends_request_headers():
+    # given
+    client = mock.Mock()
+    response = mock.Mock()
+    response.code = 304
+    response.headers = {}
+    client.fetch.return_value = gen.maybe_future(response)
+
+    # when
+    ioloop.IOLoop().run_sync(partial(
+        tornado_engine.do_streamed_get, client, "http://a.com",
+        headers={"If-None-Match": "1"}))
+
+    # then
+    _, kwargs = client.fetch.call_args
+    assert {"If-None-Match": "1"} == kwargs["headers"]
+
+
+def test_streamed_get_drops_body_over_max_page_size():
+    # given
+    def fetch(url, header_callback, streaming_callback, **kwargs):
+        for line in ("HTTP/1.1 200 OK\r\n", "Content-Type: text/html\r\n",
+                     "\r\n"):
+            header_callback(line)
+        for chunk in ('<a href="/b">', '<a href="/c">', '<a href="/d">'):
+            streaming_callback(chunk)
+        return gen.maybe_future(mock.Mock(code=200, headers={}))
+    client = mock.Mock()
+    client.fetch.side_effect = fetch
+
+    # when
+    response = ioloop.IOLoop().run_sync(partial(
+        tornado_engine.do_streamed_get, client, "http://a.com",
+        max_page_size=15))
+
+    # then
+    assert response.is_truncated
+    assert '<a href="/b"><a' == response.text
+    assert 39 == response.downloaded_size
+
+
+def test_warned_that_connections_are_not_reused_without_pycurl():
+    # given
+    with mock.patch.dict("sys.modules", {"pycurl": None}):
+        with mock.patch.object(collector.logger, "warning") as warning:
+            # when
+            client = tornado_engine.new_http_client(2)
+
+    # then
+    client.close()
+    assert 1 == warning.call_count
@@ -0,0 +1,38 @@
+from urlnorm import Normalizer, canonicalize
+
+
+def test_spellings_of_the_same_page_are_canonicalized():
+    for url in ("http://x.com", "http://x.com/", "HTTP://X.Com:80/",
+                "http://x.com/#top", "x.com"):
+        assert "http://x.com" == canonicalize(url)
+    assert "https://x.com/a?b=1" == canonicalize("https://X.com:443/a?b=1#c")
+    assert "http://u:P@x.com:8080/A/" == canonicalize(
+        "http://u:P@X.com:8080/A/")
+    assert "http://[::1]:81" == canonicalize("http://[::1]:81/")
+
+
+def test_links_resolved_against_the_page():
+    normalizer = Normalizer()
+    assert "http://x.com/a/c" == normalizer.normalize("http://x.com/a/b", "c")
+    assert "http://y.com/d" == normalizer.normalize("http://x.com/a/b",
+                                                    "//Y.com/d#e")
+    assert "mailto:me@x.com" == normalizer.normalize("http://x.com",
+                                                     "mailto:me@x.com")
+
+
+def test_least_recently_used_links_are_forgotten():
+    # given
+    normalizer = Normalizer(memo_size=2)
+    normalizer.normalize("http://x.com", "/a")
+    normalizer.normalize("http://x.com", "/b")
+
+    # when
+    normalizer.normalize("http://x.com", "/a")
+    normalizer.normalize("http://x.com", "/c")
+    normalizer.normalize("http://x.com", "/a")
+    normalizer.normalize("http://x.com", "/b")
+
+    # then
+    assert 2 == normalizer.hits
+    assert 4 == normalizer.misses
+    assert 2.0 / 6 == normalizer.hit_rate()
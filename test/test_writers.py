@@ -0,0 +1,64 @@
+import json
+import mock
+import StringIO
+
+import writers
+
+
+def test_records_are_written_in_batches():
+    # given
+    out = StringIO.StringIO()
+    writer = writers.NdjsonWriter(out, batch_size=2)
+
+    # when
+    writer.page_reached("http://a.com", set(["http://b.com"]))
+    # then
+    assert "" == out.getvalue()
+
+    # when
+    writer.page_reached("http://b.com", set())
+    writer.page_reached("http://c.com", set(["http://a.com"]))
+    # then
+    assert 2 == len(out.getvalue().splitlines())
+
+    # when
+    writer.close()
+    # then
+    records = map(json.loads, out.getvalue().splitlines())
+    assert records == [{"url": "http://a.com", "outgoing": ["http://b.com"]},
+                       {"url": "http://b.com", "outgoing": []},
+                       {"url": "http://c.com", "outgoing": ["http://a.com"]}]
+
+
+def test_pages_stored_in_batches_while_crawling():
+    # given
+    db = mock.Mock()
+    writer = writers.StorageWriter(db, batch_size=2)
+
+    # when
+    writer.page_reached("http://a.com", set(["http://b.com"]))
+    writer.page_reached("http://b.com", set())
+    writer.page_reached("http://c.com", set())
+    writer.close()
+
+    # then
+    assert [2, 1] == [len(args[0]) for args, _ in db.write.call_args_list]
+    assert db.write.call_args_list[0][0][0]["http://a.com"].outgoing == \
+        set(["http://b.com"])
+
+
+def test_truncated_page_marked_in_record():
+    # given
+    out = StringIO.StringIO()
+    writer = writers.NdjsonWriter(out, batch_size=1)
+
+    # when
+    writer.page_truncated("http://a.com")
+    writer.page_reached("http://a.com", set())
+    writer.page_reached("http://b.com", set())
+    writer.close()
+
+    # then
+    records = map(json.loads, out.getvalue().splitlines())
+    assert records[0]["truncated"]
+    assert "truncated" not in records[1]